@@ -0,0 +1,119 @@
+"""
+Benchmark of document codecs. For every codec and document size it reports
+CPU time of single edit (decode, apply change, encode) and number of bytes
+saved in redis compared to raw document.
+
+Run from src directory:
+    python -m benchmarks.codec --sizes 1024 102400 1048576
+"""
+from server.codec import DocumentCodec, get_codecs
+from server.storage import ChunkedDocumentStorage
+from server.handlers.message_handler import message_handler
+from pathlib import Path
+import argparse
+import random
+import time
+import json
+
+
+def apply(code: str, message: dict) -> str:
+    return message_handler._MessageHandler__update_code_with_changes(code, message)
+
+
+def sample_document(size: int) -> str:
+    """
+    Create document of given size from source files of this repository
+    """
+
+    source = "".join(
+        path.read_text() for path in sorted(Path(__file__).parents[1].rglob("*.py"))
+    )
+    return (source * (size // len(source) + 1))[:size]
+
+
+def measure(codec: DocumentCodec, document: str, edits: int, segment_size: int):
+    """
+    Return average CPU seconds per edit and number of bytes stored in redis
+    """
+
+    if segment_size:
+        segments = ChunkedDocumentStorage(segment_size, False, codec).split(document)
+    else:
+        segments = [document]
+    stored = [codec.encode(segment) for segment in segments]
+
+    rand = random.Random(0)
+    start = time.process_time()
+    for _ in range(edits):
+        # every edit inserts one character into random segment
+        i = rand.randrange(len(stored))
+        text = codec.decode(stored[i])
+        position = rand.randint(0, len(text))
+        message = {"changes": [{"from": position, "to": position, "insert": "x"}]}
+        stored[i] = codec.encode(apply(text, message))
+    cpu = (time.process_time() - start) / edits
+
+    return cpu, sum(len(value.encode("utf-8")) for value in stored)
+
+
+def run(sizes: list, edits: int, segment_size: int, threshold: int) -> list:
+    results = []
+    for size in sizes:
+        document = sample_document(size)
+        raw_cpu, raw_bytes = measure(
+            DocumentCodec(None, threshold), document, edits, segment_size
+        )
+        for name in [None, *get_codecs()]:
+            cpu, stored = measure(
+                DocumentCodec(name, threshold), document, edits, segment_size
+            )
+            results.append(
+                {
+                    "codec": name or "raw",
+                    "size": size,
+                    "segment_size": segment_size,
+                    "cpu_per_edit_us": cpu * 1e6,
+                    "extra_cpu_per_edit_us": (cpu - raw_cpu) * 1e6,
+                    "stored_bytes": stored,
+                    "saved_bytes": raw_bytes - stored,
+                    "ratio": raw_bytes / stored if stored else 1,
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1024, 10240, 102400, 1048576]
+    )
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument(
+        "--segment-size",
+        type=int,
+        default=0,
+        help="measure chunked layout with given segment size",
+    )
+    parser.add_argument("--threshold", type=int, default=1024)
+    parser.add_argument("--json", action="store_true", help="print results as json")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.edits, args.segment_size, args.threshold)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f"{'codec':<6} {'size':>9} {'cpu/edit us':>12} {'extra us':>10} "
+        f"{'stored':>10} {'saved':>10} {'ratio':>6}"
+    )
+    for r in results:
+        print(
+            f"{r['codec']:<6} {r['size']:>9} {r['cpu_per_edit_us']:>12.1f} "
+            f"{r['extra_cpu_per_edit_us']:>10.1f} {r['stored_bytes']:>10} "
+            f"{r['saved_bytes']:>10} {r['ratio']:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Memory used by idle websocket connections. Starts server against in process
+redis stand-in, opens idle connections spread across codespaces and reports
+server resident memory per connection. Results are saved as json, so they
+can be compared between commits.
+
+Run from src directory:
+    python -m benchmarks.connection_memory --connections 5000
+    python -m benchmarks.connection_memory --compare <results json file>
+"""
+from benchmarks.server import running_server, process_stats
+from benchmarks.load import git_commit, compare
+from pathlib import Path
+import websockets
+import argparse
+import resource
+import asyncio
+import json
+import time
+
+
+async def measure(args, port: int, pid: int) -> dict:
+    # let server finish startup allocations
+    await asyncio.sleep(1)
+    _, rss_before = process_stats(pid)
+
+    connections = []
+    for i in range(args.connections):
+        url = f"ws://127.0.0.1:{port}/codespace/tmp-memory-{i % args.codespaces}/"
+        websocket = await websockets.connect(url, ping_interval=None)
+        await websocket.recv()
+        connections.append(websocket)
+
+    await asyncio.sleep(args.settle)
+    _, rss_after = process_stats(pid)
+    await asyncio.gather(*(websocket.close() for websocket in connections))
+
+    return {
+        "rss_before_bytes": rss_before,
+        "rss_after_bytes": rss_after,
+        "bytes_per_connection": (rss_after - rss_before) / args.connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--codespaces", type=int, default=10)
+    parser.add_argument(
+        "--settle", type=float, default=2, help="seconds to wait before measuring"
+    )
+    parser.add_argument("--output", help="path of json file with results")
+    parser.add_argument("--compare", help="json file with results to compare with")
+    args = parser.parse_args()
+
+    # every connection uses file descriptor in both processes
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    documents = {f"tmp-memory-{i}": "" for i in range(args.codespaces)}
+    with running_server(documents) as (port, pid):
+        results = asyncio.run(measure(args, port, pid))
+
+    commit = git_commit()
+    output = {
+        "commit": commit,
+        "timestamp": time.time(),
+        "parameters": {
+            k: v for k, v in vars(args).items() if k not in ("output", "compare")
+        },
+        "results": results,
+    }
+    default_path = Path(__file__).parent / "results" / f"memory-{commit}.json"
+    path = Path(args.output or default_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(output, indent=2))
+
+    for key, value in results.items():
+        print(f"{key:<30} {value:>12.2f}")
+    print(f"\nresults saved to {path}")
+    if args.compare:
+        compare(output, args.compare)
+
+
+if __name__ == "__main__":
+    main()
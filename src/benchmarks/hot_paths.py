@@ -0,0 +1,236 @@
+"""
+Microbenchmarks of message hot paths: parsing message, looking up its
+operation and applying changes to document. Apply step is measured for
+every engine from ENGINES, so new document engines and codecs can be
+compared with existing ones.
+
+Run from src directory:
+    python -m benchmarks.hot_paths
+    python -m benchmarks.hot_paths --sizes 1024 5242880 --engines plain chunked
+"""
+from server.codec import DocumentCodec, get_codecs
+from server.storage import ChunkedDocumentStorage, PlainDocumentStorage
+from server.handlers.message_handler import message_handler
+from benchmarks.codec import sample_document
+from types import SimpleNamespace
+from pathlib import Path
+import argparse
+import asyncio
+import random
+import json
+import time
+
+
+def apply(code: str, message: dict) -> str:
+    return message_handler._MessageHandler__update_code_with_changes(code, message)
+
+
+class MemoryHash:
+    """
+    Redis hash kept in memory, used by storage engines so only storage
+    work is measured
+    """
+
+    def __init__(self):
+        self.fields = {}
+
+    async def hget(self, key, field):
+        return self.fields.get(field)
+
+    async def hmget(self, key, fields, *args):
+        fields = [fields, *args] if isinstance(fields, str) else fields
+        return [self.fields.get(field) for field in fields]
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        if field is not None:
+            self.fields[field] = value
+        self.fields.update(mapping or {})
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.fields.pop(field, None)
+
+
+class StringEngine:
+    """
+    Document kept as string and changed with MessageHandler apply function
+    """
+
+    def __init__(self, document: str):
+        self.document = document
+
+    async def apply(self, message: dict) -> None:
+        self.document = apply(self.document, message)
+
+
+class StorageEngine:
+    """
+    Document kept in memory hash with given storage layout and codec
+    """
+
+    def __init__(self, document: str, storage):
+        self.storage = storage
+        self.redis = MemoryHash()
+        self.redis.fields["code"] = storage.codec.encode(document)
+
+    async def apply(self, message: dict) -> None:
+        await self.storage.update(self.redis, "key", message, apply)
+
+
+def storage_engine(layout, codec=None):
+    def create(document: str):
+        storage = layout()
+        storage.codec = DocumentCodec(codec, 0)
+        return StorageEngine(document, storage)
+
+    return create
+
+
+# engine name: function creating engine for document, register
+# new engines here to measure them
+ENGINES = {
+    "plain": StringEngine,
+    "chunked": storage_engine(ChunkedDocumentStorage),
+    **{
+        f"plain+{name}": storage_engine(PlainDocumentStorage, name)
+        for name in get_codecs()
+    },
+    **{
+        f"chunked+{name}": storage_engine(ChunkedDocumentStorage, name)
+        for name in get_codecs()
+    },
+}
+
+
+def positions(distribution: str, size: int, count: int, rand: random.Random):
+    """
+    Return sorted positions of changes in document
+    """
+
+    match distribution:
+        case "end":
+            return [max(0, size - count + i) for i in range(count)]
+        case "start":
+            return list(range(count))
+        case _:
+            return sorted(rand.randint(0, size) for _ in range(count))
+
+
+def create_message(size: int, changes: int, distribution: str, insert: int):
+    rand = random.Random(0)
+    return {
+        "operation": "insert_value",
+        "changes": [
+            {"from": position, "to": position, "insert": "x" * insert}
+            for position in positions(distribution, size, changes, rand)
+        ],
+    }
+
+
+async def measure(function, min_time: float) -> float:
+    """
+    Return median seconds of function call, function is called until
+    min_time passes (at least 5 times)
+    """
+
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < 5 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await function()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+
+async def run(args) -> list:
+    client = SimpleNamespace(mode="edit", id="id", channel_id="channel_id")
+    # rate limiter is not part of measured path
+    handler = type(message_handler)()
+    handler.rate_limiter = None
+
+    results = []
+    for size in args.sizes:
+        document = sample_document(size)
+        for changes in args.changes:
+            for distribution in args.positions:
+                for insert in args.inserts:
+                    message = create_message(size, changes, distribution, insert)
+                    raw = json.dumps(message)
+
+                    async def parse():
+                        json.loads(raw)
+
+                    async def lookup():
+                        handler.operation_names.get(client.mode, [])
+                        getattr(handler, message["operation"])
+
+                    async def prepare():
+                        await handler.prepare(raw, client)
+
+                    row = {
+                        "size": size,
+                        "changes": changes,
+                        "positions": distribution,
+                        "insert": insert,
+                        "message_bytes": len(raw),
+                        "parse_us": await measure(parse, args.min_time) * 1e6,
+                        "lookup_us": await measure(lookup, args.min_time) * 1e6,
+                        "prepare_us": await measure(prepare, args.min_time) * 1e6,
+                    }
+                    for name in args.engines:
+                        engine = ENGINES[name](document)
+                        row[f"apply_{name}_us"] = (
+                            await measure(lambda: engine.apply(message), args.min_time)
+                            * 1e6
+                        )
+                    results.append(row)
+                    print(json.dumps(row) if args.json else format_row(row))
+    return results
+
+
+def format_row(row: dict) -> str:
+    return " ".join(
+        f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in row.items()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1024, 10240, 102400, 1048576, 5242880],
+    )
+    parser.add_argument("--changes", type=int, nargs="+", default=[1, 10])
+    parser.add_argument(
+        "--positions",
+        nargs="+",
+        default=["uniform", "end"],
+        choices=["uniform", "start", "end"],
+    )
+    parser.add_argument(
+        "--inserts",
+        type=int,
+        nargs="+",
+        default=[1, 1000],
+        help="number of characters inserted by every change",
+    )
+    parser.add_argument(
+        "--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES)
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=0.05, help="seconds per measurement"
+    )
+    parser.add_argument("--json", action="store_true", help="print rows as json")
+    parser.add_argument("--output", help="path of json file with results")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
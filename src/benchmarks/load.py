@@ -0,0 +1,221 @@
+"""
+Load test of websocket server. Starts server against in process redis
+stand-in (or local redis with --redis) and with configured message broker
+(--broker memory skips redis pub/sub), opens synthetic clients spread
+across codespaces which replay typing and selection patterns, and reports
+fan out latency percentiles, throughput, CPU per message and memory per
+connection. Results are saved as json, so they can be compared between
+commits.
+
+Run from src directory:
+    python -m benchmarks.load --clients 200 --codespaces 10 --duration 20
+    python -m benchmarks.load --compare benchmarks/results/load-<commit>.json
+"""
+from benchmarks.server import running_server, process_stats
+from dataclasses import dataclass, field
+from pathlib import Path
+import subprocess
+import websockets
+import argparse
+import asyncio
+import random
+import json
+import time
+
+DOCUMENT = "def main():\n    print('Hello World')\n\n" * 100
+
+
+@dataclass
+class Stats:
+    sent: int = 0
+    delivered: int = 0
+    latencies: list = field(default_factory=list)
+
+
+class SyntheticClient:
+    """
+    Client typing in codespace. It types bursts of characters at its
+    cursor, sometimes deletes last typed character, moves cursor and sends
+    selections. Every message carries send time used to measure latency
+    """
+
+    def __init__(self, client_id: int, codespace: str, rate: float, stats: Stats):
+        self.id = client_id
+        self.codespace = codespace
+        self.rate = rate
+        self.stats = stats
+        self.random = random.Random(client_id)
+        self.cursor = self.random.randint(0, len(DOCUMENT))
+        # characters typed by client, only these can be deleted so
+        # document never gets shorter than initial one
+        self.typed = 0
+
+    def next_message(self) -> dict:
+        roll = self.random.random()
+        bench = {"sender": self.id, "sent": time.perf_counter()}
+        if roll < 0.1:
+            # move cursor and select some text
+            self.cursor = self.random.randint(0, len(DOCUMENT))
+            return {
+                "operation": "create_selection",
+                "selection": {"from": self.cursor, "to": self.cursor + 5},
+                "bench": bench,
+            }
+        if roll < 0.2 and self.typed:
+            self.typed -= 1
+            self.cursor -= 1
+            change = {"from": self.cursor, "to": self.cursor + 1, "insert": ""}
+        else:
+            self.typed += 1
+            change = {"from": self.cursor, "to": self.cursor, "insert": "x"}
+            self.cursor += 1
+        return {"operation": "insert_value", "changes": [change], "bench": bench}
+
+    async def run(
+        self,
+        port: int,
+        connected: asyncio.Event,
+        start: asyncio.Event,
+        stop: asyncio.Event,
+    ) -> None:
+        url = f"ws://127.0.0.1:{port}/codespace/{self.codespace}/"
+        async with websockets.connect(url, max_size=None) as websocket:
+            await websocket.recv()
+            connected.set()
+            receiver = asyncio.create_task(self.receive(websocket))
+            # typing starts when every client is connected
+            await start.wait()
+            await self.type(websocket, stop)
+            # give server time to deliver last messages
+            await asyncio.sleep(1)
+            receiver.cancel()
+
+    async def type(self, websocket, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            await asyncio.sleep(self.random.expovariate(self.rate))
+            await websocket.send(json.dumps(self.next_message()))
+            self.stats.sent += 1
+
+    async def receive(self, websocket) -> None:
+        async for message in websocket:
+            bench = json.loads(message).get("bench")
+            if bench is not None and bench["sender"] != self.id:
+                self.stats.delivered += 1
+                self.stats.latencies.append(time.perf_counter() - bench["sent"])
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_clients(args, port: int, pid: int) -> dict:
+    stats = Stats()
+    clients = [
+        SyntheticClient(i, f"tmp-bench-{i % args.codespaces}", args.rate, stats)
+        for i in range(args.clients)
+    ]
+    _, rss_before = process_stats(pid)
+
+    start, stop = asyncio.Event(), asyncio.Event()
+    connections = []
+    for client in clients:
+        connected = asyncio.Event()
+        connections.append(
+            asyncio.create_task(client.run(port, connected, start, stop))
+        )
+        await connected.wait()
+    _, rss_connected = process_stats(pid)
+
+    cpu_start, _ = process_stats(pid)
+    started = time.perf_counter()
+    start.set()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    cpu_end, _ = process_stats(pid)
+    await asyncio.gather(*connections)
+
+    return {
+        "messages_sent": stats.sent,
+        "messages_delivered": stats.delivered,
+        "messages_per_second": stats.sent / elapsed,
+        "deliveries_per_second": stats.delivered / elapsed,
+        "latency_p50_ms": percentile(stats.latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(stats.latencies, 0.99) * 1000,
+        "latency_p999_ms": percentile(stats.latencies, 0.999) * 1000,
+        "cpu_per_message_us": (cpu_end - cpu_start) / max(stats.sent, 1) * 1e6,
+        "memory_per_connection_bytes": (rss_connected - rss_before) / args.clients,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\ncompared with {baseline['commit']}:")
+    for key, value in results["results"].items():
+        before = baseline["results"].get(key)
+        if before:
+            change = (value - before) / before * 100
+            print(f"{key:<30} {before:>12.2f} -> {value:>12.2f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--codespaces", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument(
+        "--rate", type=float, default=5, help="messages per second per client"
+    )
+    parser.add_argument(
+        "--redis", action="store_true", help="use redis configured with REDIS_*"
+    )
+    parser.add_argument(
+        "--broker",
+        default="redis",
+        choices=["redis", "memory"],
+        help="message broker used by server",
+    )
+    parser.add_argument("--output", help="path of json file with results")
+    parser.add_argument("--compare", help="json file with results to compare with")
+    args = parser.parse_args()
+
+    documents = {f"tmp-bench-{i}": DOCUMENT for i in range(args.codespaces)}
+    env = {"BROKER": args.broker}
+    with running_server(documents, fake_redis=not args.redis, env=env) as (port, pid):
+        results = asyncio.run(run_clients(args, port, pid))
+
+    commit = git_commit()
+    output = {
+        "commit": commit,
+        "timestamp": time.time(),
+        "parameters": {
+            k: v for k, v in vars(args).items() if k not in ("output", "compare")
+        },
+        "results": results,
+    }
+    default_path = Path(__file__).parent / "results" / f"load-{commit}.json"
+    path = Path(args.output or default_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(output, indent=2))
+
+    for key, value in results.items():
+        print(f"{key:<30} {value:>12.2f}")
+    print(f"\nresults saved to {path}")
+    if args.compare:
+        compare(output, args.compare)
+
+
+if __name__ == "__main__":
+    main()
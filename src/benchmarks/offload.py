@@ -0,0 +1,93 @@
+"""
+Benchmark of offloading document operations. For every document size and
+number of changes it applies changes and parses message inline and in
+Offloader thread pool, and reports time of operation and max event loop lag
+measured while it runs. Offloading helps only when operation releases GIL
+between steps (applying many changes), single C call like json.loads or
+one big change holds it for whole operation.
+
+Run from src directory:
+    python -m benchmarks.offload --sizes 1048576 5242880 --changes 1 100
+"""
+from server.offload import Offloader
+from server.handlers.message_handler import message_handler
+from benchmarks.codec import sample_document
+import argparse
+import asyncio
+import json
+import time
+
+
+def apply(code: str, message: dict) -> str:
+    return message_handler._MessageHandler__update_code_with_changes(code, message)
+
+
+async def sample_lag(lags: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def measure(operation) -> tuple[float, float]:
+    """
+    Return seconds of operation and max loop lag during it
+    """
+
+    lags, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(sample_lag(lags, stop))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await operation()
+    duration = time.perf_counter() - start
+    stop.set()
+    await sampler
+    return duration, max(lags)
+
+
+async def inline(function, *args) -> None:
+    function(*args)
+
+
+async def run(args) -> None:
+    offloader = Offloader(threshold=1, workers=1)
+    # start worker, so its start isn't measured
+    await offloader.run("warmup", int, "1")
+    for size in args.sizes:
+        document = sample_document(size)
+        for count in args.changes:
+            step = size // count
+            message = {
+                "operation": "insert_value",
+                "changes": [
+                    {"from": i * step, "to": i * step, "insert": "x"}
+                    for i in range(count)
+                ],
+            }
+            raw = json.dumps({**message, "document": document})
+            operations = {
+                "apply_inline": lambda: inline(apply, document, message),
+                "apply_offload": lambda: offloader.run(
+                    "apply", apply, document, message
+                ),
+                "parse_inline": lambda: inline(json.loads, raw),
+                "parse_offload": lambda: offloader.run("parse", json.loads, raw),
+            }
+            for name, operation in operations.items():
+                duration, lag = await measure(operation)
+                print(
+                    f"size={size} changes={count} {name} "
+                    f"duration_ms={duration * 1000:.1f} max_lag_ms={lag * 1000:.1f}"
+                )
+    offloader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1048576, 5242880])
+    parser.add_argument("--changes", type=int, nargs="+", default=[1, 100])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
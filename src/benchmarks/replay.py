@@ -0,0 +1,197 @@
+"""
+Replay of websocket traffic recorded with RECORD_DIR. Starts server against
+in process redis stand-in with documents from start of recorded sessions,
+sends recorded client frames at given speed and checks if documents built
+from broadcasted edits are the same as recorded ones. Edits are positional,
+so when several clients edit concurrently their order (and document) can
+legitimately differ, only sessions with one editor fail the check.
+
+Run from src directory:
+    python -m benchmarks.replay recordings/*.rec --speed 10
+"""
+from benchmarks.server import running_server, process_stats
+from dataclasses import dataclass, field
+from pathlib import Path
+import websockets
+import argparse
+import asyncio
+import json
+import time
+
+
+@dataclass
+class Recording:
+    path: str
+    start: str = ""
+    end: str | None = None
+    truncated: bool = False
+    # [seconds, client id, frame]
+    frames: list = field(default_factory=list)
+    # frames broadcasted during recording
+    broadcasts: list = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        recording = cls(path)
+        with open(path) as file:
+            for line in file:
+                kind, *record = json.loads(line)
+                match kind:
+                    case "s":
+                        recording.start = record[1] or ""
+                    case "i":
+                        recording.frames.append(record)
+                    case "o":
+                        recording.broadcasts.append(record[1])
+                    case "x":
+                        recording.truncated = True
+                    case "e":
+                        recording.end = record[1]
+        return recording
+
+    @property
+    def editors(self) -> int:
+        return len(
+            {client_id for _, client_id, frame in self.frames if is_edit(frame)}
+        )
+
+    @property
+    def edits(self) -> int:
+        return sum(is_edit(frame) for frame in self.broadcasts)
+
+    def recorded_document(self) -> str:
+        """
+        Return document built from recorded broadcasts
+        """
+
+        document = self.start
+        for frame in self.broadcasts:
+            if is_edit(frame):
+                document = apply(document, json.loads(frame))
+        return document
+
+
+def apply(document: str, message: dict) -> str:
+    # same as MessageHandler, server modules can't be imported here because
+    # server process imports this module before its environment is set
+    for change in message["changes"][::-1]:
+        start, end = change["from"], change["to"]
+        document = document[:start] + change["insert"] + document[end:]
+    return document
+
+
+def is_edit(frame: str) -> bool:
+    """
+    Return True if frame is edit of codespace document. Frames are parsed,
+    because inbound ones are recorded as clients sent them (with any json
+    formatting)
+    """
+
+    try:
+        message = json.loads(frame)
+    except ValueError:
+        return False
+    return (
+        isinstance(message, dict)
+        and message.get("operation") == "insert_value"
+        # edits of codespace files don't change codespace document
+        and message.get("file") is None
+    )
+
+
+async def replay(recording: Recording, port: int, codespace: str, speed: float):
+    url = f"ws://127.0.0.1:{port}/codespace/{codespace}/"
+    observer = await websockets.connect(url, max_size=None)
+    await observer.recv()
+    clients = {}
+    for _, client_id, _ in recording.frames:
+        if client_id not in clients:
+            clients[client_id] = await websockets.connect(url, max_size=None)
+            await clients[client_id].recv()
+
+    document, edits = recording.start, 0
+
+    async def observe():
+        nonlocal document, edits
+        async for frame in observer:
+            if is_edit(frame):
+                document = apply(document, json.loads(frame))
+                edits += 1
+                if edits == recording.edits:
+                    return
+
+    observing = asyncio.create_task(observe())
+    started = time.perf_counter()
+    for seconds, client_id, frame in recording.frames:
+        delay = started + seconds / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await clients[client_id].send(frame)
+    sent = time.perf_counter() - started
+
+    try:
+        await asyncio.wait_for(observing, timeout=10)
+    except asyncio.TimeoutError:
+        pass
+    for websocket in [observer, *clients.values()]:
+        await websocket.close()
+
+    return {
+        "path": recording.path,
+        "clients": len(clients),
+        "editors": recording.editors,
+        "frames": len(recording.frames),
+        "seconds": sent,
+        "edits_recorded": recording.edits,
+        "edits_replayed": edits,
+        "matches_broadcasts": document == recording.recorded_document(),
+        # truncated sessions don't have final document
+        "matches_end": None if recording.end is None else document == recording.end,
+    }
+
+
+async def run(args, recordings: list, port: int, pid: int) -> list:
+    cpu_start, _ = process_stats(pid)
+    results = await asyncio.gather(
+        *(
+            replay(recording, port, f"tmp-replay-{i}", args.speed)
+            for i, recording in enumerate(recordings)
+        )
+    )
+    cpu_end, _ = process_stats(pid)
+    print(f"server cpu seconds: {cpu_end - cpu_start:.2f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("recordings", nargs="+", help="recorded session files")
+    parser.add_argument(
+        "--speed", type=float, default=1, help="replay speed, from 1 to 100"
+    )
+    parser.add_argument("--output", help="path of json file with results")
+    args = parser.parse_args()
+    if not 1 <= args.speed <= 100:
+        parser.error("speed has to be between 1 and 100")
+
+    recordings = [Recording.load(path) for path in args.recordings]
+    documents = {
+        f"tmp-replay-{i}": recording.start for i, recording in enumerate(recordings)
+    }
+    with running_server(documents) as (port, pid):
+        results = asyncio.run(run(args, recordings, port, pid))
+
+    for result in results:
+        print(" ".join(f"{key}={value}" for key, value in result.items()))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if any(
+        result["editors"] <= 1
+        and not (result["matches_broadcasts"] and result["matches_end"] is not False)
+        for result in results
+    ):
+        raise SystemExit("replayed documents differ from recorded ones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Helpers used by benchmarks to run websocket server in separate process
+and to measure its resources usage
+"""
+from contextlib import contextmanager
+import multiprocessing
+import socket
+import time
+import os
+
+
+def serve(port: int, documents: dict, env: dict) -> None:
+    """
+    Run server with codespaces documents saved in redis before start
+    """
+
+    # environment has to be set before server modules are imported
+    os.environ.update(env)
+    from main import app
+    from server.redis import REDIS
+
+    @app.before_server_start
+    async def seed(app, loop):
+        for codespace, code in documents.items():
+            await REDIS.hset(codespace, "code", code)
+
+    app.config.MOTD = False
+    app.run(host="127.0.0.1", port=port, single_process=True, access_log=False)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def running_server(documents: dict, fake_redis: bool = True, env: dict = None):
+    """
+    Start server in separate process and yield its port and pid. When
+    fake_redis is False server uses redis configured with REDIS_* variables
+    """
+
+    # expire update set to 0 would remove codespace on first edit
+    env = {"TMP_CODESPACE_EXPIRE_UPDATE": "3600", **(env or {})}
+    if fake_redis:
+        env["REDIS_FAKE"] = "1"
+    port = free_port()
+    # spawn makes sure server modules are imported with given environment
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(port, documents, env), daemon=True
+    )
+    process.start()
+    try:
+        wait_for_port(port)
+        yield port, process.pid
+    finally:
+        process.terminate()
+        process.join()
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server didn't start on port {port}")
+
+
+def process_stats(pid: int) -> tuple[float, int]:
+    """
+    Return CPU seconds used by process and its resident memory in bytes
+    (linux only, read from /proc)
+    """
+
+    with open(f"/proc/{pid}/stat") as file:
+        # fields after process name, which can contain spaces
+        fields = file.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/statm") as file:
+        rss = int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu, rss
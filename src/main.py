@@ -1,14 +1,75 @@
-from sanic import Sanic, Request, Websocket
+from sanic import Sanic, Request, Websocket, HTTPResponse
+from sanic.response import text
+from server.metrics import REGISTRY
+from server.monitor import load_monitor
+from server.drain import drainer
+from server.presence import presence
+from server.flusher import write_back
+from server.heartbeat import heartbeat
+from server.offload import offloader
 from server.handlers.connection_handler import connection_handler
+from server.handlers.relay_handler import relay_handler
 from typing import Type
+import signal
 import os
 
 app = Sanic(name="WebSocketServer")
 
+# by default sanic uses uvloop when it is installed
+if "USE_UVLOOP" in os.environ:
+    app.config.USE_UVLOOP = os.environ["USE_UVLOOP"] == "1"
+
+# clients are pinged by heartbeat, instead of ping task per connection
+if heartbeat.enabled:
+    app.config.WEBSOCKET_PING_INTERVAL = None
+
+# in relay mode server accepts only view_only connections and
+# broadcasts codespace updates to them in batches
+if os.environ.get("SERVER_MODE") == "relay":
+    handler = relay_handler
+else:
+    handler = connection_handler
+
 
 @app.websocket("codespace/<token:str>/")
 async def codespace(request: Type[Request], ws: Type[Websocket], token: str) -> None:
-    await connection_handler(ws, token, request.app)
+    await handler(ws, token, request.app)
+
+
+@app.get("/metrics")
+async def metrics(request: Type[Request]) -> HTTPResponse:
+    handler.channels.observe_send_queues()
+    return text(REGISTRY.render(), content_type="text/plain; version=0.0.4")
+
+
+@app.get("/health")
+async def health(request: Type[Request]) -> HTTPResponse:
+    # used by haproxy checks to steer new connections away from
+    # overloaded workers
+    state = load_monitor.state()
+    return text(state, status=503 if state == "drain" else 200)
+
+
+@app.after_server_start
+async def start_load_monitor(app: Sanic) -> None:
+    app.add_task(load_monitor.run(), name="load_monitor")
+    app.add_task(presence.run(), name="presence")
+    app.add_task(write_back.run(), name="write_back")
+    app.add_task(heartbeat.run(handler.channels), name="heartbeat")
+    # SIGUSR2 drains worker without stopping it, e.g. before deploy
+    app.loop.add_signal_handler(
+        signal.SIGUSR2, lambda: drainer.start(handler.channels)
+    )
+
+
+@app.before_server_stop
+async def drain(app: Sanic) -> None:
+    await drainer.start(handler.channels)
+    # announce leaves of drained clients
+    await presence.flush()
+    await write_back.flush_all()
+    await write_back.close()
+    offloader.close()
 
 
 if __name__ == "__main__":
@@ -14,6 +14,18 @@ class AbstractClient(ABC):
     async def close(self, code: int, reason: str):
         pass
 
+    @abstractmethod
+    def send_queue_size(self) -> int:
+        pass
+
+    @abstractmethod
+    async def ping(self):
+        pass
+
+    @abstractmethod
+    def abort(self):
+        pass
+
 
 class AbstractChannel(ABC):
     @abstractmethod
@@ -37,3 +49,28 @@ class AbstractChannelCache(ABC):
     @abstractmethod
     async def destroy_channel(self, code: int, reason: str):
         pass
+
+
+class AbstractDocumentStorage(ABC):
+    @abstractmethod
+    async def read(self, redis, key: str):
+        pass
+
+    @abstractmethod
+    async def update(self, redis, key: str, message: dict, apply) -> bool:
+        # apply returns changed text or awaitable resolved with it
+        pass
+
+    @abstractmethod
+    async def materialize(self, redis, key: str) -> None:
+        pass
+
+
+class AbstractBroker(ABC):
+    @abstractmethod
+    async def publish(self, channel: str, message: str):
+        pass
+
+    @abstractmethod
+    def pubsub(self):
+        pass
@@ -0,0 +1,92 @@
+from server.base import AbstractBroker
+from server.redis import REDIS
+from collections import defaultdict
+import aioredis
+import asyncio
+import os
+
+
+class RedisBroker(AbstractBroker):
+    """
+    Broker publishing messages via redis pub/sub channels. Required when
+    more than one server instance is used
+    """
+
+    def __init__(self, redis: aioredis.Redis):
+        self.redis = redis
+
+    async def publish(self, channel: str, message: str) -> int:
+        return await self.redis.publish(channel, message)
+
+    def pubsub(self) -> aioredis.client.PubSub:
+        return self.redis.pubsub()
+
+
+class MemoryPubSub:
+    """
+    In process subscription with the same interface as redis PubSub
+    (the part of it used by Channel)
+    """
+
+    def __init__(self, broker: "MemoryBroker"):
+        self.broker = broker
+        self.channels = set()
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, *channels: str) -> None:
+        for channel in channels:
+            self.broker.subscribers[channel].add(self)
+            self.channels.add(channel)
+
+    async def unsubscribe(self, *channels: str) -> None:
+        for channel in channels or list(self.channels):
+            self.broker.subscribers[channel].discard(self)
+            if not self.broker.subscribers[channel]:
+                del self.broker.subscribers[channel]
+            self.channels.discard(channel)
+
+    async def listen(self):
+        """
+        Yield published messages until subscription is reset
+        """
+
+        while (message := await self.queue.get()) is not None:
+            yield message
+
+    async def reset(self) -> None:
+        await self.unsubscribe()
+        # stop listen generator
+        self.queue.put_nowait(None)
+
+
+class MemoryBroker(AbstractBroker):
+    """
+    Broker delivering messages between channels of the same process. It can
+    be used only with single server instance (and single worker). Redis
+    keyspace events aren't delivered, so clients aren't closed when
+    codespace data expires
+    """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+
+    async def publish(self, channel: str, message: str) -> int:
+        subscribers = self.subscribers.get(channel, ())
+        message = {
+            "type": "message",
+            "pattern": None,
+            "channel": channel,
+            "data": message,
+        }
+        for subscriber in subscribers:
+            subscriber.queue.put_nowait(message)
+        return len(subscribers)
+
+    def pubsub(self) -> MemoryPubSub:
+        return MemoryPubSub(self)
+
+
+if os.environ.get("BROKER") == "memory":
+    BROKER = MemoryBroker()
+else:
+    BROKER = RedisBroker(REDIS)
@@ -1,7 +1,30 @@
 from server.client import Client
 from server.redis import REDIS
+from server.broker import BROKER
+from server.ratelimit import rate_limiter
+from server.storage import document_storage
+from server.tracing import tracer
+from server.presence import presence
+from server.flusher import write_back
+from server.recorder import recorder
+from server.files import file_key, file_of_channel
+from server.outbox import LOW, Outbox, priority_of, sender_of
+from server.metrics import (
+    BROADCAST_DURATION,
+    BROADCAST_SIZE,
+    CHANNEL_CACHE,
+    CHANNELS,
+    CLIENTS,
+    MESSAGES_OUT,
+    PUBSUB_CLOSED,
+    SEND_QUEUE,
+    operation_of,
+)
 import asyncio
 import aioredis
+import logging
+import time
+import os
 from server.handlers.message_handler import message_handler
 from sanic import Websocket
 from dataclasses import dataclass, field
@@ -23,6 +46,21 @@ class Channel(AbstractChannel):
     # define messages that should be handled by channel not clients
     # for example 'expire' message send when codespace data is expired
     handle_messages: list = field(init=False, default_factory=lambda: ["expired"])
+    # file id: clients which have file open, channel is subscribed only
+    # to pub/sub channels of files open by its clients
+    files: dict = field(init=False, default_factory=dict)
+    # redis keys of files edited by clients of channel, their documents
+    # are materialized and written back when channel is destroyed
+    edited: set = field(init=False, default_factory=set)
+    # client: outbox of messages waiting to be sent to client, it's created
+    # when client is congested and removed when all messages are sent
+    outboxes: dict = field(init=False, default_factory=dict)
+    # bytes waiting in client transport after which messages are queued in
+    # outbox instead of being sent directly
+    outbox_threshold = int(os.environ.get("OUTBOX_THRESHOLD", 16384))
+    # max number of files open by one client and of files opened in channel
+    max_client_files = int(os.environ.get("MAX_CLIENT_FILES", 32))
+    max_channel_files = int(os.environ.get("MAX_CHANNEL_FILES", 256))
 
     async def listen(self) -> None:
         """
@@ -35,18 +73,30 @@ class Channel(AbstractChannel):
 
                 if message["data"] in self.handle_messages:
                     await getattr(self, message["data"])()
+                elif message.get("channel", "").startswith("__keyspace@"):
+                    # other keyspace events (for example hset when redis
+                    # notifies about all events) are not sent to clients
+                    continue
                 else:
                     # if message is not handled by channel
                     # broadcast it to clients
+                    message["data"], message["trace"] = tracer.extract(
+                        message["data"]
+                    )
+                    message["file"] = file_of_channel(
+                        self.channel_id, message.get("channel", "")
+                    )
                     await self.broadcast(message)
 
         except aioredis.exceptions.ConnectionError:
+            PUBSUB_CLOSED.inc()
             print(f"PUBSUB closed <{self.channel_id}>")
 
     async def expired(self) -> None:
         """
         Close connection for every client (called when codespace data
-        cached in redis expires)
+        cached in redis expires). Documents are already removed, so they
+        are saved by write back when last client leaves
         """
 
         for client in self.clients:
@@ -54,20 +104,76 @@ class Channel(AbstractChannel):
 
     async def broadcast(self, message: str) -> None:
         """
-        Send message to all connected clients
+        Send message to all connected clients, messages of file are sent
+        only to clients which have it open. Messages to congested clients
+        are queued in their outboxes, where edits and control messages go
+        before selections
         """
 
         payload = message["data"]
-        for client in self.clients:
-            await client.send(payload)
+        operation = operation_of(payload)
+        priority = priority_of(operation)
+        # selection supersedes waiting selection of the same sender and file
+        key = (sender_of(payload), message.get("file")) if priority == LOW else None
+        trace = message.get("trace")
+        # clients are copied because sets can change when awaiting sends
+        if (file_id := message.get("file")) is None:
+            clients = tuple(self.clients)
+        else:
+            clients = tuple(self.files.get(file_id, ()))
+        if recorder.enabled:
+            recorder.outbound(self.channel_id, payload)
+        start = time.perf_counter()
+        for client in clients:
+            if (outbox := self.outboxes.get(client)) is not None:
+                outbox.put(payload, priority, key)
+            elif client.send_queue_size() > self.outbox_threshold:
+                self.open_outbox(client).put(payload, priority, key)
+            else:
+                await client.send(payload)
+            if trace is not None:
+                trace["stages"].append(["send", time.time()])
+
+        if trace is not None:
+            tracer.finish(trace)
+
+        BROADCAST_DURATION.observe(time.perf_counter() - start)
+        BROADCAST_SIZE.observe(len(clients))
+        MESSAGES_OUT.inc(operation, amount=len(clients))
+
+    def open_outbox(self, client: Client) -> Outbox:
+        """
+        Create outbox of client and start sending its messages
+        """
+
+        outbox = self.outboxes[client] = Outbox(client)
+        outbox.task = asyncio.create_task(self.send_outbox(outbox))
+        return outbox
+
+    async def send_outbox(self, outbox: Outbox) -> None:
+        try:
+            await outbox.run()
+        except Exception as error:
+            # connection is closed, client will leave channel
+            logging.warning("Sending queued messages failed: %r", error)
+        finally:
+            if self.outboxes.get(outbox.client) is outbox:
+                del self.outboxes[outbox.client]
 
     async def register(self, client: Client) -> None:
         """
-        Add client to clients set
+        Add client to clients set. Only clients which can edit codespace
+        are its members, so viewers (possibly thousands of them in relay
+        mode) don't grow presence set
         """
 
         async with self.lock:
+            if recorder.enabled and not self.clients:
+                await recorder.start(self.channel_id)
             self.clients.add(client)
+            if client.mode == "edit":
+                presence.join(self.channel_id, client.public_id)
+            CLIENTS.inc()
 
     async def create_client(self, websocket: Websocket, mode: str) -> Client:
         """
@@ -79,22 +185,98 @@ class Channel(AbstractChannel):
             mode=mode,
             channel_id=self.channel_id,
             message_handler=message_handler,
+            channel=self,
         )
 
+    async def open_file(self, client: Client, file_id: str) -> None:
+        """
+        Send messages of file to client, channel subscribes to file pub/sub
+        channel when file is opened by first client. Client which opens too
+        many files is disconnected
+        """
+
+        async with self.lock:
+            if client not in self.clients or client in self.files.get(file_id, ()):
+                return
+
+            client_files = sum(client in clients for clients in self.files.values())
+            if client_files >= self.max_client_files or (
+                file_id not in self.files and len(self.files) >= self.max_channel_files
+            ):
+                await client.close(1011, "Too many open files")
+                return
+
+            if (clients := self.files.get(file_id)) is None:
+                clients = self.files[file_id] = set()
+                await self.pubsub.subscribe(file_key(self.channel_id, file_id))
+            clients.add(client)
+
+    async def close_file(self, client: Client, file_id: str) -> None:
+        """
+        Stop sending messages of file to client
+        """
+
+        async with self.lock:
+            await self.remove_file_client(client, file_id)
+
+    async def remove_file_client(self, client: Client, file_id: str) -> None:
+        # channel unsubscribes from file when no client has it open
+        if (clients := self.files.get(file_id)) is None:
+            return
+
+        clients.discard(client)
+        if not clients:
+            del self.files[file_id]
+            await self.pubsub.unsubscribe(file_key(self.channel_id, file_id))
+
+    def document_keys(self) -> list[str]:
+        """
+        Return redis keys of codespace document and files edited in channel
+        """
+
+        return [self.channel_id, *sorted(self.edited)]
+
     async def leave(self, client: Client) -> None:
         """
         Remove client from clients set and if no client left
-        destroy channel and reset pubsub
+        destroy channel and reset pubsub. Leaving client which already
+        left (for example reaped by heartbeat) does nothing
         """
 
+        keys = None
         async with self.lock:
-            if client in self.clients:
-                await client.close(1011, "Connection closed")
-                self.clients.remove(client)
+            if client not in self.clients:
+                return
+
+            await client.close(1011, "Connection closed")
+            self.clients.remove(client)
+            if (outbox := self.outboxes.pop(client, None)) is not None:
+                outbox.task.cancel()
+            for file_id, clients in list(self.files.items()):
+                if client in clients:
+                    await self.remove_file_client(client, file_id)
+            if client.mode == "edit":
+                presence.leave(self.channel_id, client.public_id)
+            rate_limiter.forget(client.id)
+            CLIENTS.dec()
 
             if not self.clients:
                 await self.cache.destroy_channel(self.channel_id)
                 await self.pubsub.reset()
+                # save documents in 'code' field for readers that don't
+                # know storage layout, unless clients of other nodes still
+                # edit them
+                if not await presence.get_members(self.channel_id):
+                    for key in self.document_keys():
+                        await document_storage.materialize(REDIS, key)
+                if recorder.enabled:
+                    await recorder.stop(self.channel_id)
+                keys = self.document_keys()
+
+        if keys is not None:
+            # save modified documents while they can be still read, outside
+            # of lock so api requests don't block channel
+            await write_back.flush(keys)
 
 
 @dataclass(repr=False, slots=True)
@@ -105,6 +287,9 @@ class ChannelCache(AbstractChannelCache):
 
     channels: set = field(init=False, default_factory=lambda: dict())
     lock: asyncio.Lock = field(init=False, default_factory=lambda: asyncio.Lock())
+    # class used to create new channels, subclasses can override it to
+    # change the way channel handles its clients (for example relay mode)
+    channel_class = Channel
 
     async def get_or_create(self, channel_id: str) -> AbstractChannel:
         """
@@ -114,7 +299,8 @@ class ChannelCache(AbstractChannelCache):
 
         async with self.lock:
             if channel_id not in self.channels:
-                pubsub = REDIS.pubsub()
+                CHANNEL_CACHE.inc("miss")
+                pubsub = BROKER.pubsub()
                 await pubsub.subscribe(channel_id)
                 # subscribe to redis keyspace events (remember to set them
                 # when running redis-server --notify-keyspace-events)
@@ -123,16 +309,17 @@ class ChannelCache(AbstractChannelCache):
                 await self.__add_channel(channel_id, channel)
                 return channel, True
             else:
+                CHANNEL_CACHE.inc("hit")
                 return self.channels.get(channel_id), False
 
     async def __create_channel(
-        self, pubsub: REDIS.pubsub, channel_id: str
+        self, pubsub: BROKER.pubsub, channel_id: str
     ) -> AbstractChannel:
         """
         Creates and return new channel instance
         """
 
-        return Channel(cache=self, pubsub=pubsub, channel_id=channel_id)
+        return self.channel_class(cache=self, pubsub=pubsub, channel_id=channel_id)
 
     async def __add_channel(self, channel_id: str, channel: AbstractChannel) -> None:
         """
@@ -140,6 +327,7 @@ class ChannelCache(AbstractChannelCache):
         """
 
         self.channels[channel_id] = channel
+        CHANNELS.inc()
 
     async def destroy_channel(self, channel_id: str) -> None:
         """
@@ -148,3 +336,16 @@ class ChannelCache(AbstractChannelCache):
 
         async with self.lock:
             del self.channels[channel_id]
+            CHANNELS.dec()
+            rate_limiter.forget(channel_id)
+
+    def observe_send_queues(self) -> None:
+        """
+        Observe send queue size of every connected client (called when
+        metrics are scraped, so hot paths stay untouched)
+        """
+
+        SEND_QUEUE.reset()
+        for channel in self.channels.values():
+            for client in channel.clients:
+                SEND_QUEUE.observe(client.send_queue_size())
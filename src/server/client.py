@@ -1,12 +1,52 @@
+import functools
+import itertools
+import asyncio
 import secrets
-from server.redis import REDIS
+import time
+from server.broker import BROKER
 from dataclasses import dataclass, field
 from sanic import Websocket
 from server.handlers.base import AbstractMessageHandler
-from server.base import AbstractClient
+from server.base import AbstractClient, AbstractChannel
+from server.tracing import tracer
+from server.recorder import recorder
 import os
 
 
+class ClientRegistry:
+    """
+    This class assigns compact integer ids to clients of this process and
+    maps them to public ids, which are unique across server instances
+    (they are prefixed with node id, random if NODE_ID is not set). Public
+    ids are computed when needed, so only integer is stored per client
+    """
+
+    def __init__(self, node: str | None = None):
+        self.node = node or os.environ.get("NODE_ID") or secrets.token_urlsafe(6)
+        self.ids = itertools.count(1)
+
+    def next_id(self) -> int:
+        return next(self.ids)
+
+    def public_id(self, client_id: int) -> str:
+        return f"{self.node}.{client_id:x}"
+
+
+client_registry = ClientRegistry()
+
+
+@functools.cache
+def codespace_expire_update(temporary: bool) -> int:
+    """
+    Return seconds by which codespace expiration is extended after every
+    change, resolved once per codespace type
+    """
+
+    if temporary:
+        return int(os.environ.get("TMP_CODESPACE_EXPIRE_UPDATE", 0))
+    return int(os.environ.get("CODESPACE_EXPIRE_UPDATE", 0))
+
+
 # slots makes instance attribute access faster and save some space
 # https://stackoverflow.com/a/28059785/14579046
 @dataclass(frozen=True, repr=False, slots=True)
@@ -16,45 +56,100 @@ class Client(AbstractClient):
     client
     """
 
-    id: str = field(init=False, default_factory=lambda: secrets.token_urlsafe(12))
+    # compact id, public_id is sent to clients
+    id: int = field(init=False, default_factory=client_registry.next_id)
     protocol: Websocket
     # mode will be then used to determine which operation client can do
     mode: str
     channel_id: str
     message_handler: AbstractMessageHandler
-    # this value will be used to update codespace expiration
-    # time everytime client add changes
-    codespace_expire_update: int = field(init=False, default=0)
+    # channel client is registered in, it tracks files opened by client.
+    # Channel isn't hashable, so it's not part of client hash
+    channel: AbstractChannel = field(default=None, compare=False, hash=False)
+    # max number of parsed messages waiting for (or being in) processing,
+    # when limit is reached client stops reading new websocket messages
+    pipeline_depth = int(os.environ.get("CLIENT_PIPELINE_DEPTH", 16))
+
+    @property
+    def public_id(self) -> str:
+        return client_registry.public_id(self.id)
 
-    def __post_init__(self):
+    @property
+    def codespace_expire_update(self) -> int:
+        # this value will be used to update codespace expiration
+        # time everytime client add changes
+        return codespace_expire_update(self.channel_id.startswith("tmp-"))
+
+    async def listen(self) -> None:
         """
-        Set codespace expire update
+        Listen for incoming websocket messages. Messages are parsed as soon
+        as they arrive and then processed one by one in background task, so
+        parsing next messages overlaps with redis round trips of previous ones
+        while order of messages is preserved. Queue and processing task are
+        created with first message, so idle clients don't hold them
         """
 
-        if self.channel_id.startswith("tmp-"):
-            codespace_expire_update = int(
-                os.environ.get("TMP_CODESPACE_EXPIRE_UPDATE", 0)
-            )
-        else:
-            codespace_expire_update = int(os.environ.get("CODESPACE_EXPIRE_UPDATE", 0))
+        queue = processor = None
+        try:
+            # This will be iterating over messages received on
+            # the connection until the client disconnects
+            async for message in self.protocol:
+                received = time.time()
+                if recorder.enabled:
+                    recorder.inbound(self.channel_id, self.public_id, message)
+                prepared = await self.message_handler.prepare(message, self)
+                if prepared is None:
+                    continue
+                tracer.start(prepared[1], received)
 
-        # because dataclass is frozen regular setattr will raise error
-        object.__setattr__(self, "codespace_expire_update", codespace_expire_update)
+                if processor is None:
+                    queue = asyncio.Queue(maxsize=self.pipeline_depth)
+                    processor = asyncio.create_task(self.process(queue))
 
-    async def listen(self) -> None:
+                if queue.full():
+                    # wait for free slot, but stop if processor failed
+                    put = asyncio.create_task(queue.put(prepared))
+                    await asyncio.wait(
+                        {put, processor}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not put.done():
+                        put.cancel()
+                else:
+                    queue.put_nowait(prepared)
+
+                if processor.done():
+                    break
+
+            if processor is None:
+                return
+
+            # process messages received before connection was closed
+            joined = asyncio.create_task(queue.join())
+            await asyncio.wait({joined, processor}, return_when=asyncio.FIRST_COMPLETED)
+            joined.cancel()
+            if processor.done():
+                # re raise exception raised during processing
+                processor.result()
+        finally:
+            if processor is not None:
+                processor.cancel()
+
+    async def process(self, queue: asyncio.Queue) -> None:
         """
-        Listen for incoming websocket messages
+        Execute handlers of parsed messages in order they were received
         """
 
-        # This will be iterating over messages received on
-        # the connection until the client disconnects
-        async for message in self.protocol:
-            await self.message_handler.dispatch(message, self.channel_id, self)
+        while True:
+            handler, message = await queue.get()
+            try:
+                await handler(message, self.channel_id, self)
+            finally:
+                queue.task_done()
 
     async def publish(self, message: str) -> None:
-        # this method is used to publish message via redis pub/sub
+        # this method is used to publish message via configured broker
 
-        await REDIS.publish(self.channel_id, message)
+        await BROKER.publish(self.channel_id, message)
 
     async def close(self, code: int, reason: str) -> None:
         # close websocket connection
@@ -65,3 +160,25 @@ class Client(AbstractClient):
         # send message only to client
 
         await self.protocol.send(message)
+
+    async def ping(self) -> asyncio.Future:
+        # send ping, returned future is resolved when pong is received
+
+        return await self.protocol.ping()
+
+    def abort(self) -> None:
+        # close connection without closing handshake, used when client
+        # doesn't respond
+
+        self.protocol.fail_connection(1011, "Heartbeat timeout")
+
+    def send_queue_size(self) -> int:
+        """
+        Return number of bytes waiting in transport to be sent to client
+        """
+
+        if (io_proto := getattr(self.protocol, "io_proto", None)) is None:
+            return 0
+        if (transport := io_proto.transport) is None:
+            return 0
+        return transport.get_write_buffer_size()
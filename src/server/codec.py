@@ -0,0 +1,111 @@
+from dataclasses import dataclass, field
+import base64
+import zlib
+import os
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+# every encoded value starts with this character followed by codec name and
+# ':' character. Values without it are raw documents saved before codecs
+# were introduced
+TAG = "\x1b"
+
+
+class ZlibCodec:
+    name = "zlib"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level: int = 3):
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.decompressor.decompress(data)
+
+
+def get_codecs() -> dict:
+    """
+    Return dict of codecs available in current environment
+    """
+
+    codecs = {"zlib": ZlibCodec()}
+    if zstandard is not None:
+        codecs["zstd"] = ZstdCodec()
+    return codecs
+
+
+@dataclass(repr=False, slots=True)
+class DocumentCodec:
+    """
+    This class is used to encode documents before saving them in redis.
+    Documents longer than threshold are compressed with configured codec,
+    base64 encoded (redis client decodes responses as utf-8) and tagged
+    with codec name, so they can be decoded regardless of current settings:
+    "\\x1b<codec name>:<base64 encoded data>"
+    """
+
+    # name of codec used to compress documents, None disables compression
+    codec: str = field(
+        default_factory=lambda: os.environ.get("CODESPACE_COMPRESSION") or None
+    )
+    # documents shorter than threshold are saved without compression
+    threshold: int = field(
+        default_factory=lambda: int(
+            os.environ.get("CODESPACE_COMPRESSION_THRESHOLD", 1024)
+        )
+    )
+    codecs: dict = field(init=False, default_factory=get_codecs)
+
+    def __post_init__(self):
+        if self.codec is not None and self.codec not in self.codecs:
+            raise ValueError(f"'{self.codec}' codec is not available")
+
+    def encode(self, text: str) -> str:
+        """
+        Encode text that will be saved in redis
+        """
+
+        if self.codec is None or len(text) < self.threshold:
+            # raw text starting with tag character has to be tagged
+            # to not be confused with encoded value
+            return f"{TAG}raw:{text}" if text.startswith(TAG) else text
+
+        data = self.codecs[self.codec].compress(text.encode("utf-8"))
+        return f"{TAG}{self.codec}:{base64.b64encode(data).decode('ascii')}"
+
+    def decode(self, value: str | None) -> str | None:
+        """
+        Decode value retrieved from redis
+        """
+
+        if value is None or not value.startswith(TAG):
+            return value
+
+        name, _, data = value[1:].partition(":")
+        if name == "raw":
+            return data
+        if name not in self.codecs:
+            raise ValueError(f"'{name}' codec is not available")
+        return self.codecs[name].decompress(base64.b64decode(data)).decode("utf-8")
+
+
+document_codec = DocumentCodec()
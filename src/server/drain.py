@@ -0,0 +1,86 @@
+from server.base import AbstractChannelCache, AbstractClient
+from server.monitor import LoadMonitor, load_monitor
+from server.metrics import CLIENTS_DRAINED
+from dataclasses import dataclass, field
+import asyncio
+import random
+import json
+import time
+import os
+
+
+@dataclass(repr=False, slots=True)
+class Drainer:
+    """
+    This class drains worker before shutdown. New connections are rejected,
+    connected clients are closed in waves spread over duration seconds and
+    every client gets random reconnect delay, so clients don't reconnect
+    to other instances all at once. Messages received from closed clients
+    are still processed and documents are saved when last client of
+    channel leaves
+    """
+
+    monitor: LoadMonitor = field(default=load_monitor)
+    waves: int = field(default_factory=lambda: int(os.environ.get("DRAIN_WAVES", 5)))
+    duration: float = field(
+        default_factory=lambda: float(os.environ.get("DRAIN_DURATION", 10))
+    )
+    # maximal reconnect delay in seconds suggested to closed clients
+    reconnect_delay: float = field(
+        default_factory=lambda: float(os.environ.get("DRAIN_RECONNECT_DELAY", 30))
+    )
+    # seconds to wait for channels to save documents after last wave
+    timeout: float = field(
+        default_factory=lambda: float(os.environ.get("DRAIN_TIMEOUT", 3))
+    )
+    task: asyncio.Task = field(default=None)
+
+    def start(self, channels: AbstractChannelCache) -> asyncio.Task:
+        """
+        Start draining in background, if worker is already draining
+        running task is returned
+        """
+
+        if self.task is None:
+            self.monitor.draining = True
+            self.task = asyncio.create_task(self.drain(channels))
+        return self.task
+
+    async def drain(self, channels: AbstractChannelCache) -> None:
+        clients = [
+            client
+            for channel in list(channels.channels.values())
+            for client in channel.clients
+        ]
+        random.shuffle(clients)
+
+        size = -(-len(clients) // self.waves) or 1
+        interval = self.duration / self.waves
+        for start in range(0, len(clients), size):
+            if start:
+                await asyncio.sleep(interval)
+            await asyncio.gather(
+                *(
+                    self.close(client)
+                    for client in clients[start : start + size]  # noqa
+                ),
+                return_exceptions=True,
+            )
+
+        deadline = time.monotonic() + self.timeout
+        while channels.channels and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def close(self, client: AbstractClient) -> None:
+        """
+        Close client with service restart code, close reason contains
+        seconds after which client should reconnect
+        """
+
+        retry_after = round(random.uniform(0, self.reconnect_delay), 1)
+        reason = json.dumps({"reason": "draining", "retry_after": retry_after})
+        await client.close(1012, reason)
+        CLIENTS_DRAINED.inc()
+
+
+drainer = Drainer()
@@ -0,0 +1,39 @@
+# files of multi-file codespace are stored under separate redis keys and
+# their messages are published on separate pub/sub channels, both named
+# '<codespace uuid>:file:<file id>'. Messages without file belong to
+# codespace itself (its main document)
+SEPARATOR = ":file:"
+MAX_FILE_ID_LENGTH = 256
+
+
+def file_key(codespace_uuid: str, file_id: str | None) -> str:
+    """
+    Return redis key and pub/sub channel of codespace file
+    """
+
+    if file_id is None:
+        return codespace_uuid
+    return f"{codespace_uuid}{SEPARATOR}{file_id}"
+
+
+def file_of(message: dict) -> str | None:
+    """
+    Return id of file message refers to. Raises ValueError if file id
+    is invalid
+    """
+
+    if (file_id := message.get("file")) is None:
+        return None
+    if not isinstance(file_id, str) or not 0 < len(file_id) <= MAX_FILE_ID_LENGTH:
+        raise ValueError("Invalid file id")
+    return file_id
+
+
+def file_of_channel(codespace_uuid: str, channel: str) -> str | None:
+    """
+    Return id of file pub/sub channel belongs to, or None for codespace
+    channel
+    """
+
+    prefix = codespace_uuid + SEPARATOR
+    return channel[len(prefix) :] if channel.startswith(prefix) else None  # noqa
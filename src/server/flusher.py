@@ -0,0 +1,180 @@
+from server.redis import REDIS
+from server.storage import document_storage
+from server.metrics import WRITE_BACK_CODESPACES, WRITE_BACK_FAILED, WRITE_BACK_LOST
+from server.files import SEPARATOR
+from dataclasses import dataclass, field
+import aioredis
+import aiohttp
+import asyncio
+import logging
+import time
+import os
+
+
+@dataclass(repr=False, slots=True)
+class WriteBack:
+    """
+    This class tracks codespaces modified by insert_value and sends their
+    latest documents to api in bulk POST requests:
+    {"codespaces": [{"uuid": str, "code": str, "file": str (optional)}, ...]}
+    Codespace is flushed when it wasn't modified for delay seconds, but not
+    later than max_age seconds after its first unflushed modification
+    (max_age should be shorter than codespace expire time, document can't
+    be read after it expires). Flusher is disabled when url is not set
+    """
+
+    url: str | None = field(default_factory=lambda: os.environ.get("WRITE_BACK_URL"))
+    token: str | None = field(
+        default_factory=lambda: os.environ.get("WRITE_BACK_TOKEN")
+    )
+    interval: float = field(
+        default_factory=lambda: float(os.environ.get("WRITE_BACK_INTERVAL", 1))
+    )
+    delay: float = field(
+        default_factory=lambda: float(os.environ.get("WRITE_BACK_DELAY", 5))
+    )
+    max_age: float = field(
+        default_factory=lambda: float(os.environ.get("WRITE_BACK_MAX_AGE", 30))
+    )
+    batch_size: int = field(
+        default_factory=lambda: int(os.environ.get("WRITE_BACK_BATCH_SIZE", 100))
+    )
+    retries: int = field(
+        default_factory=lambda: int(os.environ.get("WRITE_BACK_RETRIES", 3))
+    )
+    backoff: float = field(default=0.5)
+    redis: aioredis.Redis = field(default=REDIS)
+    storage: object = field(default=document_storage)
+    # codespace uuid: [time of first, time of last unflushed modification]
+    dirty: dict = field(default_factory=dict)
+    session: aiohttp.ClientSession = field(default=None)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def mark(self, codespace_uuid: str) -> None:
+        """
+        Mark codespace as modified
+        """
+
+        # temporary codespaces aren't saved in api
+        if not self.enabled or codespace_uuid.startswith("tmp-"):
+            return
+
+        now = time.monotonic()
+        if (times := self.dirty.get(codespace_uuid)) is None:
+            self.dirty[codespace_uuid] = [now, now]
+        else:
+            times[1] = now
+
+    def due(self, now: float) -> list[str]:
+        """
+        Return codespaces which should be flushed
+        """
+
+        return [
+            codespace_uuid
+            for codespace_uuid, (first, last) in self.dirty.items()
+            if now - last >= self.delay or now - first >= self.max_age
+        ]
+
+    async def run(self) -> None:
+        """
+        Flush due codespaces until task is cancelled
+        """
+
+        if not self.enabled:
+            return
+
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.flush(self.due(time.monotonic()))
+                except Exception:
+                    # codespaces which weren't sent stay dirty
+                    logging.exception("Write back failed")
+        finally:
+            await self.close()
+
+    async def flush_all(self) -> None:
+        await self.flush(list(self.dirty))
+
+    async def flush(self, codespaces: list[str]) -> None:
+        """
+        Send documents of given dirty codespaces in batches. Codespaces
+        which couldn't be read or sent stay dirty
+        """
+
+        codespaces = [uuid for uuid in codespaces if uuid in self.dirty]
+        for start in range(0, len(codespaces), self.batch_size):
+            batch = codespaces[start : start + self.batch_size]  # noqa
+            # modifications made after this point mark codespace again
+            times = {uuid: self.dirty.pop(uuid) for uuid in batch}
+            try:
+                await self.send(batch)
+            except Exception as error:
+                logging.warning(
+                    "Write back of %d codespaces failed: %s", len(batch), error
+                )
+                WRITE_BACK_FAILED.inc(amount=len(batch))
+                for uuid, (first, last) in times.items():
+                    if (current := self.dirty.get(uuid)) is not None:
+                        last = current[1]
+                    self.dirty[uuid] = [first, last]
+
+    async def send(self, batch: list[str]) -> None:
+        documents = await asyncio.gather(
+            *(self.storage.read(self.redis, uuid) for uuid in batch)
+        )
+        codespaces = []
+        for uuid, code in zip(batch, documents):
+            if code is None:
+                # codespace expired before it was flushed
+                WRITE_BACK_LOST.inc()
+                logging.warning("Codespace %s expired before write back", uuid)
+            else:
+                # files of codespace are stored under '<uuid>:file:<id>' key
+                codespace_uuid, _, file_id = uuid.partition(SEPARATOR)
+                codespace = {"uuid": codespace_uuid, "code": code}
+                if file_id:
+                    codespace["file"] = file_id
+                codespaces.append(codespace)
+
+        if codespaces:
+            await self.post({"codespaces": codespaces})
+            WRITE_BACK_CODESPACES.inc(amount=len(codespaces))
+
+    async def post(self, data: dict) -> None:
+        """
+        Send request, retrying it with exponential backoff
+        """
+
+        headers = {"Authorization": f"Token {self.token}"} if self.token else {}
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.get_session().post(
+                    self.url, json=data, headers=headers
+                ) as resp:
+                    resp.raise_for_status()
+                    return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2**attempt)
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # one session is used for every request, so connections are reused
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+
+write_back = WriteBack()
@@ -17,6 +17,10 @@ class AbstractMessageHandler(ABC):
     def redis(cls):
         raise NotImplementedError("'redis' class attribute is not specified")
 
+    @abstractmethod
+    async def prepare(self, message: str, client: AbstractClient) -> tuple | None:
+        pass
+
     @abstractmethod
     async def dispatch(
         self, message: str, codespace_uuid: str, client: AbstractClient
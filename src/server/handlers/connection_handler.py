@@ -2,6 +2,10 @@ from server.channel import ChannelCache
 from server.authentication import Authenticate
 from sanic import Sanic, Websocket
 from server.base import AbstractClient, AbstractChannel
+from server.metrics import AUTHENTICATION_LATENCY
+from server.monitor import load_monitor
+from server.presence import presence
+import time
 import json
 
 
@@ -12,9 +16,28 @@ class ConnectionHandler:
 
     channels = ChannelCache()
     authentication = Authenticate()
+    # client modes that are allowed to connect to this server
+    allowed_modes = ("edit", "view_only")
+    monitor = load_monitor
+    presence = presence
 
     @classmethod
     async def __call__(cls, websocket: Websocket, token: str, app: Sanic) -> None:
+        # reject connection before authenticating it if worker is overloaded
+        # (try again later) or draining (service restart)
+        if (reason := cls.monitor.overloaded()) is not None:
+            code = 1012 if reason == "draining" else 1013
+            await websocket.close(code, cls.monitor.close_reason(reason))
+            return
+
+        cls.monitor.connections += 1
+        try:
+            await cls.handle(websocket, token, app)
+        finally:
+            cls.monitor.connections -= 1
+
+    @classmethod
+    async def handle(cls, websocket: Websocket, token: str, app: Sanic) -> None:
         # Authenticate incoming connection
         codespace_uuid, mode, is_authenticated = await cls.perform_authentication(
             websocket, token
@@ -23,6 +46,10 @@ class ConnectionHandler:
         if not is_authenticated:
             return
 
+        if mode not in cls.allowed_modes:
+            await websocket.close(1008, f"'{mode}' mode is not allowed")
+            return
+
         # get or create channel for codespace
         channel, is_created = await cls.channels.get_or_create(codespace_uuid)
 
@@ -75,22 +102,30 @@ class ConnectionHandler:
             # allow every user to edit and return is_authenticated as True
             return token, "edit", True
 
-        return await cls.authentication(websocket, token)
+        start = time.perf_counter()
+        try:
+            return await cls.authentication(websocket, token)
+        finally:
+            AUTHENTICATION_LATENCY.observe(time.perf_counter() - start)
 
     @classmethod
     async def send_connection_succeed_msg(cls, client: AbstractClient) -> None:
         """
         Inform client about successfull connection. In response send
-        id assigned to client in channel
+        id assigned to client in channel and ids of clients editing
+        codespace
         """
 
+        members = await cls.presence.get_members(client.channel_id)
+
         await client.send(
             message=json.dumps(
                 {
                     "operation": "connected",
                     "data": {
-                        "id": client.id,
+                        "id": client.public_id,
                         "mode": client.mode,
+                        "members": members,
                     },
                 }
             )
@@ -1,5 +1,13 @@
 import json
 from server.redis import REDIS
+from server.broker import BROKER
+from server.flusher import write_back
+from server.ratelimit import rate_limiter
+from server.storage import document_storage
+from server.metrics import MESSAGES_IN
+from server.tracing import tracer
+from server.files import file_key, file_of
+from server.offload import offloader
 from server.base import AbstractClient
 from server.handlers.base import AbstractMessageHandler
 import logging
@@ -20,29 +28,52 @@ class BaseMessageHandler(AbstractMessageHandler):
     # operation name is dict of allowed operations for each client mode
     operation_names = {}
     redis = None
+    # optional RateLimiter instance checked before operation is handled
+    rate_limiter = None
 
-    async def dispatch(
-        self, message: str, codespace_uuid: str, client: AbstractClient
-    ) -> None:
+    async def prepare(self, message: str, client: AbstractClient) -> tuple | None:
         """
-        Try to dispatch to the right operation; if a operation doesn't exist
-        close websocket connection
+        Parse message and find handler of its operation. Returns tuple of
+        handler and parsed message or None if message is invalid (in that
+        case websocket connection is closed) or it was rejected by rate limiter
         """
 
         try:
+            # parsing isn't offloaded, json decoder holds GIL for whole parse
             message = json.loads(message)
             operation = message["operation"]
         except (ValueError, TypeError):
             await client.close(1011, "Message does not have specified 'operation'")
-        else:
-            # to check allowed operation is used class attribute instead of checking
-            # of method exists by has attr because if method exists it doesn't mean
-            # that it should be treated as operation (for example dispatch, if it
-            # will be called infinie loop will occure)
-            if operation in self.operation_names.get(client.mode, []):
-                handler = getattr(self, operation.lower())
-            else:
-                handler = self.operation_not_allowed
+            return None
+
+        # to check allowed operation is used class attribute instead of checking
+        # of method exists by has attr because if method exists it doesn't mean
+        # that it should be treated as operation (for example dispatch, if it
+        # will be called infinie loop will occure)
+        if operation not in self.operation_names.get(client.mode, []):
+            MESSAGES_IN.inc("not_allowed")
+            return self.operation_not_allowed, message
+
+        MESSAGES_IN.inc(operation)
+
+        # limits are checked before any redis work is done
+        if self.rate_limiter is not None and not await self.rate_limiter.acquire(
+            operation, client
+        ):
+            return None
+
+        return getattr(self, operation.lower()), message
+
+    async def dispatch(
+        self, message: str, codespace_uuid: str, client: AbstractClient
+    ) -> None:
+        """
+        Try to dispatch to the right operation; if a operation doesn't exist
+        close websocket connection
+        """
+
+        if (prepared := await self.prepare(message, client)) is not None:
+            handler, message = prepared
             await handler(message, codespace_uuid, client)
 
     async def operation_not_allowed(
@@ -70,38 +101,77 @@ class MessageHandler(BaseMessageHandler):
 
     # allowed operations
     operation_names = {
-        "edit": ["insert_value", "create_selection"],
-        "view_only": [],
+        "edit": ["insert_value", "create_selection", "open_file", "close_file"],
+        "view_only": ["open_file", "close_file"],
     }
     redis = REDIS
+    # broker used to publish messages to channels
+    broker = BROKER
+    rate_limiter = rate_limiter
+    # defines layout in which codespace document is stored in redis
+    storage = document_storage
+    # saves modified codespaces in api
+    write_back = write_back
+    offloader = offloader
 
     async def insert_value(
         self, message: dict, codespace_uuid: str, client: AbstractClient
     ) -> None:
         """
-        This operation updates codespace code saved in redis and send
-        message to redis pub/sub channel
+        This operation updates codespace code (or code of file given in
+        message) saved in redis and send message to redis pub/sub channel
         """
 
-        # make sure to use asyncio lock when coroutine is suspended between retrieving
-        # data from redis and seting new value back. This will prevent race condition
-        # discribed here: https://superfastpython.com/asyncio-race-conditions/
-        if (code := await self.redis.hget(codespace_uuid, "code")) is not None:
+        if (key := await self.get_file_key(message, codespace_uuid, client)) is None:
+            return
+
+        # updates of document are ordered, because coroutine is suspended between
+        # retrieving data from redis and seting new value back. This will prevent
+        # race condition discribed here:
+        # https://superfastpython.com/asyncio-race-conditions/
+        async with self.offloader.ordered(key):
+            await self.update_document(message, key, codespace_uuid, client)
 
-            # this function shouldn't be async because data value is copied form redis
-            # and during update another worker can retrieve code data before updated
-            # data will be saved
-            code = self.__update_code_with_changes(code, message)
+    async def update_document(
+        self, message: dict, key: str, codespace_uuid: str, client: AbstractClient
+    ) -> None:
+        """
+        Apply changes to document saved under key and publish message
+        """
 
-            # set updated client value
-            await self.redis.hset(codespace_uuid, "code", code)
-            # update expire time
-            await self.redis.expire(codespace_uuid, client.codespace_expire_update)
-            await self.publish(codespace_uuid, json.dumps(message))
+        if await self.storage.update(self.redis, key, message, self.__apply):
+            tracer.mark(message, "apply")
+            self.write_back.mark(key)
+            if key != codespace_uuid:
+                client.channel.edited.add(key)
+            # update expire time, codespace is kept alive by edits of its
+            # files because its expiration closes clients
+            await self.redis.expire(key, client.codespace_expire_update)
+            if key != codespace_uuid:
+                await self.redis.expire(
+                    codespace_uuid, client.codespace_expire_update
+                )
+            tracer.mark(message, "publish")
+            await self.publish(key, json.dumps(message))
         else:
             # if redis data don't exists in cache close client connection
             await client.close(1011, "Can't find data for given codespace")
 
+    def __apply(self, code: str, message: dict):
+        """
+        Apply changes inline or, if document and inserted text are larger
+        than offload threshold, in thread pool (awaitable is returned). Single
+        change holds GIL for whole apply, so it's always applied inline
+        """
+
+        changes = message["changes"]
+        size = len(code) + sum(len(change["insert"]) for change in changes)
+        if len(changes) > 1 and self.offloader.offloads(size):
+            return self.offloader.run(
+                "apply", self.__update_code_with_changes, code, message
+            )
+        return self.__update_code_with_changes(code, message)
+
     def __update_code_with_changes(self, code: str, message: dict) -> str:
         """
         when updating string from last change we can be sure
@@ -127,12 +197,65 @@ class MessageHandler(BaseMessageHandler):
         This operation is used to handle create_selection operation
         """
 
-        await self.publish(codespace_uuid, json.dumps(message))
+        if (key := await self.get_file_key(message, codespace_uuid, client)) is None:
+            return
+
+        # sender id goes first, so selections waiting for congested client
+        # can be superseded by newer ones without parsing them
+        message.pop("client", None)
+        message = {"client": client.public_id, **message}
+
+        tracer.mark(message, "publish")
+        await self.publish(key, json.dumps(message))
+
+    async def open_file(
+        self, message: dict, codespace_uuid: str, client: AbstractClient
+    ) -> None:
+        """
+        Start sending messages of file to client
+        """
+
+        if await self.get_file_key(message, codespace_uuid, client, True):
+            await client.channel.open_file(client, message["file"])
+
+    async def close_file(
+        self, message: dict, codespace_uuid: str, client: AbstractClient
+    ) -> None:
+        """
+        Stop sending messages of file to client
+        """
+
+        if await self.get_file_key(message, codespace_uuid, client, True):
+            await client.channel.close_file(client, message["file"])
+
+    async def get_file_key(
+        self,
+        message: dict,
+        codespace_uuid: str,
+        client: AbstractClient,
+        required: bool = False,
+    ) -> str | None:
+        """
+        Return redis key (and pub/sub channel) of file from message, if file
+        is not given codespace uuid is returned. If file id is invalid
+        connection is closed and None is returned
+        """
+
+        try:
+            file_id = file_of(message)
+            if required and file_id is None:
+                raise ValueError("Missing file id")
+        except ValueError:
+            await client.close(1011, "Message has invalid 'file'")
+            return None
+
+        return file_key(codespace_uuid, file_id)
 
     @classmethod
     async def publish(cls, channel_id: str, msg: str) -> None:
-        # this method is used to publish message via redis pub/sub channels
-        await cls.redis.publish(channel_id, msg)
+        # this method is used to publish message via broker (redis pub/sub
+        # channels by default)
+        await cls.broker.publish(channel_id, msg)
 
 
 message_handler = MessageHandler()
@@ -0,0 +1,16 @@
+from server.handlers.connection_handler import ConnectionHandler
+from server.relay import RelayChannelCache
+
+
+class RelayConnectionHandler(ConnectionHandler):
+    """
+    This class is responsible for handling new websocket connections when
+    server runs in relay mode. Relay accepts only view_only clients, so it
+    can serve big audiences without affecting nodes used for editing
+    """
+
+    channels = RelayChannelCache()
+    allowed_modes = ("view_only",)
+
+
+relay_handler = RelayConnectionHandler()
@@ -0,0 +1,85 @@
+from server.base import AbstractChannelCache
+from server.metrics import CLIENTS_REAPED
+from dataclasses import dataclass, field
+import asyncio
+import time
+import os
+
+
+@dataclass(repr=False, slots=True)
+class Heartbeat:
+    """
+    This class pings every connected client from one background task (so
+    connections don't need their own ping tasks). Client which doesn't
+    answer ping within timeout seconds is disconnected and removed from
+    its channel in background, so other clients aren't blocked. Heartbeat
+    is disabled when interval is 0
+    """
+
+    interval: float = field(
+        default_factory=lambda: float(os.environ.get("HEARTBEAT_INTERVAL", 20))
+    )
+    timeout: float = field(
+        default_factory=lambda: float(os.environ.get("HEARTBEAT_TIMEOUT", 20))
+    )
+    # client: (pong future, time of ping)
+    pings: dict = field(default_factory=dict)
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    async def run(self, channels: AbstractChannelCache) -> None:
+        """
+        Check clients until task is cancelled
+        """
+
+        if not self.enabled:
+            return
+
+        # checks are done often enough to notice timeout and next ping
+        tick = min(self.interval, self.timeout) / 2
+        while True:
+            await asyncio.sleep(tick)
+            await self.check(channels)
+
+    async def check(self, channels: AbstractChannelCache) -> None:
+        """
+        Reap clients which didn't answer ping in time and ping clients
+        which weren't pinged for interval seconds
+        """
+
+        now = time.monotonic()
+        pings, self.pings = self.pings, {}
+        pinged = []
+        for channel in list(channels.channels.values()):
+            for client in list(channel.clients):
+                waiter, sent = pings.get(client, (None, 0))
+                if waiter is not None and not waiter.done():
+                    if now - sent >= self.timeout:
+                        self.reap(channel, client)
+                    else:
+                        self.pings[client] = waiter, sent
+                elif now - sent >= self.interval:
+                    pinged.append(client)
+                else:
+                    self.pings[client] = waiter, sent
+
+        await asyncio.gather(
+            *(self.ping(client, now) for client in pinged), return_exceptions=True
+        )
+
+    async def ping(self, client, now: float) -> None:
+        waiter = await client.ping()
+        # pong future fails when connection is lost, its error is expected
+        waiter.add_done_callback(lambda pong: pong.cancelled() or pong.exception())
+        self.pings[client] = waiter, now
+
+    def reap(self, channel, client) -> None:
+        CLIENTS_REAPED.inc()
+        client.abort()
+        # channel lock may be held, so client is removed in background
+        asyncio.create_task(channel.leave(client))
+
+
+heartbeat = Heartbeat()
@@ -0,0 +1,279 @@
+from bisect import bisect_left
+import re
+import os
+
+
+class Metric:
+    """
+    Base class of metrics. Values are stored per tuple of label values, so
+    updating metric is just one dict lookup
+    """
+
+    type = None
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.reset()
+
+    def initial(self):
+        return 0
+
+    def reset(self) -> None:
+        # metrics without labels are rendered even if they weren't updated
+        self.values = {} if self.labels else {(): self.initial()}
+
+    def __getitem__(self, labels: tuple):
+        return self.values.get(labels, 0)
+
+    def format_labels(self, values: tuple, extra: dict) -> str:
+        pairs = [*zip(self.labels, values), *extra.items()]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def samples(self, extra: dict) -> list[str]:
+        return [
+            f"{self.name}{self.format_labels(labels, extra)} {value}"
+            for labels, value in self.values.items()
+        ]
+
+    def render(self, extra: dict | None = None) -> list[str]:
+        """
+        Return lines of metric in prometheus text format, extra labels
+        are added to every sample
+        """
+
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(extra or {}),
+        ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        self.values[labels] = value
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets=()):
+        self.buckets = list(buckets)
+        super().__init__(name, description, labels)
+
+    def initial(self) -> list:
+        # every labels value is list of: counts per bucket (not cumulative,
+        # last one is +Inf bucket), sum and count of observations
+        return [[0] * (len(self.buckets) + 1), 0, 0]
+
+    def observe(self, value: float, *labels) -> None:
+        if (state := self.values.get(labels)) is None:
+            state = self.values[labels] = self.initial()
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self, extra: dict) -> list[str]:
+        samples = []
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += bucket_count
+                bucket_labels = self.format_labels(labels, {**extra, "le": bound})
+                samples.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = self.format_labels(labels, extra)
+            samples.append(f"{self.name}_sum{labels} {total}")
+            samples.append(f"{self.name}_count{labels} {count}")
+        return samples
+
+
+class Registry:
+    """
+    Stores metrics and renders them in prometheus text format. Every sample
+    is labeled with worker pid because every sanic worker has its own registry
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        extra = {"worker": os.getpid()}
+        lines = [line for metric in self.metrics for line in metric.render(extra)]
+        return "\n".join(lines) + "\n"
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+# published messages are json dumped dicts so operation can be found
+# without parsing whole message
+OPERATION_PATTERN = re.compile(r'"operation": "(\w+)"')
+
+REGISTRY = Registry()
+
+CHANNELS = REGISTRY.register(Gauge("ws_channels", "Number of active channels"))
+CLIENTS = REGISTRY.register(Gauge("ws_clients", "Number of connected clients"))
+MESSAGES_IN = REGISTRY.register(
+    Counter(
+        "ws_messages_in_total", "Messages received from clients", ("operation",)
+    )
+)
+MESSAGES_OUT = REGISTRY.register(
+    Counter("ws_messages_out_total", "Messages sent to clients", ("operation",))
+)
+BROADCAST_SIZE = REGISTRY.register(
+    Histogram(
+        "ws_broadcast_clients",
+        "Number of clients message was broadcasted to",
+        buckets=SIZE_BUCKETS,
+    )
+)
+BROADCAST_DURATION = REGISTRY.register(
+    Histogram(
+        "ws_broadcast_duration_seconds",
+        "Time of sending message to all channel clients",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+REDIS_LATENCY = REGISTRY.register(
+    Histogram(
+        "ws_redis_command_duration_seconds",
+        "Latency of redis commands",
+        ("command",),
+        buckets=LATENCY_BUCKETS,
+    )
+)
+REDIS_PIPELINE_SIZE = REGISTRY.register(
+    Histogram(
+        "ws_redis_pipeline_commands",
+        "Number of commands sent in one automatic pipeline",
+        buckets=SIZE_BUCKETS,
+    )
+)
+AUTHENTICATION_LATENCY = REGISTRY.register(
+    Histogram(
+        "ws_authentication_duration_seconds",
+        "Latency of authentication requests",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+CHANNEL_CACHE = REGISTRY.register(
+    Counter(
+        "ws_channel_cache_requests_total",
+        "Channel cache lookups by result (hit or miss)",
+        ("result",),
+    )
+)
+SEND_QUEUE = REGISTRY.register(
+    Histogram(
+        "ws_client_send_queue_bytes",
+        "Bytes waiting to be sent per client, observed on every scrape",
+        buckets=(0, 1024, 16384, 65536, 262144, 1048576),
+    )
+)
+TRACE_STAGE = REGISTRY.register(
+    Histogram(
+        "ws_trace_stage_duration_seconds",
+        "Latency of traced messages stages (measured from previous stage)",
+        ("stage",),
+        buckets=LATENCY_BUCKETS,
+    )
+)
+LOOP_LAG = REGISTRY.register(
+    Histogram(
+        "ws_event_loop_lag_seconds",
+        "Delay of event loop in scheduling sampler",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+CONNECTIONS_REJECTED = REGISTRY.register(
+    Counter(
+        "ws_connections_rejected_total",
+        "New connections rejected because worker was overloaded",
+        ("reason",),
+    )
+)
+CLIENTS_DRAINED = REGISTRY.register(
+    Counter("ws_clients_drained_total", "Clients closed while draining worker")
+)
+PRESENCE_STALE = REGISTRY.register(
+    Counter(
+        "ws_presence_stale_total",
+        "Presence members removed because their node stopped refreshing them",
+    )
+)
+WRITE_BACK_CODESPACES = REGISTRY.register(
+    Counter("ws_write_back_codespaces_total", "Codespaces saved in api")
+)
+WRITE_BACK_FAILED = REGISTRY.register(
+    Counter(
+        "ws_write_back_failed_total",
+        "Codespaces which couldn't be saved in api (they are retried later)",
+    )
+)
+WRITE_BACK_LOST = REGISTRY.register(
+    Counter(
+        "ws_write_back_lost_total", "Modified codespaces which expired before save"
+    )
+)
+CLIENTS_REAPED = REGISTRY.register(
+    Counter(
+        "ws_clients_reaped_total", "Clients disconnected because of missed pongs"
+    )
+)
+OUTBOUND_DROPPED = REGISTRY.register(
+    Counter(
+        "ws_outbound_dropped_total",
+        "Low priority messages to congested clients superseded by newer ones",
+    )
+)
+OFFLOADED = REGISTRY.register(
+    Counter(
+        "ws_offloaded_total",
+        "Operations on large documents executed off event loop",
+        ("operation",),
+    )
+)
+OFFLOAD_DURATION = REGISTRY.register(
+    Histogram(
+        "ws_offload_duration_seconds",
+        "Time of offloaded operations, including waiting for free worker",
+        ("operation",),
+        buckets=LATENCY_BUCKETS,
+    )
+)
+PUBSUB_CLOSED = REGISTRY.register(
+    Counter("ws_pubsub_closed_total", "Number of closed pubsub connections")
+)
+
+
+def operation_of(payload: str) -> str:
+    """
+    Return operation name of published message
+    """
+
+    if (match := OPERATION_PATTERN.search(payload)) is not None:
+        return match.group(1)
+    return "unknown"
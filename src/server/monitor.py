@@ -0,0 +1,112 @@
+from server.metrics import LOOP_LAG, CONNECTIONS_REJECTED
+from dataclasses import dataclass, field
+from collections import deque
+import asyncio
+import json
+import time
+import os
+
+# websocket close reason can't be longer than 123 bytes
+MAX_CLOSE_REASON = 123
+
+
+@dataclass(repr=False, slots=True)
+class LoadMonitor:
+    """
+    This class samples event loop lag in background and decides whether
+    worker is overloaded. Lag is time by which sleep of sampling interval
+    was late, the highest lag from last window samples is used. Limits
+    set to 0 are disabled
+    """
+
+    interval: float = field(
+        default_factory=lambda: int(os.environ.get("LOOP_LAG_INTERVAL", 100)) / 1000
+    )
+    max_lag: float = field(
+        default_factory=lambda: int(os.environ.get("MAX_LOOP_LAG", 0)) / 1000
+    )
+    max_connections: int = field(
+        default_factory=lambda: int(os.environ.get("MAX_CONNECTIONS", 0))
+    )
+    # seconds after which rejected clients should try to connect again
+    retry_after: int = field(
+        default_factory=lambda: int(os.environ.get("RETRY_AFTER", 5))
+    )
+    # url of other instance rejected clients are sent to
+    redirect: str | None = field(
+        default_factory=lambda: os.environ.get("OVERLOAD_REDIRECT")
+    )
+    samples: deque = field(
+        default_factory=lambda: deque(
+            maxlen=int(os.environ.get("LOOP_LAG_WINDOW", 10))
+        )
+    )
+    connections: int = field(default=0)
+    # set when worker is going to shut down
+    draining: bool = field(default=False)
+
+    @property
+    def lag(self) -> float:
+        return max(self.samples, default=0)
+
+    async def run(self) -> None:
+        """
+        Sample event loop lag until task is cancelled
+        """
+
+        while True:
+            await self.sample()
+
+    async def sample(self) -> float:
+        expected = time.perf_counter() + self.interval
+        await asyncio.sleep(self.interval)
+        lag = max(0, time.perf_counter() - expected)
+        self.samples.append(lag)
+        LOOP_LAG.observe(lag)
+        return lag
+
+    def overloaded(self) -> str | None:
+        """
+        Return name of exceeded limit or None if worker isn't overloaded
+        """
+
+        if self.draining:
+            return "draining"
+        if self.max_lag and self.lag > self.max_lag:
+            return "loop_lag"
+        if self.max_connections and self.connections >= self.max_connections:
+            return "connections"
+        return None
+
+    def state(self) -> str:
+        """
+        Return load state in format of haproxy agent check: "drain" when
+        new connections are rejected, otherwise "up" with percent of
+        free connections when connections limit is set
+        """
+
+        if self.overloaded() is not None:
+            return "drain"
+        if self.max_connections:
+            free = max(0, self.max_connections - self.connections)
+            return f"up {free * 100 // self.max_connections}%"
+        return "up"
+
+    def close_reason(self, reason: str) -> str:
+        """
+        Return close reason sent to rejected clients, it is json with
+        seconds after which client should reconnect and optional url of
+        instance it should connect to (it's left out if it doesn't fit in
+        close reason)
+        """
+
+        CONNECTIONS_REJECTED.inc(reason)
+        data = {"reason": reason, "retry_after": self.retry_after}
+        if self.redirect:
+            with_redirect = json.dumps({**data, "redirect": self.redirect})
+            if len(with_redirect.encode()) <= MAX_CLOSE_REASON:
+                return with_redirect
+        return json.dumps(data)
+
+
+load_monitor = LoadMonitor()
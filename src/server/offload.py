@@ -0,0 +1,79 @@
+from server.metrics import OFFLOAD_DURATION, OFFLOADED
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Callable
+import asyncio
+import time
+import os
+
+
+@dataclass(repr=False, slots=True)
+class Offloader:
+    """
+    This class runs operations on documents larger than threshold (in
+    characters, 0 disables offloading) in bounded thread pool, so they don't
+    stall other codespaces served by event loop. Only operations which
+    release GIL between steps are worth offloading, like applying many
+    changes one by one (see benchmarks.offload). Process pool can't be used,
+    because sanic workers are daemon processes. Smaller ones are executed
+    inline. Updates of the same document are ordered with
+    per key locks, because offloaded update is suspended between reading
+    and saving document
+    """
+
+    threshold: int = field(
+        default_factory=lambda: int(os.environ.get("OFFLOAD_THRESHOLD", 262144))
+    )
+    workers: int = field(
+        default_factory=lambda: int(os.environ.get("OFFLOAD_WORKERS", 2))
+    )
+    executor: ThreadPoolExecutor = None
+    # key: [lock, number of updates holding or waiting for lock]
+    locks: dict = field(default_factory=dict)
+
+    def offloads(self, size: int) -> bool:
+        return 0 < self.threshold < size
+
+    async def run(self, operation: str, function: Callable, *args):
+        """
+        Execute function in thread pool and return its result
+        """
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="offload"
+            )
+        OFFLOADED.inc(operation)
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, function, *args
+            )
+        finally:
+            OFFLOAD_DURATION.observe(time.perf_counter() - start, operation)
+
+    @asynccontextmanager
+    async def ordered(self, key: str):
+        """
+        Wait until previous updates of key are finished
+        """
+
+        if (entry := self.locks.get(key)) is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+offloader = Offloader()
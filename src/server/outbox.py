@@ -0,0 +1,69 @@
+from server.base import AbstractClient
+from server.metrics import OUTBOUND_DROPPED
+from dataclasses import dataclass, field
+from collections import deque
+import asyncio
+import re
+
+HIGH, LOW = 0, 1
+# operations sent after every waiting edit and control message, all other
+# operations are high priority
+LOW_PRIORITY_OPERATIONS = {"create_selection"}
+# low priority messages start with id of client which sent them
+SENDER_PATTERN = re.compile(r'^\{"client": "([^"]*)"')
+
+
+def priority_of(operation: str) -> int:
+    return LOW if operation in LOW_PRIORITY_OPERATIONS else HIGH
+
+
+def sender_of(payload: str) -> str | None:
+    """
+    Return id of client which sent low priority message
+    """
+
+    if (match := SENDER_PATTERN.match(payload)) is not None:
+        return match.group(1)
+    return None
+
+
+@dataclass(repr=False, slots=True)
+class Outbox:
+    """
+    This class stores messages waiting to be sent to congested client. High
+    priority messages are sent first, in order they were broadcasted. Low
+    priority messages are sent when there are no high priority ones and
+    waiting low priority message is replaced (dropped) by newer one with
+    the same key (sent by the same client)
+    """
+
+    client: AbstractClient
+    high: deque = field(default_factory=deque)
+    low: dict = field(default_factory=dict)
+    task: asyncio.Task = None
+
+    def put(self, payload: str, priority: int, key=None) -> None:
+        if priority == HIGH:
+            self.high.append(payload)
+            return
+
+        # messages without key can't be superseded
+        key = object() if key is None else key
+        if self.low.pop(key, None) is not None:
+            OUTBOUND_DROPPED.inc()
+        self.low[key] = payload
+
+    def __len__(self) -> int:
+        return len(self.high) + len(self.low)
+
+    async def run(self) -> None:
+        """
+        Send messages until outbox is empty
+        """
+
+        while self.high or self.low:
+            if self.high:
+                payload = self.high.popleft()
+            else:
+                payload = self.low.pop(next(iter(self.low)))
+            await self.client.send(payload)
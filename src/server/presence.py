@@ -0,0 +1,169 @@
+from server.redis import REDIS
+from server.broker import BROKER
+from server.base import AbstractBroker
+from server.metrics import PRESENCE_STALE
+from dataclasses import dataclass, field
+from collections import defaultdict
+import aioredis
+import asyncio
+import logging
+import json
+import time
+import os
+
+
+@dataclass(repr=False, slots=True)
+class Presence:
+    """
+    This class tracks which clients are connected to codespace across all
+    server instances. Members of codespace are kept in redis sorted set
+    with time of their expiration as score. Every node refreshes its local
+    members in one pipeline every interval seconds, and publishes joins and
+    leaves to channel members in batches every flush_interval seconds.
+    Members of node which stopped refreshing them expire after ttl seconds
+    and are removed (and announced as left) by other nodes
+    """
+
+    redis: aioredis.Redis = field(default=REDIS)
+    broker: AbstractBroker = field(default=BROKER)
+    interval: float = field(
+        default_factory=lambda: float(os.environ.get("PRESENCE_INTERVAL", 5))
+    )
+    ttl: float = field(
+        default_factory=lambda: float(os.environ.get("PRESENCE_TTL", 15))
+    )
+    flush_interval: float = field(
+        default_factory=lambda: int(os.environ.get("PRESENCE_FLUSH_INTERVAL", 200))
+        / 1000
+    )
+    # codespace uuid: ids of clients connected to this node
+    members: dict = field(default_factory=lambda: defaultdict(set))
+    # codespace uuid: ids of clients that joined or left since last flush
+    joined: dict = field(default_factory=lambda: defaultdict(set))
+    left: dict = field(default_factory=lambda: defaultdict(set))
+    refreshed: float = field(default=0)
+
+    @staticmethod
+    def key(channel_id: str) -> str:
+        return f"presence:{channel_id}"
+
+    def join(self, channel_id: str, client_id: str) -> None:
+        self.members[channel_id].add(client_id)
+        self.joined[channel_id].add(client_id)
+
+    def leave(self, channel_id: str, client_id: str) -> None:
+        self.members[channel_id].discard(client_id)
+        if not self.members[channel_id]:
+            del self.members[channel_id]
+        if client_id in self.joined[channel_id]:
+            # client left before its join was announced
+            self.joined[channel_id].discard(client_id)
+        else:
+            self.left[channel_id].add(client_id)
+
+    async def get_members(self, channel_id: str) -> list[str]:
+        """
+        Return ids of clients connected to codespace on every node
+        """
+
+        members = await self.redis.zrangebyscore(
+            self.key(channel_id), time.time(), "+inf"
+        )
+        # local joins and leaves may not be flushed yet
+        return sorted(
+            set(members) - self.left.get(channel_id, set())
+            | self.members.get(channel_id, set())
+        )
+
+    async def run(self) -> None:
+        """
+        Flush presence changes until task is cancelled
+        """
+
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                # changes which weren't flushed are flushed next time
+                logging.exception("Presence flush failed")
+
+    async def flush(self) -> None:
+        """
+        Save joins and leaves in redis and publish them to channels. Every
+        interval seconds all local members are refreshed and expired members
+        of their codespaces are removed
+        """
+
+        now = time.time()
+        refresh = now - self.refreshed >= self.interval
+        if not refresh and not self.joined and not self.left:
+            return
+
+        joined, self.joined = self.joined, defaultdict(set)
+        left, self.left = self.left, defaultdict(set)
+        try:
+            await self.save(now, refresh, joined, left)
+        except BaseException:
+            self.restore(joined, left)
+            raise
+
+    def restore(self, joined: dict, left: dict) -> None:
+        """
+        Merge joins and leaves which weren't flushed with ones made since
+        """
+
+        for channel_id, client_ids in joined.items():
+            for client_id in client_ids:
+                if client_id in self.left[channel_id]:
+                    # client left before its join was announced
+                    self.left[channel_id].discard(client_id)
+                else:
+                    self.joined[channel_id].add(client_id)
+        for channel_id, client_ids in left.items():
+            self.left[channel_id].update(client_ids)
+
+    async def save(self, now: float, refresh: bool, joined: dict, left: dict) -> None:
+        expires = now + self.ttl
+        # with refresh every local member is saved, otherwise only new ones
+        saved = self.members if refresh else joined
+        swept = list(self.members) if refresh else []
+
+        pipeline = self.redis.pipeline(transaction=False)
+        for channel_id, client_ids in saved.items():
+            if client_ids:
+                key = self.key(channel_id)
+                pipeline.zadd(key, {client_id: expires for client_id in client_ids})
+                # codespaces abandoned by every node are removed
+                pipeline.expire(key, int(self.ttl) + 1)
+        for channel_id, client_ids in left.items():
+            pipeline.zrem(self.key(channel_id), *client_ids)
+        for channel_id in swept:
+            pipeline.zrangebyscore(self.key(channel_id), "-inf", now)
+            pipeline.zremrangebyscore(self.key(channel_id), "-inf", now)
+        results = await pipeline.execute()
+
+        # results of sweep are at the end, zrangebyscore and
+        # zremrangebyscore for every swept codespace
+        sweep_results = results[len(results) - 2 * len(swept) :]  # noqa
+        for channel_id, stale in zip(swept, sweep_results[::2]):
+            if stale:
+                PRESENCE_STALE.inc(amount=len(stale))
+                left[channel_id].update(stale)
+
+        if refresh:
+            self.refreshed = now
+
+        for channel_id in joined.keys() | left.keys():
+            if joined[channel_id] or left[channel_id]:
+                await self.publish(channel_id, joined[channel_id], left[channel_id])
+
+    async def publish(self, channel_id: str, joined: set, left: set) -> None:
+        message = {
+            "operation": "presence",
+            "data": {"joined": sorted(joined), "left": sorted(left)},
+        }
+        await self.broker.publish(channel_id, json.dumps(message))
+
+
+presence = Presence()
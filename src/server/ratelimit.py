@@ -0,0 +1,144 @@
+from server.base import AbstractClient
+from server.metrics import Counter, REGISTRY
+from dataclasses import dataclass, field
+import asyncio
+import json
+import time
+import os
+
+
+@dataclass(repr=False, slots=True)
+class TokenBucket:
+    """
+    Token bucket refilled with 'rate' tokens per second up to 'capacity'
+    """
+
+    rate: float
+    capacity: float
+    tokens: float = field(init=False)
+    updated: float = field(init=False, default_factory=time.monotonic)
+
+    def __post_init__(self):
+        self.tokens = self.capacity
+
+    def refill(self, now: float) -> float:
+        """
+        Add tokens gained since last update and return current tokens amount
+        """
+
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        return self.tokens
+
+    def take(self) -> float:
+        """
+        Take one token (tokens can go below zero) and return number of
+        seconds after which taken token will be available
+        """
+
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+
+@dataclass(repr=False, slots=True)
+class RateLimiter:
+    """
+    This class is used to limit number of messages per client and per channel.
+    Limits are defined per operation with RATE_LIMITS environment variable
+    in following format ("*" key is used for operations without own limit):
+    {
+        "operation_name": {"client": [rate, burst], "channel": [rate, burst]},
+    }
+    """
+
+    limits: dict = field(
+        default_factory=lambda: json.loads(os.environ.get("RATE_LIMITS", "{}"))
+    )
+    # what to do with message over the limit, one of: drop, delay, close
+    action: str = field(
+        default_factory=lambda: os.environ.get("RATE_LIMIT_ACTION", "drop")
+    )
+    close_code: int = field(
+        default_factory=lambda: int(os.environ.get("RATE_LIMIT_CLOSE_CODE", 1008))
+    )
+    # buckets are grouped by client id / channel id so they can be
+    # easily removed when client disconnects or channel is destroyed
+    buckets: dict = field(init=False, default_factory=lambda: dict())
+    # number of messages per (operation, result) where result is one
+    # of allowed, dropped, delayed, closed
+    counters: Counter = field(
+        init=False,
+        default_factory=lambda: Counter(
+            "ws_rate_limit_messages_total",
+            "Messages checked by rate limiter",
+            ("operation", "result"),
+        ),
+    )
+
+    def __post_init__(self):
+        if self.action not in ("drop", "delay", "close"):
+            raise ValueError(f"'{self.action}' is not valid rate limit action")
+
+    async def acquire(self, operation: str, client: AbstractClient) -> bool:
+        """
+        Check if client can perform operation. Depending on action message
+        over the limit is dropped, delayed until tokens are available or
+        client connection is closed. Returns True if message can be processed
+        """
+
+        if not (limit := self.limits.get(operation, self.limits.get("*"))):
+            self.counters.inc(operation, "allowed")
+            return True
+
+        now = time.monotonic()
+        buckets = [
+            self.get_bucket(key, operation, limit[scope])
+            for scope, key in (("client", client.id), ("channel", client.channel_id))
+            if scope in limit
+        ]
+        for bucket in buckets:
+            bucket.refill(now)
+
+        if self.action == "delay":
+            if delay := max((bucket.take() for bucket in buckets), default=0):
+                self.counters.inc(operation, "delayed")
+                await asyncio.sleep(delay)
+            else:
+                self.counters.inc(operation, "allowed")
+            return True
+
+        if all(bucket.tokens >= 1 for bucket in buckets):
+            for bucket in buckets:
+                bucket.take()
+            self.counters.inc(operation, "allowed")
+            return True
+
+        if self.action == "close":
+            self.counters.inc(operation, "closed")
+            await client.close(self.close_code, "Rate limit exceeded")
+        else:
+            self.counters.inc(operation, "dropped")
+        return False
+
+    def get_bucket(self, key: str, operation: str, limit: list) -> TokenBucket:
+        """
+        Return bucket of operation for given client or channel id
+        """
+
+        buckets = self.buckets.setdefault(key, {})
+        if (bucket := buckets.get(operation)) is None:
+            bucket = buckets[operation] = TokenBucket(*limit)
+        return bucket
+
+    def forget(self, key: str) -> None:
+        """
+        Remove buckets of client or channel with given id
+        """
+
+        self.buckets.pop(key, None)
+
+
+rate_limiter = RateLimiter()
+REGISTRY.register(rate_limiter.counters)
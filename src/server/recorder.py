@@ -0,0 +1,114 @@
+from server.redis import REDIS
+from server.storage import document_storage
+from dataclasses import dataclass, field
+from typing import TextIO
+import aioredis
+import zlib
+import json
+import time
+import os
+
+
+@dataclass(repr=False, slots=True)
+class Session:
+    file: TextIO
+    started: float
+    size: int = 0
+    truncated: bool = False
+
+
+@dataclass(repr=False, slots=True)
+class Recorder:
+    """
+    This class records websocket traffic of codespaces, so it can be
+    replayed with benchmarks.replay. Every recorded session (from first
+    client joining codespace to last one leaving it) is saved in separate
+    file in directory, one json list per line:
+        ["s", unix time, document]       document when session started
+        ["i", seconds, client id, frame] frame received from client
+        ["o", seconds, frame]            frame broadcasted to clients
+        ["x", seconds]                   session exceeded max_bytes
+        ["e", seconds, document]         document when session ended
+    Seconds are counted from session start. Codespaces are sampled by hash
+    of their uuid, so every server instance records the same codespaces.
+    Recorder is disabled when directory is not set
+    """
+
+    directory: str | None = field(
+        default_factory=lambda: os.environ.get("RECORD_DIR")
+    )
+    sample_rate: float = field(
+        default_factory=lambda: float(os.environ.get("RECORD_SAMPLE_RATE", 1))
+    )
+    max_bytes: int = field(
+        default_factory=lambda: int(os.environ.get("RECORD_MAX_BYTES", 10485760))
+    )
+    redis: aioredis.Redis = field(default=REDIS)
+    storage: object = field(default=document_storage)
+    # codespace uuid: recorded session
+    sessions: dict = field(default_factory=dict)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def sampled(self, channel_id: str) -> bool:
+        return zlib.crc32(channel_id.encode()) / 2**32 < self.sample_rate
+
+    async def start(self, channel_id: str) -> None:
+        """
+        Start recording session of codespace if it is sampled
+        """
+
+        if (
+            not self.enabled
+            or channel_id in self.sessions
+            or not self.sampled(channel_id)
+        ):
+            return
+
+        started = time.time()
+        path = os.path.join(self.directory, f"{channel_id}-{int(started)}.rec")
+        session = Session(file=open(path, "a", buffering=65536), started=started)
+        self.sessions[channel_id] = session
+        document = await self.storage.read(self.redis, channel_id)
+        self.write(session, ["s", started, document], force=True)
+
+    def inbound(self, channel_id: str, client_id: str, frame: str) -> None:
+        if (session := self.sessions.get(channel_id)) is not None:
+            self.write(session, ["i", time.time() - session.started, client_id, frame])
+
+    def outbound(self, channel_id: str, frame: str) -> None:
+        if (session := self.sessions.get(channel_id)) is not None:
+            self.write(session, ["o", time.time() - session.started, frame])
+
+    async def stop(self, channel_id: str) -> None:
+        """
+        Finish recording session of codespace
+        """
+
+        if (session := self.sessions.pop(channel_id, None)) is None:
+            return
+
+        if not session.truncated:
+            document = await self.storage.read(self.redis, channel_id)
+            self.write(
+                session, ["e", time.time() - session.started, document], force=True
+            )
+        session.file.close()
+
+    def write(self, session: Session, record: list, force: bool = False) -> None:
+        if session.truncated:
+            return
+
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        if not force and session.size + len(line) > self.max_bytes:
+            # rest of session isn't recorded
+            session.truncated = True
+            line = json.dumps(["x", time.time() - session.started]) + "\n"
+
+        session.file.write(line)
+        session.size += len(line)
+
+
+recorder = Recorder()
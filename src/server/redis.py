@@ -1,10 +1,112 @@
+from server.metrics import REDIS_LATENCY, REDIS_PIPELINE_SIZE
 import aioredis
+import asyncio
+import time
 import os
 
-REDIS = aioredis.Redis(
-    host=os.environ.get("REDIS_HOST"),
-    port=os.environ.get("REDIS_PORT"),
-    password=os.environ.get("REDIS_PASS"),
-    encoding="utf-8",
-    decode_responses=True,
+
+# commands which can block connection, they would stall every command
+# pipelined with them
+BLOCKING_COMMANDS = frozenset(
+    (
+        "BLPOP",
+        "BRPOP",
+        "BRPOPLPUSH",
+        "BLMOVE",
+        "BZPOPMIN",
+        "BZPOPMAX",
+        "XREAD",
+        "XREADGROUP",
+        "WAIT",
+    )
 )
+
+
+class Redis(aioredis.Redis):
+    """
+    Redis client that measures latency of every command. With auto_pipeline
+    commands issued by all coroutines in the same event loop tick are sent
+    in one pipeline and every caller gets result of its own command.
+    Pipelines are flushed one after another, so commands are executed in
+    order they were issued
+    """
+
+    def __init__(self, *args, auto_pipeline: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.auto_pipeline = auto_pipeline
+        # list of (args, options, future) waiting for next flush
+        self.pending = []
+        self.flusher = None
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            if self.auto_pipeline and args[0] not in BLOCKING_COMMANDS:
+                return await self.enqueue(args, options)
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.observe(time.perf_counter() - start, args[0])
+
+    def enqueue(self, args: tuple, options: dict) -> asyncio.Future:
+        """
+        Add command to next pipeline, returned future is resolved with
+        command result
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((args, options, future))
+        if self.flusher is None:
+            # task starts in next loop tick, so it collects every command
+            # issued in current one
+            self.flusher = asyncio.create_task(self.flush())
+        return future
+
+    async def flush(self) -> None:
+        """
+        Send pending commands in pipelines until there are none left.
+        Commands issued while pipeline is executed are sent in next one
+        """
+
+        try:
+            while self.pending:
+                commands, self.pending = self.pending, []
+                REDIS_PIPELINE_SIZE.observe(len(commands))
+                await self.execute_pipeline(commands)
+        finally:
+            self.flusher = None
+
+    async def execute_pipeline(self, commands: list) -> None:
+        pipeline = self.pipeline(transaction=False)
+        for args, options, _ in commands:
+            pipeline.execute_command(*args, **options)
+
+        try:
+            results = await pipeline.execute(raise_on_error=False)
+        except Exception as error:
+            results = [error] * len(commands)
+
+        for (_, _, future), result in zip(commands, results):
+            # future is cancelled when caller was cancelled
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+if os.environ.get("REDIS_FAKE"):
+    # in process redis stand-in (fakeredis from dev requirements) used
+    # by benchmarks when local redis is not available
+    from fakeredis import aioredis as fakeredis
+
+    REDIS = fakeredis.FakeRedis(decode_responses=True)
+else:
+    REDIS = Redis(
+        host=os.environ.get("REDIS_HOST"),
+        port=os.environ.get("REDIS_PORT"),
+        password=os.environ.get("REDIS_PASS"),
+        encoding="utf-8",
+        decode_responses=True,
+        auto_pipeline=os.environ.get("REDIS_AUTO_PIPELINE") == "1",
+    )
@@ -0,0 +1,162 @@
+from server.client import Client
+from server.channel import Channel, ChannelCache
+from server.handlers.message_handler import message_handler
+from server.tracing import tracer
+from server.outbox import HIGH
+from server.metrics import (
+    BROADCAST_DURATION,
+    BROADCAST_SIZE,
+    MESSAGES_OUT,
+    operation_of,
+)
+from sanic import Websocket
+from dataclasses import dataclass, field
+import asyncio
+import time
+import os
+
+
+@dataclass(frozen=True, repr=False, slots=True)
+class RelayClient(Client):
+    """
+    Client used in relay mode. Relay clients are view only so incoming
+    websocket messages are never dispatched to message handler
+    """
+
+    async def listen(self) -> None:
+        """
+        Drain incoming websocket messages until the client disconnects
+        """
+
+        # frames still have to be read to notice closed connection,
+        # but they are ignored without parsing them
+        async for _ in self.protocol:
+            continue
+
+
+@dataclass(repr=False, slots=True)
+class RelayChannel(Channel):
+    """
+    Channel used in relay mode. Messages received from pubsub are buffered
+    and sent to clients in batches, so one channel with thousands of
+    viewers needs only one pubsub subscription and one fan out per batch
+    """
+
+    pending: list = field(init=False, default_factory=lambda: [])
+    flush_task: asyncio.Task = field(init=False, default=None)
+    # time in seconds for which messages are collected before fan out
+    flush_interval: float = field(
+        init=False,
+        default_factory=lambda: int(os.environ.get("RELAY_FLUSH_INTERVAL", 50)) / 1000,
+    )
+    # number of clients which messages are sent to concurrently, after every
+    # slice control is given back to event loop. Messages to congested
+    # clients are queued in their outboxes, so they don't hold up slice
+    fanout_slice: int = field(
+        init=False,
+        default_factory=lambda: int(os.environ.get("RELAY_FANOUT_SLICE", 500)),
+    )
+
+    async def broadcast(self, message: str) -> None:
+        """
+        Add message to pending batch and schedule its flush
+        """
+
+        self.pending.append(message["data"])
+        if (trace := message.get("trace")) is not None:
+            # relay traces end when message is received from pubsub
+            tracer.finish(trace)
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_later())
+
+    async def flush_later(self) -> None:
+        """
+        Wait flush interval and then flush pending messages, until there
+        are no pending messages. Only one flush runs at a time, so batches
+        are sent in order they were received
+        """
+
+        try:
+            while self.pending:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        finally:
+            self.flush_task = None
+
+    async def flush(self) -> None:
+        """
+        Send all pending messages to connected clients
+        """
+
+        payloads, self.pending = self.pending, []
+        if not payloads:
+            return
+
+        # copy clients because set can change when awaiting sends
+        clients = list(self.clients)
+        start = time.perf_counter()
+        for first in range(0, len(clients), self.fanout_slice):
+            await asyncio.gather(
+                *(
+                    self.send_batch(client, payloads)
+                    for client in clients[first : first + self.fanout_slice]  # noqa
+                ),
+                return_exceptions=True,
+            )
+
+        BROADCAST_DURATION.observe(time.perf_counter() - start)
+        BROADCAST_SIZE.observe(len(clients))
+        for payload in payloads:
+            MESSAGES_OUT.inc(operation_of(payload), amount=len(clients))
+
+    async def send_batch(self, client: Client, payloads: list) -> None:
+        """
+        Send batch of messages to single client. When client becomes
+        congested remaining messages are queued in its outbox
+        """
+
+        for i, payload in enumerate(payloads):
+            if (outbox := self.outboxes.get(client)) is None and (
+                client.send_queue_size() > self.outbox_threshold
+            ):
+                outbox = self.open_outbox(client)
+            if outbox is not None:
+                # relay keeps order of all messages
+                for queued in payloads[i:]:
+                    outbox.put(queued, HIGH)
+                return
+            await client.send(payload)
+
+    async def expired(self) -> None:
+        """
+        Drop pending messages and close connection for every client
+        """
+
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+        self.pending, self.flush_task = [], None
+        for outbox in self.outboxes.values():
+            outbox.task.cancel()
+        await Channel.expired(self)
+
+    async def create_client(self, websocket: Websocket, mode: str) -> Client:
+        """
+        Create and return new relay client instance
+        """
+
+        return RelayClient(
+            protocol=websocket,
+            mode=mode,
+            channel_id=self.channel_id,
+            message_handler=message_handler,
+            channel=self,
+        )
+
+
+@dataclass(repr=False, slots=True)
+class RelayChannelCache(ChannelCache):
+    """
+    This class is used to store and manage relay channel instances
+    """
+
+    channel_class = RelayChannel
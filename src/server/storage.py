@@ -0,0 +1,242 @@
+from server.base import AbstractDocumentStorage
+from server.codec import DocumentCodec, document_codec
+from dataclasses import dataclass, field
+from typing import Callable
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+import aioredis
+import json
+import os
+
+
+@dataclass(repr=False, slots=True)
+class PlainDocumentStorage(AbstractDocumentStorage):
+    """
+    Stores whole codespace document in single 'code' field of redis hash
+    """
+
+    codec: DocumentCodec = field(default_factory=lambda: document_codec)
+
+    async def read(self, redis: aioredis.Redis, key: str) -> str | None:
+        """
+        Return document or None if it doesn't exist
+        """
+
+        return self.codec.decode(await redis.hget(key, "code"))
+
+    async def update(
+        self, redis: aioredis.Redis, key: str, message: dict, apply: Callable
+    ) -> bool:
+        """
+        Apply changes from message to document. Returns False if
+        document doesn't exist
+        """
+
+        if (code := await redis.hget(key, "code")) is None:
+            return False
+
+        code = apply(self.codec.decode(code), message)
+        if not isinstance(code, str):
+            # changes of large document are applied off event loop
+            code = await code
+        await redis.hset(key, "code", self.codec.encode(code))
+        return True
+
+    async def materialize(self, redis: aioredis.Redis, key: str) -> None:
+        # document is already stored in 'code' field
+        pass
+
+
+@dataclass(repr=False, slots=True)
+class ChunkedDocumentStorage(AbstractDocumentStorage):
+    """
+    Stores codespace document split into segments. Every segment is saved in
+    separate 'seg:<id>' field of redis hash and 'index' field contains
+    list of [segment id, segment length] pairs in document order:
+    {
+        "next": int,
+        "segments": [[int, int], ...],
+    }
+    Thanks to that edit reads and writes only segments it touches. Documents
+    saved in 'code' field are converted on first edit and 'materialize'
+    converts document back, for readers that expect single 'code' field.
+    Until then 'code' field keeps document as it was before conversion.
+    Edits and materialization watch the key, so they are retried instead
+    of mixing segments when other node changes document at the same time
+    """
+
+    segment_size: int = field(
+        default_factory=lambda: int(os.environ.get("CODESPACE_SEGMENT_SIZE", 4096))
+    )
+    # if True segments are split on last new line before segment size
+    split_lines: bool = field(
+        default_factory=lambda: os.environ.get("CODESPACE_SEGMENT_MODE") == "lines"
+    )
+    codec: DocumentCodec = field(default_factory=lambda: document_codec)
+
+    def split(self, text: str) -> list[str]:
+        """
+        Split text into segments not longer than segment size
+        """
+
+        segments, start = [], 0
+        while start < len(text):
+            end = start + self.segment_size
+            if self.split_lines and end < len(text):
+                # keep new line character at the end of segment
+                if (new_line := text.rfind("\n", start, end)) != -1:
+                    end = new_line + 1
+            segments.append(text[start:end])
+            start = end
+        return segments
+
+    async def read(self, redis: aioredis.Redis, key: str) -> str | None:
+        """
+        Join segments and return document or None if it doesn't exist
+        """
+
+        while True:
+            index, code = await redis.hmget(key, "index", "code")
+            if index is None:
+                return self.codec.decode(code)
+
+            fields = [f"seg:{seg_id}" for seg_id, _ in json.loads(index)["segments"]]
+            # segments are removed when document is edited or materialized
+            # after index was read, index is read again in such case
+            if (text := await self.read_segments(redis, key, fields)) is not None:
+                return text
+
+    async def read_segments(
+        self, redis: aioredis.Redis, key: str, fields: list
+    ) -> str | None:
+        """
+        Return joined text of segments saved in given fields or None if
+        any of them doesn't exist
+        """
+
+        if not fields:
+            return ""
+        segments = await redis.hmget(key, fields)
+        if None in segments:
+            return None
+        return "".join(map(self.codec.decode, segments))
+
+    async def update(
+        self, redis: aioredis.Redis, key: str, message: dict, apply: Callable
+    ) -> bool:
+        """
+        Apply changes from message to segments they touch. Returns False if
+        document doesn't exist
+        """
+
+        async def update(pipe: aioredis.client.Pipeline) -> bool:
+            return await self.update_segments(pipe, key, message, apply)
+
+        return await redis.transaction(update, key, value_from_callable=True)
+
+    async def update_segments(
+        self,
+        pipe: aioredis.client.Pipeline,
+        key: str,
+        message: dict,
+        apply: Callable,
+    ) -> bool:
+        """
+        Read segments touched by changes from watched pipeline and queue
+        writes of changed ones in its transaction
+        """
+
+        index, code = await pipe.hmget(key, "index", "code")
+        if index is None:
+            if code is None:
+                return False
+            # convert document saved in 'code' field into segments
+            code = apply(self.codec.decode(code), message)
+            if not isinstance(code, str):
+                code = await code
+            pipe.multi()
+            self.replace(pipe, key, {"next": 0, "segments": []}, 0, 0, code)
+            return True
+
+        if not (changes := message["changes"]):
+            return True
+
+        index = json.loads(index)
+        segments = index["segments"]
+        # offsets of segments ends
+        ends = list(accumulate(length for _, length in segments))
+        start = min(change["from"] for change in changes)
+        end = max(change["to"] for change in changes)
+        # first segment that contains start and last segment that contains end
+        first = min(bisect_right(ends, start), max(len(segments) - 1, 0))
+        last = min(bisect_left(ends, end), len(segments) - 1)
+        last = max(first, last)
+        base = ends[first] - segments[first][1] if segments else 0
+
+        fields = [f"seg:{seg_id}" for seg_id, _ in segments[first : last + 1]]  # noqa
+        if (text := await self.read_segments(pipe, key, fields)) is None:
+            # other node changed document after index was read
+            raise aioredis.WatchError(key)
+        # move changes positions so they are relative to first segment
+        shifted = [
+            {**change, "from": change["from"] - base, "to": change["to"] - base}
+            for change in changes
+        ]
+        text = apply(text, {**message, "changes": shifted})
+        if not isinstance(text, str):
+            text = await text
+        pipe.multi()
+        self.replace(pipe, key, index, first, last + 1, text)
+        return True
+
+    def replace(
+        self,
+        pipe: aioredis.client.Pipeline,
+        key: str,
+        index: dict,
+        first: int,
+        last: int,
+        text: str,
+    ) -> None:
+        """
+        Queue replacement of segments from first to last (exclusive) with
+        segments of text
+        """
+
+        removed = [f"seg:{seg_id}" for seg_id, _ in index["segments"][first:last]]
+        mapping, added = {}, []
+        for segment in self.split(text):
+            mapping[f"seg:{index['next']}"] = self.codec.encode(segment)
+            added.append([index["next"], len(segment)])
+            index["next"] += 1
+
+        index["segments"][first:last] = added
+        mapping["index"] = json.dumps(index, separators=(",", ":"))
+        pipe.hset(key, mapping=mapping)
+        if removed:
+            pipe.hdel(key, *removed)
+
+    async def materialize(self, redis: aioredis.Redis, key: str) -> None:
+        """
+        Join segments into 'code' field and remove them
+        """
+
+        async def materialize(pipe: aioredis.client.Pipeline) -> None:
+            if (index := await pipe.hget(key, "index")) is None:
+                return
+
+            segments = json.loads(index)["segments"]
+            fields = [f"seg:{seg_id}" for seg_id, _ in segments]
+            if (code := await self.read_segments(pipe, key, fields)) is None:
+                raise aioredis.WatchError(key)
+            pipe.multi()
+            pipe.hset(key, "code", self.codec.encode(code))
+            pipe.hdel(key, "index", *fields)
+
+        await redis.transaction(materialize, key)
+
+
+if os.environ.get("CODESPACE_STORAGE") == "chunked":
+    document_storage = ChunkedDocumentStorage()
+else:
+    document_storage = PlainDocumentStorage()
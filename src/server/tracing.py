@@ -0,0 +1,178 @@
+from server.metrics import TRACE_STAGE
+from dataclasses import dataclass, field
+from collections import deque
+import logging
+import secrets
+import random
+import json
+import time
+import os
+
+
+# key under which trace context is carried inside published message
+TRACE_KEY = "_trace"
+# json.dumps output contains this only if message has trace context (in
+# inserted text quotes are escaped), so untraced messages aren't parsed
+TRACE_MARKER = f'"{TRACE_KEY}": '
+
+
+class LogSink:
+    """
+    Write every finished trace to log
+    """
+
+    def export(self, trace: dict) -> None:
+        logging.info("trace %s", json.dumps(trace))
+
+
+class RingSink:
+    """
+    Keep last finished traces in memory
+    """
+
+    def __init__(self, size: int):
+        self.traces = deque(maxlen=size)
+
+    def export(self, trace: dict) -> None:
+        self.traces.append(trace)
+
+
+class OTLPFileSink:
+    """
+    Append finished traces to file in OTLP json format, one export request
+    per line. Every stage is saved as span lasting from previous stage
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "a", buffering=1)
+
+    def export(self, trace: dict) -> None:
+        spans, previous = [], None
+        for stage, timestamp in trace["stages"]:
+            start = timestamp if previous is None else previous
+            spans.append(
+                {
+                    "traceId": trace["id"],
+                    "spanId": secrets.token_hex(8),
+                    "name": stage,
+                    "startTimeUnixNano": str(int(start * 1e9)),
+                    "endTimeUnixNano": str(int(timestamp * 1e9)),
+                }
+            )
+            if stage != "send":
+                previous = timestamp
+
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": "websocket-server"},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+                }
+            ]
+        }
+        self.file.write(json.dumps(request, separators=(",", ":")) + "\n")
+
+
+def create_sink():
+    """
+    Create sink configured with TRACE_SINK environment variable
+    """
+
+    match os.environ.get("TRACE_SINK", "log"):
+        case "ring":
+            return RingSink(int(os.environ.get("TRACE_RING_SIZE", 1000)))
+        case "file":
+            return OTLPFileSink(os.environ.get("TRACE_FILE", "traces.jsonl"))
+        case _:
+            return LogSink()
+
+
+@dataclass(repr=False, slots=True)
+class Tracer:
+    """
+    This class is used to trace sampled messages from receiving them to
+    sending them to clients. Trace context is saved in message under
+    TRACE_KEY and contains list of [stage, timestamp] pairs:
+    {
+        "id": str,
+        "stages": [[str, float], ...],
+    }
+    Timestamps are unix time so they can be compared between nodes
+    """
+
+    sample_rate: float = field(
+        default_factory=lambda: float(os.environ.get("TRACE_SAMPLE_RATE", 0))
+    )
+    sink: object = field(default=None)
+
+    def start(self, message: dict, received: float) -> None:
+        """
+        Start trace of message with given probability
+        """
+
+        # clients can't send own trace context
+        message.pop(TRACE_KEY, None)
+        if self.sample_rate and random.random() < self.sample_rate:
+            message[TRACE_KEY] = {
+                "id": secrets.token_hex(16),
+                "stages": [["receive", received], ["parse", time.time()]],
+            }
+
+    def mark(self, message: dict, stage: str) -> None:
+        """
+        Record stage if message is traced
+        """
+
+        if (trace := message.get(TRACE_KEY)) is not None:
+            trace["stages"].append([stage, time.time()])
+
+    def extract(self, payload: str) -> tuple[str, dict | None]:
+        """
+        Remove trace context from message received from pubsub. Returns
+        payload that should be sent to clients and trace context
+        """
+
+        if TRACE_MARKER not in payload:
+            return payload, None
+
+        # marker can be also found in nested objects sent by clients, only
+        # trace context saved by server is removed
+        message = json.loads(payload)
+        if not isinstance(message, dict) or not isinstance(
+            trace := message.pop(TRACE_KEY, None), dict
+        ):
+            return payload, None
+        if not isinstance(trace.get("stages"), list):
+            return payload, None
+
+        trace["stages"].append(["pubsub", time.time()])
+        return json.dumps(message), trace
+
+    def finish(self, trace: dict) -> None:
+        """
+        Observe latency of every stage and export trace to sink
+        """
+
+        stages = trace["stages"]
+        previous = None
+        for stage, timestamp in stages:
+            if previous is not None:
+                TRACE_STAGE.observe(timestamp - previous, stage)
+            # every send is measured from receiving message from pubsub
+            if stage != "send":
+                previous = timestamp
+        TRACE_STAGE.observe(stages[-1][1] - stages[0][1], "total")
+
+        if self.sink is None:
+            self.sink = create_sink()
+        self.sink.export(trace)
+
+
+tracer = Tracer()
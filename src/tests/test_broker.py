@@ -0,0 +1,77 @@
+from unittest import IsolatedAsyncioTestCase, mock
+from server.broker import MemoryBroker, RedisBroker
+
+
+class TestRedisBroker(IsolatedAsyncioTestCase):
+    """
+    Test RedisBroker class
+    """
+
+    async def test_publish_uses_redis(self):
+        """
+        Test if message is published via redis pub/sub
+        """
+
+        redis = mock.AsyncMock()
+        broker = RedisBroker(redis)
+        await broker.publish("channel_id", "msg")
+        redis.publish.assert_called_once_with("channel_id", "msg")
+
+    def test_pubsub_uses_redis(self):
+        """
+        Test if redis pubsub is returned
+        """
+
+        redis = mock.MagicMock()
+        self.assertEqual(RedisBroker(redis).pubsub(), redis.pubsub.return_value)
+
+
+class TestMemoryBroker(IsolatedAsyncioTestCase):
+    """
+    Test MemoryBroker class
+    """
+
+    async def test_publish_delivers_to_subscribers(self):
+        """
+        Test if published message is delivered to every channel subscriber
+        and not to subscribers of other channels
+        """
+
+        broker = MemoryBroker()
+        first, second, other = broker.pubsub(), broker.pubsub(), broker.pubsub()
+        await first.subscribe("channel_id")
+        await second.subscribe("channel_id", "__keyspace@0__:channel_id")
+        await other.subscribe("other")
+
+        self.assertEqual(await broker.publish("channel_id", "msg"), 2)
+        for pubsub in (first, second):
+            message = await pubsub.listen().__anext__()
+            self.assertEqual(message["type"], "message")
+            self.assertEqual(message["channel"], "channel_id")
+            self.assertEqual(message["data"], "msg")
+        self.assertTrue(other.queue.empty())
+
+    async def test_publish_without_subscribers(self):
+        """
+        Test if publishing to channel without subscribers does nothing
+        """
+
+        broker = MemoryBroker()
+        self.assertEqual(await broker.publish("channel_id", "msg"), 0)
+        self.assertEqual(broker.subscribers, {})
+
+    async def test_reset_stops_listen(self):
+        """
+        Test if reset unsubscribes all channels and ends listen generator
+        """
+
+        broker = MemoryBroker()
+        pubsub = broker.pubsub()
+        await pubsub.subscribe("channel_id", "__keyspace@0__:channel_id")
+        await broker.publish("channel_id", "msg")
+        await pubsub.reset()
+
+        messages = [message["data"] async for message in pubsub.listen()]
+        self.assertEqual(messages, ["msg"])
+        self.assertEqual(broker.subscribers, {})
+        self.assertEqual(await broker.publish("channel_id", "msg"), 0)
@@ -1,5 +1,6 @@
 from unittest import IsolatedAsyncioTestCase, mock
 from server.channel import Channel, ChannelCache
+import asyncio
 
 
 class TestChannel(IsolatedAsyncioTestCase):
@@ -14,6 +15,13 @@ class TestChannel(IsolatedAsyncioTestCase):
         self.channel = Channel(
             channel_id=self.channel_id, pubsub=self.pubsub, cache=self.cache
         )
+        patcher = mock.patch("server.channel.presence")
+        self.presence = patcher.start()
+        self.presence.get_members = mock.AsyncMock(return_value=[])
+        self.addCleanup(patcher.stop)
+
+    def client(self, send_queue_size: int = 0) -> mock.AsyncMock:
+        return mock.AsyncMock(send_queue_size=mock.Mock(return_value=send_queue_size))
 
     @mock.patch("server.channel.Channel.broadcast")
     async def test_listen_method_with_message_type_message(self, patched_broadcast):
@@ -39,6 +47,23 @@ class TestChannel(IsolatedAsyncioTestCase):
         await self.channel.listen()
         self.assertEqual(self.channel.handled_message.call_count, 1)
 
+    @mock.patch("server.channel.Channel.broadcast")
+    async def test_listen_method_with_unhandled_keyspace_event(
+        self, patched_broadcast
+    ):
+        """
+        Test if keyspace events not handled by channel aren't broadcasted
+        """
+
+        message = {
+            "type": "message",
+            "channel": f"__keyspace@0__:{self.channel_id}",
+            "data": "hset",
+        }
+        self.pubsub.listen.return_value.__aiter__.return_value = [message]
+        await self.channel.listen()
+        self.assertEqual(patched_broadcast.call_count, 0)
+
     async def test_expired_method(self):
         """
         Test if all clients connections are closed
@@ -66,12 +91,24 @@ class TestChannel(IsolatedAsyncioTestCase):
         """
         Test if broadcast method send message to every connected client
         """
-        clients = {mock.AsyncMock() for _ in range(4)}
+        clients = {self.client() for _ in range(4)}
         self.channel.clients = clients
         await self.channel.broadcast({"data": "some_data"})
         for client in clients:
             client.send.assert_called_once_with("some_data")
 
+    @mock.patch("server.channel.tracer")
+    async def test_broadcast_method_with_trace(self, patched_tracer):
+        """
+        Test if every send is recorded in trace and trace is finished
+        """
+
+        self.channel.clients = {self.client() for _ in range(2)}
+        trace = {"stages": [["pubsub", 1]]}
+        await self.channel.broadcast({"data": "some_data", "trace": trace})
+        self.assertEqual([stage for stage, _ in trace["stages"]].count("send"), 2)
+        patched_tracer.finish.assert_called_once_with(trace)
+
     async def test_create_client_method(self):
         """
         Test if Client will be initialized with valid parameters
@@ -89,8 +126,32 @@ class TestChannel(IsolatedAsyncioTestCase):
         Test if register method create client instance and add it to clients set
         """
 
-        await self.channel.register("client")
-        self.assertIn("client", self.channel.clients)
+        client = mock.Mock(public_id="client_id", mode="edit")
+        await self.channel.register(client)
+        self.assertIn(client, self.channel.clients)
+        self.presence.join.assert_called_once_with(self.channel_id, "client_id")
+
+    async def test_register_and_leave_with_view_only_client(self):
+        """
+        Test if view only client isn't member of codespace
+        """
+
+        client = mock.AsyncMock(public_id="client_id", mode="view_only")
+        self.channel.clients = {mock.AsyncMock()}
+        await self.channel.register(client)
+        await self.channel.leave(client)
+        self.assertEqual(self.presence.join.call_count, 0)
+        self.assertEqual(self.presence.leave.call_count, 0)
+
+    async def test_register_method_with_created_client(self):
+        """
+        Test if client created by channel can be registered
+        """
+
+        client = await self.channel.create_client(mock.AsyncMock(), "edit")
+        await self.channel.register(client)
+        self.assertIn(client, self.channel.clients)
+        self.assertIs(client.channel, self.channel)
 
     async def test_leave_method(self):
         """
@@ -121,6 +182,241 @@ class TestChannel(IsolatedAsyncioTestCase):
         self.assertEqual(self.channel.pubsub.reset.call_count, 1)
         self.channel.cache.destroy_channel.assert_called_once_with(self.channel_id)
 
+    async def test_leave_method_with_last_client_flushes_documents(self):
+        """
+        Test if modified documents are written back when last client leaves
+        """
+
+        self.channel.clients = {mock.AsyncMock()}
+        self.channel.cache = mock.AsyncMock()
+        self.channel.pubsub = mock.AsyncMock()
+        self.channel.edited = {f"{self.channel_id}:file:main.py"}
+        with mock.patch(
+            "server.flusher.WriteBack.flush", new_callable=mock.AsyncMock
+        ) as patched_flush:
+            await self.channel.leave(next(iter(self.channel.clients)))
+        patched_flush.assert_called_once_with(
+            [self.channel_id, f"{self.channel_id}:file:main.py"]
+        )
+
+    async def test_leave_method_twice(self):
+        """
+        Test if second leave of the same client doesn't destroy channel again
+        """
+
+        client1 = mock.AsyncMock()
+        self.channel.clients = {client1}
+        self.channel.cache = mock.AsyncMock()
+        self.channel.pubsub = mock.AsyncMock()
+        await self.channel.leave(client1)
+        await self.channel.leave(client1)
+        self.assertEqual(client1.close.call_count, 1)
+        self.assertEqual(self.channel.cache.destroy_channel.call_count, 1)
+
+    @mock.patch(
+        "server.channel.document_storage.materialize", new_callable=mock.AsyncMock
+    )
+    async def test_leave_method_materializes_document(self, patched_materialize):
+        """
+        Test if document is materialized when last client leaves channel
+        """
+
+        self.channel.clients = {mock.AsyncMock()}
+        self.channel.cache = mock.AsyncMock()
+        self.channel.pubsub = mock.AsyncMock()
+        await self.channel.leave(next(iter(self.channel.clients)))
+        self.assertEqual(patched_materialize.call_count, 1)
+        self.assertEqual(patched_materialize.call_args.args[1], self.channel_id)
+
+    @mock.patch(
+        "server.channel.document_storage.materialize", new_callable=mock.AsyncMock
+    )
+    async def test_leave_method_with_members_on_other_node(
+        self, patched_materialize
+    ):
+        """
+        Test if document isn't materialized while other node has members
+        """
+
+        self.channel.clients = {mock.AsyncMock()}
+        self.channel.cache = mock.AsyncMock()
+        self.channel.pubsub = mock.AsyncMock()
+        self.presence.get_members.return_value = ["remote"]
+        await self.channel.leave(next(iter(self.channel.clients)))
+        self.assertEqual(patched_materialize.call_count, 0)
+        self.assertEqual(self.channel.cache.destroy_channel.call_count, 1)
+
+    @mock.patch("server.channel.Channel.broadcast")
+    async def test_listen_method_with_file_message(self, patched_broadcast):
+        """
+        Test if file of message is taken from pub/sub channel name
+        """
+
+        message = {
+            "type": "message",
+            "channel": f"{self.channel_id}:file:main.py",
+            "data": "some_data",
+        }
+        self.pubsub.listen.return_value.__aiter__.return_value = [message]
+        await self.channel.listen()
+        self.assertEqual(patched_broadcast.call_args.args[0]["file"], "main.py")
+
+    async def test_broadcast_method_with_file(self):
+        """
+        Test if file message is sent only to clients which have file open
+        """
+
+        opened, other = self.client(), self.client()
+        self.channel.clients = {opened, other}
+        self.channel.files = {"main.py": {opened}}
+        await self.channel.broadcast({"data": "some_data", "file": "main.py"})
+        opened.send.assert_called_once_with("some_data")
+        self.assertEqual(other.send.call_count, 0)
+
+    async def test_broadcast_method_with_congested_client(self):
+        """
+        Test if messages to congested client are queued in its outbox and
+        edits are sent before selections
+        """
+
+        congested = self.client(send_queue_size=10**6)
+        self.channel.clients = {congested}
+        selection = '{"client": "a", "operation": "create_selection", "n": 1}'
+        await self.channel.broadcast({"data": selection})
+        await self.channel.broadcast({"data": selection.replace("1", "2")})
+        await self.channel.broadcast({"data": '{"operation": "insert_value"}'})
+        self.assertIn(congested, self.channel.outboxes)
+        await self.channel.outboxes[congested].task
+        self.assertEqual(
+            [c.args[0] for c in congested.send.call_args_list],
+            ['{"operation": "insert_value"}', selection.replace("1", "2")],
+        )
+        self.assertEqual(self.channel.outboxes, {})
+
+    async def test_leave_method_cancels_outbox(self):
+        """
+        Test if messages queued for leaving client aren't sent
+        """
+
+        client1, client2 = self.client(send_queue_size=10**6), self.client()
+        self.channel.clients = {client1, client2}
+        await self.channel.broadcast({"data": "some_data"})
+        outbox = self.channel.outboxes[client1]
+        await self.channel.leave(client1)
+        self.assertEqual(self.channel.outboxes, {})
+        with self.assertRaises(asyncio.CancelledError):
+            await outbox.task
+        self.assertEqual(client1.send.call_count, 0)
+
+    async def test_open_file_method(self):
+        """
+        Test if channel subscribes to file channel only when file is opened
+        by first client
+        """
+
+        self.channel.pubsub = mock.AsyncMock()
+        client1, client2 = mock.AsyncMock(), mock.AsyncMock()
+        self.channel.clients = {client1, client2}
+        await self.channel.open_file(client1, "main.py")
+        await self.channel.open_file(client2, "main.py")
+        self.assertEqual(self.channel.files, {"main.py": {client1, client2}})
+        self.channel.pubsub.subscribe.assert_called_once_with(
+            f"{self.channel_id}:file:main.py"
+        )
+
+    async def test_open_file_method_with_too_many_files(self):
+        """
+        Test if client is disconnected when it opens more files than allowed
+        for client or channel
+        """
+
+        self.channel.pubsub = mock.AsyncMock()
+        self.channel.max_client_files = 2
+        self.channel.max_channel_files = 3
+        client1, client2 = self.client(), self.client()
+        self.channel.clients = {client1, client2}
+        for file_id in ["a", "b", "b", "c"]:
+            await self.channel.open_file(client1, file_id)
+        client1.close.assert_called_once_with(1011, "Too many open files")
+        await self.channel.open_file(client2, "c")
+        await self.channel.open_file(client2, "d")
+        self.assertEqual(client2.close.call_count, 1)
+        self.assertEqual(set(self.channel.files), {"a", "b", "c"})
+        # only files open at the moment count to channel limit
+        await self.channel.close_file(client1, "a")
+        await self.channel.open_file(client2, "d")
+        self.assertEqual(client2.close.call_count, 1)
+        self.assertEqual(set(self.channel.files), {"b", "c", "d"})
+
+    async def test_broadcast_method_with_changing_clients(self):
+        """
+        Test if clients can open files and leave while message is broadcasted
+        """
+
+        self.channel.pubsub = mock.AsyncMock()
+        clients = [self.client() for _ in range(3)]
+        self.channel.clients = set(clients)
+        for client in clients:
+            await self.channel.open_file(client, "main.py")
+
+        async def send(payload):
+            # let other tasks change channel while awaiting send
+            await asyncio.sleep(0)
+
+        for client in clients:
+            client.send.side_effect = send
+        new_client = self.client()
+        self.channel.clients.add(new_client)
+        await asyncio.gather(
+            self.channel.broadcast({"data": "some_data", "file": "main.py"}),
+            self.channel.broadcast({"data": "some_data"}),
+            self.channel.open_file(new_client, "main.py"),
+            self.channel.leave(clients[0]),
+        )
+
+    async def test_close_file_method(self):
+        """
+        Test if channel unsubscribes from file channel when last client
+        closes file
+        """
+
+        self.channel.pubsub = mock.AsyncMock()
+        client1, client2 = mock.AsyncMock(), mock.AsyncMock()
+        self.channel.clients = {client1, client2}
+        await self.channel.open_file(client1, "main.py")
+        await self.channel.open_file(client2, "main.py")
+        await self.channel.close_file(client1, "main.py")
+        self.assertEqual(self.channel.pubsub.unsubscribe.call_count, 0)
+        await self.channel.close_file(client2, "main.py")
+        self.assertEqual(self.channel.files, {})
+        self.channel.pubsub.unsubscribe.assert_called_once_with(
+            f"{self.channel_id}:file:main.py"
+        )
+
+    @mock.patch(
+        "server.channel.document_storage.materialize", new_callable=mock.AsyncMock
+    )
+    async def test_leave_method_closes_files(self, patched_materialize):
+        """
+        Test if files opened by leaving client are closed and only edited
+        ones are materialized
+        """
+
+        client = mock.AsyncMock()
+        self.channel.clients = {client}
+        self.channel.cache = mock.AsyncMock()
+        self.channel.pubsub = mock.AsyncMock()
+        await self.channel.open_file(client, "main.py")
+        await self.channel.open_file(client, "viewed.py")
+        self.channel.edited.add(f"{self.channel_id}:file:main.py")
+        await self.channel.leave(client)
+        self.assertEqual(self.channel.files, {})
+        self.assertEqual(self.channel.pubsub.unsubscribe.call_count, 2)
+        self.assertEqual(
+            [c.args[1] for c in patched_materialize.call_args_list],
+            [self.channel_id, f"{self.channel_id}:file:main.py"],
+        )
+
 
 class TestChannelCache(IsolatedAsyncioTestCase):
     """
@@ -143,7 +439,7 @@ class TestChannelCache(IsolatedAsyncioTestCase):
         self.assertEqual(len(self.cache.channels), 1)
 
     @mock.patch("server.channel.ChannelCache._ChannelCache__create_channel")
-    @mock.patch("server.channel.REDIS.pubsub")
+    @mock.patch("server.channel.BROKER.pubsub")
     async def test_get_or_create_method_with_new_channel(
         self, mocked_pubsub, mocked_create_channel
     ):
@@ -174,6 +470,21 @@ class TestChannelCache(IsolatedAsyncioTestCase):
         await self.cache._ChannelCache__add_channel(channel.id, channel)
         self.assertEqual(self.cache.channels[channel.id], channel)
 
+    @mock.patch("server.channel.SEND_QUEUE")
+    async def test_observe_send_queues_method(self, patched_send_queue):
+        """
+        Test if send queue size of every client is observed
+        """
+
+        clients = [mock.Mock(**{"send_queue_size.return_value": i}) for i in range(3)]
+        self.cache.channels = {"channel_id": mock.Mock(clients=set(clients))}
+        self.cache.observe_send_queues()
+        self.assertEqual(patched_send_queue.reset.call_count, 1)
+        self.assertCountEqual(
+            patched_send_queue.observe.call_args_list,
+            [mock.call(0), mock.call(1), mock.call(2)],
+        )
+
     async def test_destory_channel_method(self):
         """
         Test if destory channel method remove channel instance from cache
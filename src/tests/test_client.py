@@ -1,5 +1,5 @@
 from unittest import IsolatedAsyncioTestCase, mock
-from server.client import Client
+from server.client import Client, ClientRegistry, codespace_expire_update
 
 
 class TestClient(IsolatedAsyncioTestCase):
@@ -18,22 +18,130 @@ class TestClient(IsolatedAsyncioTestCase):
             mode="edit",
         )
 
-    async def test_if_dispatch_called_on_new_message(self):
+    async def test_if_handler_called_on_new_message(self):
         """
-        Test if in listen method when new websocket message arives.
-        dispatch method is called
+        Test if in listen method when new websocket message arives
+        it is prepared and its handler is called in order of messages
         """
 
-        self.message_handler.dispatch = mock.AsyncMock()
-        messages = ["message 1", "message 2"]
+        handler = mock.AsyncMock()
+        self.message_handler.prepare = mock.AsyncMock(
+            side_effect=lambda message, client: (handler, message)
+        )
+        messages = [{"id": 1}, {"id": 2}]
         self.protocol.__aiter__.return_value = messages
         await self.client.listen()
-        self.assertEqual(self.message_handler.dispatch.call_count, 2)
+        self.assertEqual(self.message_handler.prepare.call_count, 2)
+        self.assertEqual(
+            handler.call_args_list,
+            [
+                mock.call({"id": 1}, self.channel_id, self.client),
+                mock.call({"id": 2}, self.channel_id, self.client),
+            ],
+        )
+
+    @mock.patch("server.client.recorder")
+    async def test_listen_records_frames(self, patched_recorder):
+        """
+        Test if received frames are recorded when recorder is enabled
+        """
+
+        patched_recorder.enabled = True
+        self.message_handler.prepare = mock.AsyncMock(return_value=None)
+        self.protocol.__aiter__.return_value = ["frame"]
+        await self.client.listen()
+        patched_recorder.inbound.assert_called_once_with(
+            self.channel_id, self.client.public_id, "frame"
+        )
+
+    @mock.patch("server.client.asyncio.create_task")
+    async def test_idle_client_has_no_processor(self, patched_create_task):
+        """
+        Test if processing task is not created when client didn't send
+        any valid message
+        """
+
+        self.message_handler.prepare = mock.AsyncMock(return_value=None)
+        self.protocol.__aiter__.return_value = ["invalid message"]
+        await self.client.listen()
+        self.assertEqual(patched_create_task.call_count, 0)
+
+    def test_client_ids(self):
+        """
+        Test if clients get unique integer ids mapped to public ids
+        """
+
+        other = Client(
+            protocol=self.protocol,
+            channel_id=self.channel_id,
+            message_handler=self.message_handler,
+            mode="edit",
+        )
+        self.assertIsInstance(self.client.id, int)
+        self.assertNotEqual(self.client.id, other.id)
+        self.assertNotEqual(self.client.public_id, other.public_id)
+
+    @mock.patch.dict(
+        "os.environ",
+        {"TMP_CODESPACE_EXPIRE_UPDATE": "60", "CODESPACE_EXPIRE_UPDATE": "3600"},
+    )
+    def test_codespace_expire_update(self):
+        """
+        Test if expire update depends on codespace type
+        """
+
+        codespace_expire_update.cache_clear()
+        self.addCleanup(codespace_expire_update.cache_clear)
+        tmp_client = Client(
+            protocol=self.protocol,
+            channel_id="tmp-uuid",
+            message_handler=self.message_handler,
+            mode="edit",
+        )
+        self.assertEqual(tmp_client.codespace_expire_update, 60)
+        self.assertEqual(self.client.codespace_expire_update, 3600)
+        self.assertEqual(codespace_expire_update.cache_info().currsize, 2)
+
+    async def test_listen_skips_invalid_messages(self):
+        """
+        Test if handler is not called when message can't be prepared
+        """
 
-    @mock.patch("server.client.REDIS.publish", new_callable=mock.AsyncMock)
+        self.message_handler.prepare = mock.AsyncMock(return_value=None)
+        self.protocol.__aiter__.return_value = ["invalid message"]
+        await self.client.listen()
+        self.assertEqual(self.message_handler.prepare.call_count, 1)
+
+    async def test_listen_with_full_pipeline(self):
+        """
+        Test if all messages are processed when there are more messages
+        than pipeline depth
+        """
+
+        handler = mock.AsyncMock()
+        self.message_handler.prepare = mock.AsyncMock(
+            side_effect=lambda message, client: (handler, message)
+        )
+        self.protocol.__aiter__.return_value = [{"id": i} for i in range(5)]
+        with mock.patch.object(Client, "pipeline_depth", 1):
+            await self.client.listen()
+        self.assertEqual(handler.call_count, 5)
+
+    async def test_listen_reraises_handler_exception(self):
+        """
+        Test if exception raised by handler stops listening
+        """
+
+        handler = mock.AsyncMock(side_effect=ValueError)
+        self.message_handler.prepare = mock.AsyncMock(return_value=(handler, {}))
+        self.protocol.__aiter__.return_value = ["message"]
+        with self.assertRaises(ValueError):
+            await self.client.listen()
+
+    @mock.patch("server.client.BROKER.publish", new_callable=mock.AsyncMock)
     async def test_publish_method(self, patched_publish):
         """
-        Test if redis publish method is called properly
+        Test if broker publish method is called properly
         """
 
         await self.client.publish("message")
@@ -49,6 +157,35 @@ class TestClient(IsolatedAsyncioTestCase):
         await self.client.close(*args)
         self.protocol.close.assert_called_once_with(*args)
 
+    def test_send_queue_size_method(self):
+        """
+        Test if size of transport write buffer is returned
+        """
+
+        transport = self.protocol.io_proto.transport
+        transport.get_write_buffer_size.return_value = 10
+        self.assertEqual(self.client.send_queue_size(), 10)
+        self.protocol.io_proto = None
+        self.assertEqual(self.client.send_queue_size(), 0)
+
+    async def test_ping_method(self):
+        """
+        Test if ping returns future resolved with pong
+        """
+
+        self.protocol.ping = mock.AsyncMock(return_value="pong")
+        self.assertEqual(await self.client.ping(), "pong")
+
+    def test_abort_method(self):
+        """
+        Test if connection is failed without closing handshake
+        """
+
+        self.client.abort()
+        self.protocol.fail_connection.assert_called_once_with(
+            1011, "Heartbeat timeout"
+        )
+
     async def test_send_method(self):
         """
         Test if send method send message to websocket
@@ -57,3 +194,19 @@ class TestClient(IsolatedAsyncioTestCase):
         self.protocol.send = mock.AsyncMock()
         await self.client.send("message")
         self.protocol.send.assert_called_once_with("message")
+
+
+class TestClientRegistry(IsolatedAsyncioTestCase):
+    """
+    Test ClientRegistry class
+    """
+
+    def test_public_id(self):
+        """
+        Test if public id is prefixed with node id
+        """
+
+        registry = ClientRegistry(node="node")
+        client_id = registry.next_id()
+        self.assertEqual(registry.next_id(), client_id + 1)
+        self.assertEqual(registry.public_id(26), "node.1a")
@@ -0,0 +1,71 @@
+from unittest import TestCase
+from server.codec import DocumentCodec, TAG
+
+
+class TestDocumentCodec(TestCase):
+    """
+    Test DocumentCodec class
+    """
+
+    def setUp(self):
+        self.codec = DocumentCodec(codec="zlib", threshold=10)
+
+    def test_encode_short_text(self):
+        """
+        Test if text shorter than threshold is saved without compression
+        """
+
+        self.assertEqual(self.codec.encode("short"), "short")
+
+    def test_encode_long_text(self):
+        """
+        Test if long text is compressed, tagged and can be decoded
+        """
+
+        text = "print('Hello World')\n" * 100
+        value = self.codec.encode(text)
+        self.assertTrue(value.startswith(f"{TAG}zlib:"))
+        self.assertLess(len(value), len(text))
+        self.assertEqual(self.codec.decode(value), text)
+
+    def test_encode_without_codec(self):
+        """
+        Test if text is not compressed when codec is not set
+        """
+
+        codec = DocumentCodec(codec=None, threshold=0)
+        text = "print('Hello World')\n" * 100
+        self.assertEqual(codec.encode(text), text)
+
+    def test_encode_text_starting_with_tag(self):
+        """
+        Test if raw text starting with tag character is decoded unchanged
+        """
+
+        text = f"{TAG}zlib:not compressed"
+        self.assertEqual(self.codec.decode(self.codec.encode(text)), text)
+
+    def test_decode_legacy_value(self):
+        """
+        Test if values saved before codecs were used are returned unchanged
+        """
+
+        self.assertEqual(self.codec.decode("print(1)"), "print(1)")
+        self.assertIsNone(self.codec.decode(None))
+
+    def test_decode_with_other_codec_configured(self):
+        """
+        Test if value is decoded with codec from its tag
+        """
+
+        value = self.codec.encode("x" * 100)
+        codec = DocumentCodec(codec=None, threshold=10)
+        self.assertEqual(codec.decode(value), "x" * 100)
+
+    def test_unavailable_codec(self):
+        """
+        Test if ValueError is raised when codec is not available
+        """
+
+        with self.assertRaises(ValueError):
+            DocumentCodec(codec="unknown", threshold=10)
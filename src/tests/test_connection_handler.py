@@ -72,12 +72,17 @@ class TestConnectionHandler(IsolatedAsyncioTestCase):
         self.connection_handler.add_channel_listener(True, mocked_channel, mocked_app)
         mocked_app.add_task.assert_called_once_with(mocked_channel.listen())
 
-    async def test_send_connection_succeed_msg_method(self):
+    @mock.patch(
+        "server.presence.Presence.get_members",
+        new_callable=mock.AsyncMock,
+        return_value=["client_id", "other_id"],
+    )
+    async def test_send_connection_succeed_msg_method(self, patched_get_members):
         """
         Test if message informing about successfull connection is send
         """
 
-        mocked_client = mock.AsyncMock(id="client_id", mode="edit")
+        mocked_client = mock.AsyncMock(public_id="client_id", mode="edit")
         await self.connection_handler.send_connection_succeed_msg(mocked_client)
         self.assertEqual(mocked_client.send.call_count, 1)
         args, kwargs = mocked_client.send.call_args
@@ -85,6 +90,7 @@ class TestConnectionHandler(IsolatedAsyncioTestCase):
         self.assertEqual(msg["operation"], "connected")
         self.assertEqual(msg["data"]["id"], "client_id")
         self.assertEqual(msg["data"]["mode"], "edit")
+        self.assertEqual(msg["data"]["members"], ["client_id", "other_id"])
 
     async def test_add_client_listener_method(self):
         """
@@ -108,3 +114,60 @@ class TestConnectionHandler(IsolatedAsyncioTestCase):
         mocked_client.side_effect = [ConnectionClosedOK]
         await self.connection_handler.add_client_listener(mocked_client, mocked_channel)
         mocked_channel.leave.assert_called_once_with(mocked_client)
+
+    @mock.patch(
+        "server.handlers.connection_handler.ConnectionHandler.perform_authentication"
+    )
+    async def test_overloaded_worker_rejects_connection(
+        self, patched_perform_authentication
+    ):
+        """
+        Test if connection is closed with try again later code before
+        authentication when worker is overloaded
+        """
+
+        websocket = mock.AsyncMock()
+        with mock.patch.object(
+            self.connection_handler.monitor, "max_connections", 1
+        ), mock.patch.object(self.connection_handler.monitor, "connections", 1):
+            await self.connection_handler(websocket, "token", mock.Mock())
+
+        self.assertEqual(patched_perform_authentication.call_count, 0)
+        code, reason = websocket.close.call_args.args
+        self.assertEqual(code, 1013)
+        self.assertEqual(json.loads(reason)["reason"], "connections")
+
+    @mock.patch(
+        "server.handlers.connection_handler.ConnectionHandler.perform_authentication",
+        return_value=(None, None, False),
+    )
+    async def test_connections_are_counted(self, patched_perform_authentication):
+        """
+        Test if connection is counted only while it is handled
+        """
+
+        connections = self.connection_handler.monitor.connections
+
+        async def authenticate(websocket, token):
+            monitor = self.connection_handler.monitor
+            self.assertEqual(monitor.connections, connections + 1)
+            return None, None, False
+
+        patched_perform_authentication.side_effect = authenticate
+        await self.connection_handler(mock.AsyncMock(), "token", mock.Mock())
+        self.assertEqual(patched_perform_authentication.call_count, 1)
+        self.assertEqual(self.connection_handler.monitor.connections, connections)
+
+    async def test_draining_worker_rejects_connection(self):
+        """
+        Test if connection is closed with service restart code when worker
+        is draining
+        """
+
+        websocket = mock.AsyncMock()
+        with mock.patch.object(self.connection_handler.monitor, "draining", True):
+            await self.connection_handler(websocket, "token", mock.Mock())
+
+        code, reason = websocket.close.call_args.args
+        self.assertEqual(code, 1012)
+        self.assertEqual(json.loads(reason)["reason"], "draining")
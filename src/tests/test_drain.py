@@ -0,0 +1,94 @@
+from unittest import IsolatedAsyncioTestCase, mock
+from server.drain import Drainer
+from server.monitor import LoadMonitor
+import asyncio
+import json
+
+
+class TestDrainer(IsolatedAsyncioTestCase):
+    """
+    Test Drainer class
+    """
+
+    def setUp(self):
+        self.monitor = LoadMonitor()
+        self.drainer = Drainer(
+            monitor=self.monitor,
+            waves=2,
+            duration=0.02,
+            reconnect_delay=10,
+            timeout=0.1,
+        )
+        self.clients = [mock.AsyncMock() for _ in range(5)]
+        channels = [
+            mock.Mock(clients=set(self.clients[:3])),
+            mock.Mock(clients=set(self.clients[3:])),
+        ]
+        self.channels = mock.Mock(channels={"a": channels[0], "b": channels[1]})
+
+    async def test_drain_closes_every_client(self):
+        """
+        Test if every client is closed with service restart code and
+        reconnect delay not greater than configured one
+        """
+
+        await self.drainer.start(self.channels)
+
+        self.assertTrue(self.monitor.draining)
+        self.assertEqual(self.monitor.overloaded(), "draining")
+        for client in self.clients:
+            code, reason = client.close.call_args.args
+            self.assertEqual(code, 1012)
+            reason = json.loads(reason)
+            self.assertEqual(reason["reason"], "draining")
+            self.assertTrue(0 <= reason["retry_after"] <= 10)
+
+    async def test_drain_closes_clients_in_waves(self):
+        """
+        Test if clients are closed in configured number of waves
+        """
+
+        waves = []
+        for client in self.clients:
+            client.close.side_effect = lambda *args: waves.append(
+                self.loop_time()
+            )
+        self.drainer.duration = 0.2
+        await self.drainer.drain(self.channels)
+
+        # 5 clients in 2 waves separated by duration / waves
+        self.assertEqual(len(waves), 5)
+        self.assertLess(waves[2] - waves[0], 0.05)
+        self.assertGreaterEqual(waves[3] - waves[2], 0.09)
+
+    def loop_time(self):
+        return asyncio.get_running_loop().time()
+
+    async def test_start_is_idempotent(self):
+        """
+        Test if drain started twice runs only once
+        """
+
+        first = self.drainer.start(self.channels)
+        second = self.drainer.start(self.channels)
+        await first
+        self.assertIs(first, second)
+        for client in self.clients:
+            self.assertEqual(client.close.call_count, 1)
+
+    async def test_drain_waits_for_channels(self):
+        """
+        Test if drain waits until channels are destroyed, but not longer
+        than timeout
+        """
+
+        self.drainer.timeout = 0.05
+        channels = mock.Mock(channels={"a": mock.Mock(clients=set())})
+        started = self.loop_time()
+        await self.drainer.drain(channels)
+        self.assertGreaterEqual(self.loop_time() - started, 0.05)
+
+        channels.channels = {}
+        started = self.loop_time()
+        await self.drainer.drain(channels)
+        self.assertLess(self.loop_time() - started, 0.05)
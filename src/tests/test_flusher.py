@@ -0,0 +1,201 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, mock
+from server.flusher import WriteBack
+from server.storage import PlainDocumentStorage
+from fakeredis import aioredis as fakeredis
+from aiohttp.test_utils import TestServer
+from aiohttp import web
+
+
+class TestWriteBack(IsolatedAsyncioTestCase):
+    """
+    Test WriteBack class against local stub api
+    """
+
+    async def asyncSetUp(self):
+        self.requests = []
+        # number of requests stub api should fail
+        self.failures = 0
+
+        async def bulk_update(request):
+            self.requests.append(
+                {"data": await request.json(), "headers": request.headers}
+            )
+            if self.failures:
+                self.failures -= 1
+                return web.Response(status=503)
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_post("/codespaces/", bulk_update)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.write_back = WriteBack(
+            url=str(self.server.make_url("/codespaces/")),
+            token="secret",
+            delay=5,
+            max_age=30,
+            batch_size=2,
+            retries=2,
+            backoff=0,
+            redis=self.redis,
+            storage=PlainDocumentStorage(),
+        )
+
+    async def asyncTearDown(self):
+        await self.write_back.close()
+        await self.server.close()
+
+    def sent(self) -> list:
+        return [
+            [codespace["uuid"] for codespace in request["data"]["codespaces"]]
+            for request in self.requests
+        ]
+
+    def test_mark_tracks_first_and_last_modification(self):
+        """
+        Test if first modification time is kept and last one is updated
+        """
+
+        with mock.patch("server.flusher.time.monotonic", side_effect=[1, 3]):
+            self.write_back.mark("uuid")
+            self.write_back.mark("uuid")
+        self.assertEqual(self.write_back.dirty, {"uuid": [1, 3]})
+
+    def test_mark_ignores_tmp_codespaces_and_disabled_flusher(self):
+        """
+        Test if temporary codespaces and codespaces modified while flusher
+        is disabled aren't tracked
+        """
+
+        self.write_back.mark("tmp-uuid")
+        self.write_back.url = None
+        self.write_back.mark("uuid")
+        self.assertEqual(self.write_back.dirty, {})
+
+    def test_due(self):
+        """
+        Test if codespace is due after delay since last modification or
+        max age since first one
+        """
+
+        self.write_back.dirty = {"idle": [0, 10], "busy": [0, 99], "new": [98, 99]}
+        self.assertEqual(self.write_back.due(100), ["idle", "busy"])
+
+    async def test_flush_sends_documents_in_batches(self):
+        """
+        Test if documents are sent in bulk requests of batch size
+        """
+
+        for uuid in ("a", "b", "c"):
+            await self.redis.hset(uuid, "code", f"code {uuid}")
+            self.write_back.mark(uuid)
+        await self.write_back.flush_all()
+
+        self.assertEqual(self.sent(), [["a", "b"], ["c"]])
+        self.assertEqual(
+            self.requests[0]["data"]["codespaces"][0], {"uuid": "a", "code": "code a"}
+        )
+        self.assertEqual(self.requests[0]["headers"]["Authorization"], "Token secret")
+        self.assertEqual(self.write_back.dirty, {})
+
+    async def test_flush_sends_files(self):
+        """
+        Test if documents of codespace files are sent with file id
+        """
+
+        await self.redis.hset("a:file:main.py", "code", "code")
+        self.write_back.mark("a:file:main.py")
+        await self.write_back.flush_all()
+
+        self.assertEqual(
+            self.requests[0]["data"]["codespaces"],
+            [{"uuid": "a", "code": "code", "file": "main.py"}],
+        )
+
+    async def test_flush_retries_failed_requests(self):
+        """
+        Test if failed request is retried
+        """
+
+        self.failures = 2
+        await self.redis.hset("a", "code", "code")
+        self.write_back.mark("a")
+        await self.write_back.flush(["a"])
+
+        self.assertEqual(self.sent(), [["a"], ["a"], ["a"]])
+        self.assertEqual(self.write_back.dirty, {})
+
+    async def test_failed_codespaces_stay_dirty(self):
+        """
+        Test if codespaces are marked dirty again when every retry failed
+        """
+
+        self.failures = 3
+        await self.redis.hset("a", "code", "code")
+        self.write_back.dirty["a"] = [1, 2]
+        await self.write_back.flush(["a"])
+
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(self.write_back.dirty, {"a": [1, 2]})
+
+    async def test_codespaces_stay_dirty_when_read_fails(self):
+        """
+        Test if codespaces are marked dirty again when reading them failed
+        """
+
+        self.write_back.storage = mock.Mock(
+            read=mock.AsyncMock(side_effect=ConnectionError)
+        )
+        self.write_back.dirty["a"] = [1, 2]
+        await self.write_back.flush(["a"])
+
+        self.assertEqual(self.requests, [])
+        self.assertEqual(self.write_back.dirty, {"a": [1, 2]})
+
+    async def test_run_continues_after_failed_flush(self):
+        """
+        Test if codespaces are flushed by later iteration after failure
+        """
+
+        await self.redis.hset("a", "code", "code")
+        self.write_back.storage = mock.Mock(
+            read=mock.AsyncMock(side_effect=[ConnectionError, "code"])
+        )
+        self.write_back.interval = 0
+        self.write_back.delay = 0
+        self.write_back.mark("a")
+
+        task = asyncio.create_task(self.write_back.run())
+        for _ in range(100):
+            if self.requests:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        self.assertEqual(self.sent(), [["a"]])
+        self.assertEqual(self.write_back.dirty, {})
+
+    async def test_expired_codespaces_are_skipped(self):
+        """
+        Test if codespaces which don't exist in redis aren't sent
+        """
+
+        await self.redis.hset("a", "code", "code")
+        self.write_back.mark("a")
+        self.write_back.mark("expired")
+        await self.write_back.flush_all()
+
+        self.assertEqual(self.sent(), [["a"]])
+        self.assertEqual(self.write_back.dirty, {})
+
+    async def test_flush_ignores_clean_codespaces(self):
+        """
+        Test if nothing is sent for codespaces which aren't dirty
+        """
+
+        await self.write_back.flush(["a"])
+        self.assertEqual(self.requests, [])
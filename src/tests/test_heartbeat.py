@@ -0,0 +1,82 @@
+from unittest import IsolatedAsyncioTestCase, mock
+from server.heartbeat import Heartbeat
+import asyncio
+
+
+class TestHeartbeat(IsolatedAsyncioTestCase):
+    """
+    Test Heartbeat class
+    """
+
+    def setUp(self):
+        self.heartbeat = Heartbeat(interval=10, timeout=5)
+        self.client = mock.Mock()
+        self.pong = asyncio.get_event_loop().create_future()
+        self.client.ping = mock.AsyncMock(return_value=self.pong)
+        self.channel = mock.Mock(clients={self.client})
+        self.channel.leave = mock.AsyncMock()
+        self.channels = mock.Mock(channels={"uuid": self.channel})
+
+    async def check(self, now: float) -> None:
+        with mock.patch("server.heartbeat.time.monotonic", return_value=now):
+            await self.heartbeat.check(self.channels)
+        # let background leave run
+        await asyncio.sleep(0)
+
+    async def test_client_is_pinged_every_interval(self):
+        """
+        Test if client is pinged only after interval since last ping
+        """
+
+        await self.check(100)
+        self.pong.set_result(None)
+        await self.check(105)
+        self.assertEqual(self.client.ping.call_count, 1)
+        await self.check(110)
+        self.assertEqual(self.client.ping.call_count, 2)
+
+    async def test_client_answering_pings_is_not_reaped(self):
+        """
+        Test if client which answered ping stays connected
+        """
+
+        await self.check(100)
+        self.pong.set_result(None)
+        await self.check(200)
+        self.assertEqual(self.client.abort.call_count, 0)
+        self.assertEqual(self.channel.leave.call_count, 0)
+
+    async def test_client_is_reaped_after_timeout(self):
+        """
+        Test if client is disconnected and leaves channel when pong isn't
+        received within timeout
+        """
+
+        await self.check(100)
+        await self.check(104)
+        self.assertEqual(self.client.abort.call_count, 0)
+
+        await self.check(105)
+        self.client.abort.assert_called_once_with()
+        self.channel.leave.assert_called_once_with(self.client)
+        self.assertEqual(self.heartbeat.pings, {})
+
+    async def test_failed_ping_doesnt_stop_others(self):
+        """
+        Test if error of one ping doesn't prevent pinging other clients
+        """
+
+        closed = mock.Mock()
+        closed.ping = mock.AsyncMock(side_effect=ConnectionError)
+        self.channel.clients = {closed, self.client}
+        await self.check(100)
+        self.assertEqual(list(self.heartbeat.pings), [self.client])
+
+    async def test_disabled_heartbeat(self):
+        """
+        Test if disabled heartbeat doesn't check clients
+        """
+
+        self.heartbeat.interval = 0
+        await asyncio.wait_for(self.heartbeat.run(self.channels), 1)
+        self.assertEqual(self.client.ping.call_count, 0)
@@ -53,6 +53,38 @@ class TestBaseMessageHandler(IsolatedAsyncioTestCase):
         )
         self.assertEqual(self.message_handler.mocked_operation.call_count, 1)
 
+    async def test_prepare_method(self):
+        """
+        Test if prepare returns handler of operation and parsed message
+        """
+
+        self.message_handler.mocked_operation = mock.AsyncMock()
+        self.message_handler.operation_names = {"some_mode": ["mocked_operation"]}
+        message = {"operation": "mocked_operation", "data": "message"}
+        handler, parsed = await self.message_handler.prepare(
+            json.dumps(message), mock.AsyncMock(mode="some_mode")
+        )
+        self.assertEqual(handler, self.message_handler.mocked_operation)
+        self.assertEqual(parsed, message)
+
+    async def test_prepare_method_with_rate_limited_message(self):
+        """
+        Test if None is returned when rate limiter rejects message
+        """
+
+        self.message_handler.mocked_operation = mock.AsyncMock()
+        self.message_handler.operation_names = {"some_mode": ["mocked_operation"]}
+        self.message_handler.rate_limiter = mock.AsyncMock()
+        self.message_handler.rate_limiter.acquire.return_value = False
+        client = mock.AsyncMock(mode="some_mode")
+        prepared = await self.message_handler.prepare(
+            json.dumps({"operation": "mocked_operation"}), client
+        )
+        self.assertIsNone(prepared)
+        self.message_handler.rate_limiter.acquire.assert_called_once_with(
+            "mocked_operation", client
+        )
+
     async def test_operation_not_allowed_method(self):
         """
         Test if client connection is closed
@@ -102,9 +134,13 @@ class TestMessageHandler(IsolatedAsyncioTestCase):
         """
 
         patched_redis.hget.return_value = ""
-        await self.message_handler.insert_value(
-            {"changes": []}, "codespace_uuid", mock.AsyncMock()
-        )
+        with mock.patch.object(
+            self.message_handler.write_back, "dirty", {}
+        ), mock.patch.object(self.message_handler.write_back, "url", "url"):
+            await self.message_handler.insert_value(
+                {"changes": []}, "codespace_uuid", mock.AsyncMock()
+            )
+            self.assertIn("codespace_uuid", self.message_handler.write_back.dirty)
         self.assertEqual(patched_redis.hset.call_count, 1)
         self.assertEqual(patched_publish.call_count, 1)
 
@@ -145,6 +181,53 @@ class TestMessageHandler(IsolatedAsyncioTestCase):
         )
         self.assertEqual(code, "Hello Great World")
 
+    @mock.patch(
+        "server.handlers.message_handler.MessageHandler.redis",
+        new_callable=mock.AsyncMock,
+    )
+    @mock.patch(
+        "server.handlers.message_handler.MessageHandler.publish",
+        new_callable=mock.AsyncMock,
+    )
+    async def test_insert_into_large_document(self, patched_publish, patched_redis):
+        """
+        Test if multiple changes of document larger than offload threshold
+        are applied off event loop and single change is applied inline
+        """
+
+        patched_redis.hget.return_value = "Hello dlroW"
+        single = {"changes": [{"from": 6, "to": 11, "insert": "World"}]}
+        multiple = {
+            "changes": [
+                {"from": 0, "to": 5, "insert": "Hi"},
+                {"from": 6, "to": 11, "insert": "World"},
+            ]
+        }
+        with mock.patch.object(
+            self.message_handler.offloader, "threshold", 10
+        ), mock.patch(
+            "server.offload.Offloader.run", side_effect=self.run_inline
+        ) as patched_run:
+            await self.message_handler.insert_value(
+                single, "tmp-uuid", mock.AsyncMock()
+            )
+            self.assertEqual(patched_run.call_count, 0)
+            await self.message_handler.insert_value(
+                multiple, "tmp-uuid", mock.AsyncMock()
+            )
+        self.assertEqual(patched_run.call_args.args[0], "apply")
+        self.assertEqual(
+            patched_redis.hset.call_args_list,
+            [
+                mock.call("tmp-uuid", "code", "Hello World"),
+                mock.call("tmp-uuid", "code", "Hi World"),
+            ],
+        )
+
+    @staticmethod
+    async def run_inline(operation, function, *args):
+        return function(*args)
+
     @mock.patch(
         "server.handlers.message_handler.MessageHandler.publish",
         new_callable=mock.AsyncMock,
@@ -155,20 +238,114 @@ class TestMessageHandler(IsolatedAsyncioTestCase):
         """
 
         await self.message_handler.create_selection(
-            {"operation": "create_selection"}, "codespace_uuid", "client"
+            {"operation": "create_selection", "client": "spoofed"},
+            "codespace_uuid",
+            mock.Mock(public_id="client_id"),
         )
         patched_publish.assert_called_once_with(
-            "codespace_uuid", json.dumps({"operation": "create_selection"})
+            "codespace_uuid",
+            json.dumps({"client": "client_id", "operation": "create_selection"}),
         )
 
     @mock.patch(
         "server.handlers.message_handler.MessageHandler.redis",
         new_callable=mock.AsyncMock,
     )
-    async def test_publish_method(self, patched_redis):
+    @mock.patch(
+        "server.handlers.message_handler.MessageHandler.publish",
+        new_callable=mock.AsyncMock,
+    )
+    async def test_insert_into_file(self, patched_publish, patched_redis):
+        """
+        Test if file document is updated and message is published on file
+        channel
+        """
+
+        patched_redis.hget.return_value = ""
+        client = mock.AsyncMock(channel=mock.Mock(edited=set()))
+        with mock.patch.object(self.message_handler.write_back, "dirty", {}):
+            await self.message_handler.insert_value(
+                {"changes": [], "file": "main.py"}, "codespace_uuid", client
+            )
+        self.assertEqual(
+            patched_redis.hset.call_args.args[0], "codespace_uuid:file:main.py"
+        )
+        self.assertEqual(
+            [c.args[0] for c in patched_redis.expire.call_args_list],
+            ["codespace_uuid:file:main.py", "codespace_uuid"],
+        )
+        self.assertEqual(
+            patched_publish.call_args.args[0], "codespace_uuid:file:main.py"
+        )
+        # edited file is materialized when channel is destroyed
+        self.assertEqual(client.channel.edited, {"codespace_uuid:file:main.py"})
+
+    @mock.patch(
+        "server.handlers.message_handler.MessageHandler.redis",
+        new_callable=mock.AsyncMock,
+    )
+    async def test_insert_with_invalid_file(self, patched_redis):
+        """
+        Test if connection is closed when message has invalid file id
+        """
+
+        client = mock.AsyncMock()
+        for file_id in ["", 1, "x" * 257]:
+            await self.message_handler.insert_value(
+                {"changes": [], "file": file_id}, "codespace_uuid", client
+            )
+        self.assertEqual(client.close.call_count, 3)
+        self.assertEqual(patched_redis.hget.call_count, 0)
+
+    @mock.patch(
+        "server.handlers.message_handler.MessageHandler.publish",
+        new_callable=mock.AsyncMock,
+    )
+    async def test_create_selection_in_file(self, patched_publish):
+        """
+        Test if selection in file is published on file channel
+        """
+
+        message = {"operation": "create_selection", "file": "main.py"}
+        await self.message_handler.create_selection(
+            message, "codespace_uuid", mock.AsyncMock(public_id="client_id")
+        )
+        patched_publish.assert_called_once_with(
+            "codespace_uuid:file:main.py",
+            json.dumps({"client": "client_id", **message}),
+        )
+
+    async def test_open_and_close_file(self):
+        """
+        Test if file is opened and closed in client channel
+        """
+
+        client = mock.AsyncMock()
+        message = {"operation": "open_file", "file": "main.py"}
+        await self.message_handler.open_file(message, "codespace_uuid", client)
+        client.channel.open_file.assert_called_once_with(client, "main.py")
+        message = {"operation": "close_file", "file": "main.py"}
+        await self.message_handler.close_file(message, "codespace_uuid", client)
+        client.channel.close_file.assert_called_once_with(client, "main.py")
+
+    async def test_open_file_without_file(self):
+        """
+        Test if connection is closed when opened file isn't given
+        """
+
+        client = mock.AsyncMock()
+        await self.message_handler.open_file({}, "codespace_uuid", client)
+        self.assertEqual(client.channel.open_file.call_count, 0)
+        self.assertEqual(client.close.call_count, 1)
+
+    @mock.patch(
+        "server.handlers.message_handler.MessageHandler.broker",
+        new_callable=mock.AsyncMock,
+    )
+    async def test_publish_method(self, patched_broker):
         """
-        Test if incoming message is published properly to redis pub/sub channel
+        Test if incoming message is published properly with broker
         """
 
         await self.message_handler.publish("channel_id", "msg")
-        patched_redis.publish.assert_called_once_with("channel_id", "msg")
+        patched_broker.publish.assert_called_once_with("channel_id", "msg")
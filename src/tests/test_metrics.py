@@ -0,0 +1,82 @@
+from unittest import TestCase, mock
+from server.metrics import Counter, Gauge, Histogram, Registry, operation_of
+import json
+
+
+class TestMetrics(TestCase):
+    """
+    Test metric classes
+    """
+
+    def test_counter_render(self):
+        """
+        Test if counter values are rendered per labels
+        """
+
+        counter = Counter("messages_total", "Messages", ("operation",))
+        counter.inc("insert_value")
+        counter.inc("insert_value", amount=2)
+        self.assertEqual(counter[("insert_value",)], 3)
+        self.assertEqual(
+            counter.render(),
+            [
+                "# HELP messages_total Messages",
+                "# TYPE messages_total counter",
+                'messages_total{operation="insert_value"} 3',
+            ],
+        )
+
+    def test_gauge_without_labels(self):
+        """
+        Test if gauge without labels is rendered before first update
+        """
+
+        gauge = Gauge("clients", "Clients")
+        self.assertEqual(gauge.render()[-1], "clients 0")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        self.assertEqual(gauge.render()[-1], "clients 1")
+
+    def test_histogram_render(self):
+        """
+        Test if histogram buckets are cumulative
+        """
+
+        histogram = Histogram("latency", "Latency", buckets=(1, 5))
+        for value in [0.5, 1, 3, 10]:
+            histogram.observe(value)
+        self.assertEqual(
+            histogram.render()[2:],
+            [
+                'latency_bucket{le="1"} 2',
+                'latency_bucket{le="5"} 3',
+                'latency_bucket{le="+Inf"} 4',
+                "latency_sum 14.5",
+                "latency_count 4",
+            ],
+        )
+
+    @mock.patch("server.metrics.os.getpid", return_value=1)
+    def test_registry_render(self, patched_getpid):
+        """
+        Test if every sample is labeled with worker pid
+        """
+
+        registry = Registry()
+        counter = registry.register(Counter("messages_total", "Messages", ("op",)))
+        counter.inc("insert_value")
+        registry.register(Gauge("clients", "Clients"))
+        lines = registry.render().splitlines()
+        self.assertIn('messages_total{op="insert_value",worker="1"} 1', lines)
+        self.assertIn('clients{worker="1"} 0', lines)
+
+    def test_operation_of(self):
+        """
+        Test if operation is found in published message
+        """
+
+        message = {"changes": [{"insert": '"operation": "fake"'}]}
+        message["operation"] = "insert_value"
+        self.assertEqual(operation_of(json.dumps(message)), "insert_value")
+        self.assertEqual(operation_of("expired"), "unknown")
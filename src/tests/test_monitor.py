@@ -0,0 +1,93 @@
+from unittest import IsolatedAsyncioTestCase
+from server.monitor import LoadMonitor
+import json
+
+
+class TestLoadMonitor(IsolatedAsyncioTestCase):
+    """
+    Test LoadMonitor class
+    """
+
+    async def test_sample_records_lag(self):
+        """
+        Test if sampled lag is saved and is not negative
+        """
+
+        monitor = LoadMonitor(interval=0.001)
+        lag = await monitor.sample()
+        self.assertGreaterEqual(lag, 0)
+        self.assertEqual(list(monitor.samples), [lag])
+
+    def test_lag_is_max_of_window(self):
+        """
+        Test if the highest sample from window is used as lag
+        """
+
+        monitor = LoadMonitor()
+        monitor.samples.extend([0.01, 0.2, 0.05])
+        self.assertEqual(monitor.lag, 0.2)
+        self.assertEqual(LoadMonitor().lag, 0)
+
+    def test_not_overloaded_without_limits(self):
+        """
+        Test if disabled limits never mark worker as overloaded
+        """
+
+        monitor = LoadMonitor(max_lag=0, max_connections=0, connections=10000)
+        monitor.samples.append(10)
+        self.assertIsNone(monitor.overloaded())
+        self.assertEqual(monitor.state(), "up")
+
+    def test_overloaded_by_loop_lag(self):
+        """
+        Test if lag above limit marks worker as overloaded
+        """
+
+        monitor = LoadMonitor(max_lag=0.1)
+        monitor.samples.append(0.05)
+        self.assertIsNone(monitor.overloaded())
+        monitor.samples.append(0.2)
+        self.assertEqual(monitor.overloaded(), "loop_lag")
+        self.assertEqual(monitor.state(), "drain")
+
+    def test_overloaded_by_connections(self):
+        """
+        Test if reaching connections limit marks worker as overloaded and
+        state reports percent of free connections
+        """
+
+        monitor = LoadMonitor(max_connections=4, connections=1)
+        self.assertEqual(monitor.state(), "up 75%")
+        monitor.connections = 4
+        self.assertEqual(monitor.overloaded(), "connections")
+        self.assertEqual(monitor.state(), "drain")
+
+    def test_close_reason(self):
+        """
+        Test if close reason contains retry after and optional redirect
+        """
+
+        monitor = LoadMonitor(retry_after=3, redirect=None)
+        self.assertEqual(
+            json.loads(monitor.close_reason("loop_lag")),
+            {"reason": "loop_lag", "retry_after": 3},
+        )
+        monitor.redirect = "wss://other/"
+        self.assertEqual(
+            json.loads(monitor.close_reason("connections"))["redirect"],
+            "wss://other/",
+        )
+        monitor.redirect = f"wss://{'x' * 100}/"
+        self.assertEqual(
+            json.loads(monitor.close_reason("connections")),
+            {"reason": "connections", "retry_after": 3},
+        )
+
+    def test_draining(self):
+        """
+        Test if draining worker rejects connections regardless of limits
+        """
+
+        monitor = LoadMonitor(max_lag=0, max_connections=0, draining=True)
+        self.assertEqual(monitor.overloaded(), "draining")
+        self.assertEqual(monitor.state(), "drain")
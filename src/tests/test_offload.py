@@ -0,0 +1,69 @@
+from unittest import IsolatedAsyncioTestCase
+from server.offload import Offloader
+from server.metrics import OFFLOAD_DURATION, OFFLOADED
+import threading
+import asyncio
+
+
+class TestOffloader(IsolatedAsyncioTestCase):
+    """
+    Test Offloader class
+    """
+
+    def setUp(self):
+        OFFLOADED.reset()
+        OFFLOAD_DURATION.reset()
+        self.offloader = Offloader(threshold=10, workers=1)
+
+    def tearDown(self):
+        self.offloader.close()
+
+    def test_offloads(self):
+        """
+        Test if only operations larger than threshold are offloaded and
+        threshold 0 disables offloading
+        """
+
+        self.assertFalse(self.offloader.offloads(10))
+        self.assertTrue(self.offloader.offloads(11))
+        self.offloader.threshold = 0
+        self.assertFalse(self.offloader.offloads(11))
+
+    async def test_run(self):
+        """
+        Test if function is executed in worker thread and it's measured
+        """
+
+        result = await self.offloader.run("apply", threading.current_thread)
+        self.assertNotEqual(result, threading.current_thread())
+        self.assertEqual(OFFLOADED[("apply",)], 1)
+        self.assertEqual(OFFLOAD_DURATION.values[("apply",)][2], 1)
+
+    async def test_run_raises_function_exception(self):
+        """
+        Test if exception raised in worker is raised by run
+        """
+
+        with self.assertRaises(ValueError):
+            await self.offloader.run("apply", int, "x")
+
+    async def test_ordered(self):
+        """
+        Test if updates of the same key are executed in order they started
+        and lock is removed after last one
+        """
+
+        order = []
+
+        async def update(key: str, name: str, delay: float):
+            async with self.offloader.ordered(key):
+                await asyncio.sleep(delay)
+                order.append(name)
+
+        await asyncio.gather(
+            update("a", "first", 0.02),
+            update("a", "second", 0),
+            update("b", "other", 0),
+        )
+        self.assertEqual(order, ["other", "first", "second"])
+        self.assertEqual(self.offloader.locks, {})
@@ -0,0 +1,60 @@
+from unittest import IsolatedAsyncioTestCase, mock
+from server.outbox import HIGH, LOW, Outbox, priority_of, sender_of
+from server.metrics import OUTBOUND_DROPPED
+
+
+class TestOutbox(IsolatedAsyncioTestCase):
+    """
+    Test Outbox class
+    """
+
+    def setUp(self):
+        OUTBOUND_DROPPED.reset()
+        self.client = mock.AsyncMock()
+        self.outbox = Outbox(self.client)
+
+    def sent(self) -> list:
+        return [c.args[0] for c in self.client.send.call_args_list]
+
+    async def test_high_priority_messages_are_sent_first(self):
+        """
+        Test if edits are sent before selections queued earlier
+        """
+
+        self.outbox.put("selection", LOW, "a")
+        self.outbox.put("edit 1", HIGH)
+        self.outbox.put("edit 2", HIGH)
+        await self.outbox.run()
+        self.assertEqual(self.sent(), ["edit 1", "edit 2", "selection"])
+        self.assertEqual(len(self.outbox), 0)
+
+    async def test_superseded_messages_are_dropped(self):
+        """
+        Test if waiting selection is replaced by newer one of the same sender
+        """
+
+        self.outbox.put("a 1", LOW, "a")
+        self.outbox.put("b 1", LOW, "b")
+        self.outbox.put("a 2", LOW, "a")
+        self.outbox.put("other 1", LOW)
+        self.outbox.put("other 2", LOW)
+        await self.outbox.run()
+        self.assertEqual(self.sent(), ["b 1", "a 2", "other 1", "other 2"])
+        self.assertEqual(OUTBOUND_DROPPED[()], 1)
+
+    def test_priority_of(self):
+        """
+        Test if only selections are low priority
+        """
+
+        self.assertEqual(priority_of("create_selection"), LOW)
+        self.assertEqual(priority_of("insert_value"), HIGH)
+        self.assertEqual(priority_of("presence"), HIGH)
+
+    def test_sender_of(self):
+        """
+        Test if sender is read only from beginning of message
+        """
+
+        self.assertEqual(sender_of('{"client": "n.1", "operation": "x"}'), "n.1")
+        self.assertIsNone(sender_of('{"operation": "x", "client": "n.1"}'))
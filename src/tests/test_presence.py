@@ -0,0 +1,174 @@
+from unittest import IsolatedAsyncioTestCase, mock
+from server.presence import Presence
+from fakeredis import aioredis as fakeredis
+import asyncio
+import json
+import time
+
+
+class TestPresence(IsolatedAsyncioTestCase):
+    """
+    Test Presence class
+    """
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.broker = mock.AsyncMock()
+        self.presence = self.create_presence()
+
+    def create_presence(self):
+        return Presence(redis=self.redis, broker=self.broker, interval=5, ttl=15)
+
+    def published(self) -> list:
+        return [
+            (call.args[0], json.loads(call.args[1])["data"])
+            for call in self.broker.publish.call_args_list
+        ]
+
+    async def test_flush_saves_and_publishes_joins(self):
+        """
+        Test if joined clients are saved in redis and announced in one
+        message per codespace
+        """
+
+        self.presence.join("uuid", "a")
+        self.presence.join("uuid", "b")
+        await self.presence.flush()
+
+        self.assertEqual(
+            sorted(await self.redis.zrange("presence:uuid", 0, -1)), ["a", "b"]
+        )
+        self.assertEqual(
+            self.published(), [("uuid", {"joined": ["a", "b"], "left": []})]
+        )
+
+    async def test_flush_removes_and_publishes_leaves(self):
+        """
+        Test if left clients are removed from redis and announced
+        """
+
+        self.presence.join("uuid", "a")
+        self.presence.join("uuid", "b")
+        await self.presence.flush()
+        self.presence.leave("uuid", "a")
+        await self.presence.flush()
+
+        self.assertEqual(await self.redis.zrange("presence:uuid", 0, -1), ["b"])
+        self.assertEqual(self.published()[-1], ("uuid", {"joined": [], "left": ["a"]}))
+
+    async def test_failed_flush_is_retried(self):
+        """
+        Test if joins and leaves of failed flush are merged with new ones
+        and flushed next time
+        """
+
+        self.presence.join("uuid", "a")
+        self.presence.join("uuid", "b")
+        await self.presence.flush()
+        self.presence.join("uuid", "c")
+        self.presence.leave("uuid", "a")
+        self.broker.publish.side_effect = [Exception, None]
+        with self.assertRaises(Exception):
+            await self.presence.flush()
+        self.assertEqual(self.presence.joined, {"uuid": {"c"}})
+        self.assertEqual(self.presence.left, {"uuid": {"a"}})
+        await self.presence.flush()
+
+        self.assertEqual(await self.redis.zrange("presence:uuid", 0, -1), ["b", "c"])
+        self.assertEqual(
+            self.published()[-1], ("uuid", {"joined": ["c"], "left": ["a"]})
+        )
+
+    async def test_run_survives_failed_flush(self):
+        """
+        Test if flush task keeps running after flush fails with any error
+        """
+
+        self.presence.flush_interval = 0
+        with mock.patch(
+            "server.presence.Presence.flush", side_effect=[ValueError, None]
+        ) as patched_flush:
+            task = asyncio.create_task(self.presence.run())
+            for _ in range(100):
+                await asyncio.sleep(0.001)
+            self.assertFalse(task.done())
+            task.cancel()
+        self.assertGreaterEqual(patched_flush.call_count, 2)
+
+    async def test_join_and_leave_before_flush(self):
+        """
+        Test if client which left before its join was flushed is not
+        announced at all
+        """
+
+        self.presence.join("uuid", "a")
+        self.presence.leave("uuid", "a")
+        self.presence.refreshed = time.time()
+        await self.presence.flush()
+
+        self.assertEqual(self.broker.publish.call_count, 0)
+        self.assertEqual(self.presence.members, {})
+
+    async def test_flush_without_changes(self):
+        """
+        Test if nothing is sent when there are no changes and refresh
+        is not due
+        """
+
+        self.presence.refreshed = time.time()
+        with mock.patch.object(self.redis, "pipeline") as patched_pipeline:
+            await self.presence.flush()
+        self.assertEqual(patched_pipeline.call_count, 0)
+
+    async def test_refresh_extends_expiration(self):
+        """
+        Test if every local member is refreshed after interval
+        """
+
+        self.presence.join("uuid", "a")
+        await self.presence.flush()
+        score = await self.redis.zscore("presence:uuid", "a")
+
+        self.presence.refreshed -= 10
+        with mock.patch("server.presence.time.time", return_value=time.time() + 10):
+            await self.presence.flush()
+        self.assertAlmostEqual(
+            await self.redis.zscore("presence:uuid", "a"), score + 10, delta=1
+        )
+
+    async def test_stale_members_of_other_node_expire(self):
+        """
+        Test if members of node which stopped refreshing them are removed
+        and announced as left
+        """
+
+        dead_node = self.create_presence()
+        dead_node.join("uuid", "dead")
+        await dead_node.flush()
+        self.presence.join("uuid", "alive")
+        await self.presence.flush()
+
+        # after ttl passes refresh of alive node sweeps dead node members
+        with mock.patch("server.presence.time.time", return_value=time.time() + 15.5):
+            await self.presence.flush()
+
+        self.assertEqual(await self.redis.zrange("presence:uuid", 0, -1), ["alive"])
+        self.assertEqual(
+            self.published()[-1], ("uuid", {"joined": [], "left": ["dead"]})
+        )
+
+    async def test_get_members(self):
+        """
+        Test if members are read from redis and merged with not flushed
+        local changes
+        """
+
+        other_node = self.create_presence()
+        other_node.join("uuid", "other")
+        self.presence.join("uuid", "a")
+        await other_node.flush()
+        await self.presence.flush()
+        self.presence.leave("uuid", "a")
+        self.presence.join("uuid", "b")
+
+        self.assertEqual(await self.presence.get_members("uuid"), ["b", "other"])
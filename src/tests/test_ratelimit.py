@@ -0,0 +1,117 @@
+from unittest import IsolatedAsyncioTestCase, mock
+from server.ratelimit import RateLimiter, TokenBucket
+
+
+class TestTokenBucket(IsolatedAsyncioTestCase):
+    """
+    Test TokenBucket class
+    """
+
+    def test_refill_method(self):
+        """
+        Test if tokens are refilled with rate up to capacity
+        """
+
+        bucket = TokenBucket(rate=2, capacity=4)
+        bucket.tokens, bucket.updated = 0, 10
+        self.assertEqual(bucket.refill(11), 2)
+        self.assertEqual(bucket.refill(20), 4)
+
+    def test_take_method(self):
+        """
+        Test if take returns time after which token is available
+        """
+
+        bucket = TokenBucket(rate=2, capacity=1)
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0.5)
+
+
+class TestRateLimiter(IsolatedAsyncioTestCase):
+    """
+    Test RateLimiter class
+    """
+
+    def setUp(self):
+        self.client = mock.AsyncMock(id="client_id", channel_id="channel_id")
+
+    def create_limiter(self, action: str) -> RateLimiter:
+        return RateLimiter(
+            limits={"insert_value": {"client": [1, 2], "channel": [1, 3]}},
+            action=action,
+        )
+
+    async def test_acquire_without_limit(self):
+        """
+        Test if operation without limit is always allowed
+        """
+
+        limiter = self.create_limiter("drop")
+        for _ in range(10):
+            self.assertTrue(await limiter.acquire("create_selection", self.client))
+        self.assertEqual(limiter.counters[("create_selection", "allowed")], 10)
+
+    async def test_acquire_with_drop_action(self):
+        """
+        Test if messages over the client limit are dropped
+        """
+
+        limiter = self.create_limiter("drop")
+        results = [await limiter.acquire("insert_value", self.client) for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(limiter.counters[("insert_value", "dropped")], 1)
+        self.assertEqual(self.client.close.call_count, 0)
+
+    async def test_acquire_with_channel_limit(self):
+        """
+        Test if channel limit is shared between clients of channel
+        """
+
+        limiter = self.create_limiter("drop")
+        other_client = mock.AsyncMock(id="other_id", channel_id="channel_id")
+        for client in [self.client, self.client, other_client]:
+            self.assertTrue(await limiter.acquire("insert_value", client))
+        self.assertFalse(await limiter.acquire("insert_value", other_client))
+
+    async def test_acquire_with_close_action(self):
+        """
+        Test if client connection is closed with configured code
+        """
+
+        limiter = self.create_limiter("close")
+        limiter.close_code = 4000
+        for _ in range(3):
+            await limiter.acquire("insert_value", self.client)
+        self.client.close.assert_called_once_with(4000, "Rate limit exceeded")
+        self.assertEqual(limiter.counters[("insert_value", "closed")], 1)
+
+    @mock.patch("server.ratelimit.asyncio.sleep", new_callable=mock.AsyncMock)
+    async def test_acquire_with_delay_action(self, patched_sleep):
+        """
+        Test if message over the limit is delayed and then allowed
+        """
+
+        limiter = self.create_limiter("delay")
+        results = [await limiter.acquire("insert_value", self.client) for _ in range(3)]
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual(patched_sleep.call_count, 1)
+        self.assertEqual(limiter.counters[("insert_value", "delayed")], 1)
+
+    async def test_forget_method(self):
+        """
+        Test if buckets of client are removed
+        """
+
+        limiter = self.create_limiter("drop")
+        await limiter.acquire("insert_value", self.client)
+        limiter.forget(self.client.id)
+        self.assertNotIn(self.client.id, limiter.buckets)
+        self.assertIn(self.client.channel_id, limiter.buckets)
+
+    def test_invalid_action(self):
+        """
+        Test if ValueError is raised with unknown action
+        """
+
+        with self.assertRaises(ValueError):
+            RateLimiter(limits={}, action="invalid")
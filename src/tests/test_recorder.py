@@ -0,0 +1,97 @@
+from unittest import IsolatedAsyncioTestCase
+from server.recorder import Recorder
+from server.storage import PlainDocumentStorage
+from fakeredis import aioredis as fakeredis
+import tempfile
+import json
+import os
+
+
+class TestRecorder(IsolatedAsyncioTestCase):
+    """
+    Test Recorder class
+    """
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        await self.redis.hset("uuid", "code", "Hello")
+        self.recorder = Recorder(
+            directory=self.directory.name,
+            sample_rate=1,
+            max_bytes=1000,
+            redis=self.redis,
+            storage=PlainDocumentStorage(),
+        )
+
+    def records(self) -> list:
+        (name,) = os.listdir(self.directory.name)
+        with open(os.path.join(self.directory.name, name)) as file:
+            return [json.loads(line) for line in file]
+
+    async def test_session_is_recorded(self):
+        """
+        Test if start and end documents and frames are recorded in order
+        """
+
+        await self.recorder.start("uuid")
+        self.recorder.inbound("uuid", "client", "frame in")
+        self.recorder.outbound("uuid", "frame out")
+        await self.redis.hset("uuid", "code", "Hello World")
+        await self.recorder.stop("uuid")
+
+        records = self.records()
+        self.assertEqual([record[0] for record in records], ["s", "i", "o", "e"])
+        self.assertEqual(records[0][2], "Hello")
+        self.assertEqual(records[1][2:], ["client", "frame in"])
+        self.assertEqual(records[2][2], "frame out")
+        self.assertEqual(records[3][2], "Hello World")
+        self.assertEqual(self.recorder.sessions, {})
+
+    async def test_frames_of_not_recorded_codespace(self):
+        """
+        Test if frames of codespace without session are ignored
+        """
+
+        self.recorder.inbound("uuid", "client", "frame")
+        self.recorder.outbound("uuid", "frame")
+        await self.recorder.stop("uuid")
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    async def test_sampling(self):
+        """
+        Test if codespaces are not recorded when they aren't sampled
+        """
+
+        self.recorder.sample_rate = 0
+        await self.recorder.start("uuid")
+        self.assertEqual(self.recorder.sessions, {})
+
+    async def test_disabled_recorder(self):
+        """
+        Test if nothing is recorded without directory
+        """
+
+        self.recorder.directory = None
+        self.assertFalse(self.recorder.enabled)
+        await self.recorder.start("uuid")
+        self.assertEqual(self.recorder.sessions, {})
+
+    async def test_session_is_truncated_at_max_bytes(self):
+        """
+        Test if recording stops when session exceeds max bytes
+        """
+
+        await self.recorder.start("uuid")
+        for _ in range(100):
+            self.recorder.inbound("uuid", "client", "x" * 50)
+        await self.recorder.stop("uuid")
+
+        records = self.records()
+        self.assertEqual(records[-1][0], "x")
+        self.assertTrue(all(record[0] != "e" for record in records))
+        size = os.path.getsize(
+            os.path.join(self.directory.name, os.listdir(self.directory.name)[0])
+        )
+        self.assertLessEqual(size, 1000 + 50)
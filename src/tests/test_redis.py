@@ -0,0 +1,120 @@
+from unittest import IsolatedAsyncioTestCase, mock
+from server.redis import Redis
+import asyncio
+
+
+class TestRedisAutoPipeline(IsolatedAsyncioTestCase):
+    """
+    Test automatic pipelining of Redis client
+    """
+
+    def setUp(self):
+        self.redis = Redis(auto_pipeline=True)
+        self.pipelines = []
+        self.redis.pipeline = mock.MagicMock(side_effect=self.create_pipeline)
+
+    def create_pipeline(self, transaction):
+        # every pipeline returns its commands names as results
+        pipeline = mock.MagicMock()
+        pipeline.commands = []
+        pipeline.execute_command.side_effect = (
+            lambda *args, **options: pipeline.commands.append(args)
+        )
+
+        async def execute(raise_on_error):
+            return [
+                ValueError(args[0]) if args[0] == "ERROR" else args[0]
+                for args in pipeline.commands
+            ]
+
+        pipeline.execute.side_effect = execute
+        self.pipelines.append(pipeline)
+        return pipeline
+
+    async def test_commands_from_same_tick_are_pipelined(self):
+        """
+        Test if commands issued in the same loop tick are sent in one
+        pipeline and every caller gets its own result
+        """
+
+        results = await asyncio.gather(
+            self.redis.execute_command("GET", "a"),
+            self.redis.execute_command("HGET", "b", "code"),
+            self.redis.execute_command("PUBLISH", "c", "msg"),
+        )
+        self.assertEqual(results, ["GET", "HGET", "PUBLISH"])
+        self.assertEqual(len(self.pipelines), 1)
+        self.assertEqual(
+            self.pipelines[0].commands,
+            [("GET", "a"), ("HGET", "b", "code"), ("PUBLISH", "c", "msg")],
+        )
+        self.redis.pipeline.assert_called_once_with(transaction=False)
+
+    async def test_command_error_is_raised_only_to_its_caller(self):
+        """
+        Test if error of one command doesn't affect other commands
+        """
+
+        results = await asyncio.gather(
+            self.redis.execute_command("GET", "a"),
+            self.redis.execute_command("ERROR"),
+            return_exceptions=True,
+        )
+        self.assertEqual(results[0], "GET")
+        self.assertIsInstance(results[1], ValueError)
+
+    async def test_pipeline_error_is_raised_to_all_callers(self):
+        """
+        Test if error of whole pipeline is raised to every caller
+        """
+
+        self.redis.pipeline = mock.MagicMock()
+        self.redis.pipeline.return_value.execute = mock.AsyncMock(
+            side_effect=ConnectionError
+        )
+        results = await asyncio.gather(
+            self.redis.execute_command("GET", "a"),
+            self.redis.execute_command("GET", "b"),
+            return_exceptions=True,
+        )
+        self.assertTrue(all(isinstance(r, ConnectionError) for r in results))
+        self.assertIsNone(self.redis.flusher)
+
+    async def test_commands_issued_during_flush_are_sent_in_next_pipeline(self):
+        """
+        Test if pipelines are flushed one after another in order commands
+        were issued
+        """
+
+        first = asyncio.ensure_future(self.redis.execute_command("SET", "a", 1))
+        # let flusher start executing first pipeline
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(self.redis.execute_command("GET", "a"))
+        await asyncio.gather(first, second)
+
+        self.assertEqual(
+            [pipeline.commands for pipeline in self.pipelines],
+            [[("SET", "a", 1)], [("GET", "a")]],
+        )
+        self.assertIsNone(self.redis.flusher)
+
+    @mock.patch("aioredis.Redis.execute_command", new_callable=mock.AsyncMock)
+    async def test_blocking_commands_are_not_pipelined(self, patched_execute):
+        """
+        Test if blocking commands are executed directly
+        """
+
+        await self.redis.execute_command("BLPOP", "a", 0)
+        patched_execute.assert_called_once_with("BLPOP", "a", 0)
+        self.assertEqual(self.pipelines, [])
+
+    @mock.patch("aioredis.Redis.execute_command", new_callable=mock.AsyncMock)
+    async def test_auto_pipeline_disabled(self, patched_execute):
+        """
+        Test if commands are executed directly without auto pipeline
+        """
+
+        self.redis.auto_pipeline = False
+        await self.redis.execute_command("GET", "a")
+        patched_execute.assert_called_once_with("GET", "a")
+        self.assertEqual(self.pipelines, [])
@@ -0,0 +1,165 @@
+from unittest import IsolatedAsyncioTestCase, mock
+from server.relay import RelayChannel, RelayChannelCache, RelayClient
+import asyncio
+
+
+class TestRelayClient(IsolatedAsyncioTestCase):
+    """
+    Test RelayClient class
+    """
+
+    async def test_listen_does_not_dispatch_messages(self):
+        """
+        Test if incoming messages are ignored by relay client
+        """
+
+        protocol = mock.MagicMock()
+        protocol.__aiter__.return_value = ["message 1", "message 2"]
+        message_handler = mock.AsyncMock()
+        client = RelayClient(
+            protocol=protocol,
+            channel_id="channel_id",
+            message_handler=message_handler,
+            mode="view_only",
+        )
+        await client.listen()
+        self.assertEqual(message_handler.dispatch.call_count, 0)
+
+
+class TestRelayChannel(IsolatedAsyncioTestCase):
+    """
+    Test RelayChannel class
+    """
+
+    def setUp(self):
+        self.channel = RelayChannel(
+            channel_id="channel_id", pubsub=mock.MagicMock(), cache=mock.MagicMock()
+        )
+        self.channel.flush_interval = 0
+
+    def client(self, send_queue_size: int = 0) -> mock.AsyncMock:
+        return mock.AsyncMock(send_queue_size=mock.Mock(return_value=send_queue_size))
+
+    async def test_broadcast_method_buffers_messages(self):
+        """
+        Test if messages are sent only after flush, in received order
+        """
+
+        client = self.client()
+        self.channel.clients = {client}
+        await self.channel.broadcast({"data": "message 1"})
+        await self.channel.broadcast({"data": "message 2"})
+        self.assertEqual(client.send.call_count, 0)
+        await self.channel.flush_task
+        self.assertEqual(
+            client.send.call_args_list,
+            [mock.call("message 1"), mock.call("message 2")],
+        )
+
+    async def test_batches_are_sent_in_order_to_slow_client(self):
+        """
+        Test if next batch isn't sent before previous one is sent
+        """
+
+        sent = []
+
+        async def send(payload):
+            await asyncio.sleep(0.01)
+            sent.append(payload)
+
+        client = self.client()
+        client.send.side_effect = send
+        self.channel.clients = {client}
+        await self.channel.broadcast({"data": "a1"})
+        await self.channel.broadcast({"data": "a2"})
+        # wait until first batch is being sent
+        await asyncio.sleep(0.005)
+        await self.channel.broadcast({"data": "b1"})
+        while self.channel.flush_task is not None:
+            await self.channel.flush_task
+        self.assertEqual(sent, ["a1", "a2", "b1"])
+
+    async def test_flush_method_with_congested_client(self):
+        """
+        Test if messages to congested client are queued in its outbox
+        instead of holding up other clients
+        """
+
+        async def send(payload):
+            await asyncio.Event().wait()
+
+        congested = self.client(send_queue_size=10**6)
+        congested.send.side_effect = send
+        client = self.client()
+        self.channel.clients = {congested, client}
+        self.channel.pending = ["message 1", "message 2"]
+        await asyncio.wait_for(self.channel.flush(), 1)
+        self.assertEqual(client.send.call_count, 2)
+        self.assertEqual(len(self.channel.outboxes[congested]), 1)
+        self.channel.outboxes[congested].task.cancel()
+
+    async def test_flush_method_with_failing_client(self):
+        """
+        Test if failing client doesn't stop fan out to other clients
+        """
+
+        failing_client = self.client()
+        failing_client.send.side_effect = Exception
+        clients = [self.client() for _ in range(5)]
+        self.channel.fanout_slice = 2
+        self.channel.clients = {failing_client, *clients}
+        self.channel.pending = ["message"]
+        await self.channel.flush()
+        for client in clients:
+            client.send.assert_called_once_with("message")
+        self.assertEqual(self.channel.pending, [])
+
+    @mock.patch("server.relay.BROADCAST_DURATION")
+    async def test_flush_method_observes_duration(self, patched_duration):
+        """
+        Test if fan out duration is measured from flush start
+        """
+
+        self.channel.fanout_slice = 1
+        self.channel.clients = {self.client() for _ in range(3)}
+        self.channel.pending = ["message"]
+        await self.channel.flush()
+        duration = patched_duration.observe.call_args.args[0]
+        self.assertTrue(0 <= duration < 1)
+
+    async def test_expired_method_drops_pending_messages(self):
+        """
+        Test if pending messages are dropped and clients are closed
+        """
+
+        client = self.client()
+        self.channel.clients = {client}
+        await self.channel.broadcast({"data": "message"})
+        await self.channel.expired()
+        self.assertEqual(self.channel.pending, [])
+        self.assertEqual(client.send.call_count, 0)
+        self.assertEqual(client.close.call_count, 1)
+
+    async def test_create_client_method(self):
+        """
+        Test if RelayClient instance is created
+        """
+
+        client = await self.channel.create_client(mock.AsyncMock(), "view_only")
+        self.assertIsInstance(client, RelayClient)
+        self.assertEqual(client.channel_id, "channel_id")
+
+
+class TestRelayChannelCache(IsolatedAsyncioTestCase):
+    """
+    Test RelayChannelCache class
+    """
+
+    async def test_create_channel_method(self):
+        """
+        Test if RelayChannel instance is created
+        """
+
+        cache = RelayChannelCache()
+        channel = await cache._ChannelCache__create_channel(mock.Mock(), "channel_id")
+        self.assertIsInstance(channel, RelayChannel)
@@ -0,0 +1,60 @@
+from unittest import IsolatedAsyncioTestCase, mock
+from server.handlers.relay_handler import relay_handler
+
+
+class TestRelayConnectionHandler(IsolatedAsyncioTestCase):
+    """
+    Test RelayConnectionHandler class
+    """
+
+    @mock.patch(
+        "server.handlers.relay_handler.RelayConnectionHandler.perform_authentication",
+        return_value=("codespace_uuid", "edit", True),
+    )
+    @mock.patch(
+        "server.handlers.relay_handler.RelayConnectionHandler.channels.get_or_create"
+    )
+    async def test_with_edit_mode(
+        self, patched_get_or_create, patched_perform_authentication
+    ):
+        """
+        Test if connection with edit mode is closed without creating channel
+        """
+
+        websocket = mock.AsyncMock()
+        await relay_handler(websocket, "token", mock.Mock())
+        websocket.close.assert_called_once_with(1008, "'edit' mode is not allowed")
+        self.assertEqual(patched_get_or_create.call_count, 0)
+
+    @mock.patch(
+        "server.handlers.relay_handler.RelayConnectionHandler.perform_authentication",
+        return_value=("codespace_uuid", "view_only", True),
+    )
+    @mock.patch(
+        "server.handlers.relay_handler.RelayConnectionHandler.add_client_listener",
+    )
+    @mock.patch(
+        "server.presence.Presence.get_members",
+        new_callable=mock.AsyncMock,
+        return_value=[],
+    )
+    async def test_with_view_only_mode(
+        self,
+        patched_get_members,
+        patched_add_client_listener,
+        patched_perform_authentication,
+    ):
+        """
+        Test if view_only client is registered in relay channel
+        """
+
+        channel = mock.AsyncMock()
+        channel.create_client.return_value = mock.AsyncMock(
+            public_id="client_id", mode="view_only"
+        )
+        with mock.patch.object(
+            relay_handler.channels, "get_or_create", return_value=(channel, False)
+        ):
+            await relay_handler(mock.AsyncMock(), "token", mock.Mock())
+        self.assertEqual(channel.register.call_count, 1)
+        self.assertEqual(patched_add_client_listener.call_count, 1)
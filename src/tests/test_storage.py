@@ -0,0 +1,237 @@
+from unittest import IsolatedAsyncioTestCase
+from server.storage import PlainDocumentStorage, ChunkedDocumentStorage
+from server.handlers.message_handler import message_handler
+from server.codec import DocumentCodec, TAG
+from fakeredis import aioredis as fakeredis
+import random
+import json
+
+
+def apply(code: str, message: dict) -> str:
+    return message_handler._MessageHandler__update_code_with_changes(code, message)
+
+
+async def apply_later(code: str, message: dict) -> str:
+    return apply(code, message)
+
+
+def offloaded(code: str, message: dict):
+    # apply returning awaitable, like apply of offloaded changes
+    return apply_later(code, message)
+
+
+class TestPlainDocumentStorage(IsolatedAsyncioTestCase):
+    """
+    Test PlainDocumentStorage class
+    """
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.storage = PlainDocumentStorage()
+
+    async def test_update_method(self):
+        """
+        Test if changes are applied to 'code' field
+        """
+
+        await self.redis.hset("uuid", "code", "Hello dlroW")
+        message = {"changes": [{"from": 6, "to": 11, "insert": "World"}]}
+        self.assertTrue(await self.storage.update(self.redis, "uuid", message, apply))
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), "Hello World")
+
+    async def test_update_method_with_codec(self):
+        """
+        Test if legacy raw document is compressed after update
+        """
+
+        self.storage.codec = DocumentCodec(codec="zlib", threshold=10)
+        await self.redis.hset("uuid", "code", "x" * 100)
+        message = {"changes": [{"from": 0, "to": 0, "insert": "y"}]}
+        await self.storage.update(self.redis, "uuid", message, apply)
+        self.assertTrue((await self.redis.hget("uuid", "code")).startswith(TAG))
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), "y" + "x" * 100)
+
+    async def test_update_method_with_offloaded_apply(self):
+        """
+        Test if awaitable returned by apply is awaited
+        """
+
+        await self.redis.hset("uuid", "code", "Hello dlroW")
+        message = {"changes": [{"from": 6, "to": 11, "insert": "World"}]}
+        await self.storage.update(self.redis, "uuid", message, offloaded)
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), "Hello World")
+
+    async def test_update_method_with_unexisting_document(self):
+        """
+        Test if False is returned when document doesn't exist
+        """
+
+        self.assertFalse(
+            await self.storage.update(self.redis, "uuid", {"changes": []}, apply)
+        )
+
+
+class TestChunkedDocumentStorage(IsolatedAsyncioTestCase):
+    """
+    Test ChunkedDocumentStorage class
+    """
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.storage = ChunkedDocumentStorage(segment_size=4, split_lines=False)
+
+    async def create_document(self, code: str) -> None:
+        await self.redis.hset("uuid", "code", code)
+        await self.storage.update(self.redis, "uuid", {"changes": []}, apply)
+
+    async def get_index(self) -> dict:
+        return json.loads(await self.redis.hget("uuid", "index"))
+
+    def test_split_method(self):
+        """
+        Test if text is split into segments of segment size
+        """
+
+        self.assertEqual(self.storage.split("abcdefghij"), ["abcd", "efgh", "ij"])
+        self.assertEqual(self.storage.split(""), [])
+
+    def test_split_method_with_lines(self):
+        """
+        Test if segments are split after new line when possible
+        """
+
+        self.storage.split_lines = True
+        self.assertEqual(self.storage.split("ab\ncdefg"), ["ab\n", "cdef", "g"])
+
+    async def test_update_converts_code_field(self):
+        """
+        Test if document from 'code' field is split into segments
+        """
+
+        await self.create_document("Hello World")
+        index = await self.get_index()
+        self.assertEqual([length for _, length in index["segments"]], [4, 4, 3])
+        # readers that don't know segments still find document
+        self.assertEqual(await self.redis.hget("uuid", "code"), "Hello World")
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), "Hello World")
+
+    async def test_update_rewrites_only_touched_segments(self):
+        """
+        Test if segments not touched by changes are left unchanged
+        """
+
+        await self.create_document("Hello dlroW!")
+        message = {"changes": [{"from": 6, "to": 11, "insert": "World"}]}
+        self.assertTrue(await self.storage.update(self.redis, "uuid", message, apply))
+        index = await self.get_index()
+        self.assertEqual(index["segments"][0], [0, 4])
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), "Hello World!")
+        # removed segments fields are deleted
+        fields = await self.redis.hkeys("uuid")
+        self.assertEqual(len(fields), len(index["segments"]) + 2)
+
+    async def test_update_with_offloaded_apply(self):
+        """
+        Test if awaitable returned by apply is awaited when converting
+        document and when changing segments
+        """
+
+        await self.redis.hset("uuid", "code", "Hello dlroW!")
+        message = {"changes": [{"from": 6, "to": 11, "insert": "World"}]}
+        await self.storage.update(self.redis, "uuid", message, offloaded)
+        message = {"changes": [{"from": 0, "to": 5, "insert": "Hi"}]}
+        await self.storage.update(self.redis, "uuid", message, offloaded)
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), "Hi World!")
+
+    async def test_update_with_multiple_changes(self):
+        """
+        Test if multiple changes in different segments are applied properly
+        """
+
+        await self.create_document("Hello dlroW")
+        message = {
+            "changes": [
+                {"from": 0, "to": 0, "insert": ">> "},
+                {"from": 5, "to": 5, "insert": " Great"},
+                {"from": 6, "to": 11, "insert": "World"},
+                {"from": 11, "to": 11, "insert": "!"},
+            ]
+        }
+        await self.storage.update(self.redis, "uuid", message, apply)
+        self.assertEqual(
+            await self.storage.read(self.redis, "uuid"), ">> Hello Great World!"
+        )
+
+    async def test_update_removing_whole_document(self):
+        """
+        Test if document can be removed and written again
+        """
+
+        await self.create_document("Hello World")
+        message = {"changes": [{"from": 0, "to": 11, "insert": ""}]}
+        await self.storage.update(self.redis, "uuid", message, apply)
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), "")
+        message = {"changes": [{"from": 0, "to": 0, "insert": "Hi"}]}
+        await self.storage.update(self.redis, "uuid", message, apply)
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), "Hi")
+
+    async def test_update_with_random_changes(self):
+        """
+        Test if random edits give the same document as editing whole string
+        """
+
+        rand = random.Random(0)
+        code = "def main():\n    pass\n" * 3
+        await self.create_document(code)
+        for _ in range(200):
+            start = rand.randint(0, len(code))
+            end = rand.randint(start, min(len(code), start + 6))
+            insert = rand.choice(["", "x", "abc\n", "0123456789"])
+            message = {"changes": [{"from": start, "to": end, "insert": insert}]}
+            code = apply(code, message)
+            await self.storage.update(self.redis, "uuid", message, apply)
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), code)
+
+    async def test_update_with_unexisting_document(self):
+        """
+        Test if False is returned when document doesn't exist
+        """
+
+        self.assertFalse(
+            await self.storage.update(self.redis, "uuid", {"changes": []}, apply)
+        )
+
+    async def test_materialize_method(self):
+        """
+        Test if segments are joined back into 'code' field
+        """
+
+        await self.create_document("Hello World")
+        await self.storage.materialize(self.redis, "uuid")
+        self.assertEqual(await self.redis.hkeys("uuid"), ["code"])
+        self.assertEqual(await self.redis.hget("uuid", "code"), "Hello World")
+
+    async def test_update_retried_when_document_materialized(self):
+        """
+        Test if update is retried when other node materialized document
+        while changes were applied
+        """
+
+        await self.create_document("Hello dlroW")
+        message = {"changes": [{"from": 6, "to": 11, "insert": "World"}]}
+        materialized = False
+
+        async def apply_later(code: str, message: dict) -> str:
+            nonlocal materialized
+            if not materialized:
+                materialized = True
+                await self.storage.materialize(self.redis, "uuid")
+            return apply(code, message)
+
+        await self.storage.update(
+            self.redis, "uuid", message, lambda *args: apply_later(*args)
+        )
+        self.assertEqual(await self.storage.read(self.redis, "uuid"), "Hello World")
+        index = await self.get_index()
+        fields = await self.redis.hkeys("uuid")
+        self.assertEqual(len(fields), len(index["segments"]) + 2)
@@ -0,0 +1,126 @@
+from unittest import TestCase, mock
+from server.tracing import Tracer, RingSink, OTLPFileSink, TRACE_KEY
+import tempfile
+import json
+import os
+
+
+class TestTracer(TestCase):
+    """
+    Test Tracer class
+    """
+
+    def setUp(self):
+        self.sink = RingSink(10)
+        self.tracer = Tracer(sample_rate=1, sink=self.sink)
+
+    def test_start_method(self):
+        """
+        Test if sampled message gets trace context with receive and parse stages
+        """
+
+        message = {"operation": "insert_value"}
+        self.tracer.start(message, 1.0)
+        stages = message[TRACE_KEY]["stages"]
+        self.assertEqual([stage for stage, _ in stages], ["receive", "parse"])
+        self.assertEqual(stages[0][1], 1.0)
+
+    def test_start_method_removes_client_trace(self):
+        """
+        Test if trace context sent by client is removed
+        """
+
+        self.tracer.sample_rate = 0
+        message = {"operation": "insert_value", TRACE_KEY: {"stages": []}}
+        self.tracer.start(message, 1.0)
+        self.assertNotIn(TRACE_KEY, message)
+
+    def test_mark_method(self):
+        """
+        Test if stage is recorded only in traced message
+        """
+
+        message = {}
+        self.tracer.mark(message, "apply")
+        self.assertEqual(message, {})
+        self.tracer.start(message, 1.0)
+        self.tracer.mark(message, "apply")
+        self.assertEqual(message[TRACE_KEY]["stages"][-1][0], "apply")
+
+    def test_extract_method(self):
+        """
+        Test if trace context is removed from published message
+        """
+
+        message = {"operation": "insert_value"}
+        self.tracer.start(message, 1.0)
+        payload, trace = self.tracer.extract(json.dumps(message))
+        self.assertEqual(json.loads(payload), {"operation": "insert_value"})
+        self.assertEqual(trace["stages"][-1][0], "pubsub")
+
+    def test_extract_method_without_trace(self):
+        """
+        Test if untraced message is returned unchanged
+        """
+
+        payload = json.dumps({"insert": json.dumps({TRACE_KEY: 1})})
+        self.assertEqual(self.tracer.extract(payload), (payload, None))
+
+    def test_extract_method_with_nested_trace_key(self):
+        """
+        Test if message with trace key only in nested object is returned
+        unchanged
+        """
+
+        for payload in [
+            json.dumps({"changes": [{"insert": "a", TRACE_KEY: 1}]}),
+            json.dumps({TRACE_KEY: 1}),
+            json.dumps({TRACE_KEY: {"stages": 1}}),
+        ]:
+            self.assertEqual(self.tracer.extract(payload), (payload, None))
+
+    @mock.patch("server.tracing.TRACE_STAGE")
+    def test_finish_method(self, patched_trace_stage):
+        """
+        Test if stage latencies are observed and trace is exported
+        """
+
+        trace = {
+            "id": "id",
+            "stages": [["receive", 1], ["pubsub", 3], ["send", 4], ["send", 5]],
+        }
+        self.tracer.finish(trace)
+        self.assertEqual(
+            patched_trace_stage.observe.call_args_list,
+            [
+                mock.call(2, "pubsub"),
+                mock.call(1, "send"),
+                mock.call(2, "send"),
+                mock.call(4, "total"),
+            ],
+        )
+        self.assertEqual(list(self.sink.traces), [trace])
+
+
+class TestOTLPFileSink(TestCase):
+    """
+    Test OTLPFileSink class
+    """
+
+    def test_export_method(self):
+        """
+        Test if trace is appended to file as spans
+        """
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traces.jsonl")
+            sink = OTLPFileSink(path)
+            sink.export({"id": "id", "stages": [["receive", 1], ["parse", 2]]})
+            sink.file.close()
+            with open(path) as file:
+                request = json.loads(file.readline())
+
+        spans = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        self.assertEqual([span["name"] for span in spans], ["receive", "parse"])
+        self.assertEqual(spans[1]["startTimeUnixNano"], str(10**9))
+        self.assertEqual(spans[1]["endTimeUnixNano"], str(2 * 10**9))